@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,13 +95,124 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# DB_ENGINE=sqlite (default, single node) or postgres.
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgres":
+    DB_POOL = os.getenv("DB_POOL", "false").lower() == "true"
+    _default_db = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv("POSTGRES_DB", "musicbox"),
+        'USER': os.getenv("POSTGRES_USER", "musicbox"),
+        'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+        'HOST': os.getenv("POSTGRES_HOST", "localhost"),
+        'PORT': os.getenv("POSTGRES_PORT", "5432"),
+        # Persistent connections, unless psycopg's pool manages them
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if DB_POOL:
+        # Needs psycopg[pool]
+        _default_db['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            'timeout': int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+else:
+    _default_db = {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv("SQLITE_PATH", str(BASE_DIR / 'db.sqlite3')),
+        'OPTIONS': {
+            # WAL lets reads run alongside the single writer; writers take
+            # the lock up front (IMMEDIATE) and wait for it instead of failing
+            'init_command': (
+                "PRAGMA journal_mode=WAL;"
+                f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))};"
+                f"PRAGMA synchronous={os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')};"
+                "PRAGMA temp_store=MEMORY;"
+                f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', '20000'))};"
+                f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', str(128 * 1024 * 1024)))}"
+            ),
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
+
+DATABASES = {
+    'default': _default_db,
 }
 
+# Read replicas (Postgres only): comma-separated hosts with the same
+# credentials. Reads go to a replica via core.db_router, except in
+# transactions, unsafe requests, and for DB_REPLICA_STICKY_SECONDS after
+# a user's last write (read-your-writes).
+DB_REPLICA_HOSTS = [
+    host.strip() for host in os.getenv("DB_REPLICA_HOSTS", "").split(",") if host.strip()
+]
+DB_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", "10"))
+
+if DB_ENGINE == "postgres" and DB_REPLICA_HOSTS:
+    for _index, _host in enumerate(DB_REPLICA_HOSTS):
+        DATABASES[f'replica_{_index}'] = {
+            **_default_db,
+            'HOST': _host,
+            'TEST': {'MIRROR': 'default'},
+        }
+    DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+    MIDDLEWARE.append('core.db_router.ReplicaStickinessMiddleware')
+
+
+# Cache
+# Shared backend (Redis) when REDIS_URL is set, so per-user caches and
+# coalescing leases are visible to every worker; per-process otherwise.
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Shared Spotify search results (core/search.py), kept apart from "default"
+# so they can be bounded and evicted on their own. LocMemCache evicts least
+# recently used entries past MAX_ENTRIES; with Redis, point SEARCH_REDIS_URL
+# at an instance with maxmemory + maxmemory-policy allkeys-lru.
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_REDIS_URL = os.getenv("SEARCH_REDIS_URL", REDIS_URL)
+
+if SEARCH_REDIS_URL:
+    CACHES["search"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": SEARCH_REDIS_URL,
+        "TIMEOUT": SEARCH_CACHE_TTL,
+        "KEY_PREFIX": "search",
+    }
+else:
+    CACHES["search"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "search",
+        "TIMEOUT": SEARCH_CACHE_TTL,
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000")),
+            # Drop the least recently used tenth when full
+            "CULL_FREQUENCY": 10,
+        },
+    }
+
+
+# In-process pool for deferred work (core/background.py)
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", "4"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -146,8 +258,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # === DRF + JWT CONFIG ===
 
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "core.renderers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "core.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.AllowAny",
@@ -159,6 +280,15 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
 
+# Response compression (core/middleware.py): brotli when accepted, else
+# Django's gzip
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# How long a user's is_active flag and profile fields stay cached for
+# ClaimsUser (seconds)
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+
 
 # === Spotify OAuth settings ===
 
@@ -170,5 +300,127 @@ SPOTIFY_SCOPES = os.getenv(
     "user-read-email",
 )
 
+# Shared, keep-alive HTTP transport used for every Spotify call
+# (see core.spotify_client.get_http_session)
+SPOTIFY_HTTP_POOL_CONNECTIONS = int(os.getenv("SPOTIFY_HTTP_POOL_CONNECTIONS", "4"))
+SPOTIFY_HTTP_POOL_MAXSIZE = int(os.getenv("SPOTIFY_HTTP_POOL_MAXSIZE", "32"))
+SPOTIFY_HTTP_POOL_BLOCK = os.getenv("SPOTIFY_HTTP_POOL_BLOCK", "false").lower() == "true"
+SPOTIFY_HTTP_CONNECT_TIMEOUT = float(os.getenv("SPOTIFY_HTTP_CONNECT_TIMEOUT", "3.05"))
+SPOTIFY_HTTP_READ_TIMEOUT = float(os.getenv("SPOTIFY_HTTP_READ_TIMEOUT", "10"))
+
+# Tokens expiring within this many seconds are refreshed in the background,
+# so requests only refresh inline once a token has actually expired
+SPOTIFY_TOKEN_REFRESH_SKEW = int(os.getenv("SPOTIFY_TOKEN_REFRESH_SKEW", "300"))
+
+# Failure handling for Spotify API calls (see core.spotify_client._retry_delay)
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "2"))
+SPOTIFY_MAX_RETRY_AFTER = int(os.getenv("SPOTIFY_MAX_RETRY_AFTER", "2"))
+SPOTIFY_BACKOFF_BASE = float(os.getenv("SPOTIFY_BACKOFF_BASE", "0.25"))
+SPOTIFY_BACKOFF_MAX = float(os.getenv("SPOTIFY_BACKOFF_MAX", "2"))
+# App-wide requests/second across all workers (0 disables the limiter)
+SPOTIFY_API_RATE_LIMIT = int(os.getenv("SPOTIFY_API_RATE_LIMIT", "50"))
+SPOTIFY_API_RATE_LIMIT_MAX_WAIT = float(os.getenv("SPOTIFY_API_RATE_LIMIT_MAX_WAIT", "1"))
+SPOTIFY_BREAKER_THRESHOLD = int(os.getenv("SPOTIFY_BREAKER_THRESHOLD", "5"))
+SPOTIFY_BREAKER_COOLDOWN = int(os.getenv("SPOTIFY_BREAKER_COOLDOWN", "30"))
+
+# Async (httpx) pool used by the async views when served over ASGI
+SPOTIFY_ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("SPOTIFY_ASYNC_HTTP_MAX_CONNECTIONS", "1000"))
+SPOTIFY_ASYNC_HTTP_MAX_KEEPALIVE = int(os.getenv("SPOTIFY_ASYNC_HTTP_MAX_KEEPALIVE", "100"))
+
+# /user/now-playing/ snapshot cache (see core/now_playing.py)
+NOW_PLAYING_CACHE_TTL = int(os.getenv("NOW_PLAYING_CACHE_TTL", "10"))
+NOW_PLAYING_LEASE_TIMEOUT = int(os.getenv("NOW_PLAYING_LEASE_TIMEOUT", "5"))
+# While playing, the now-playing ETag changes every this many ms of progress
+NOW_PLAYING_ETAG_PROGRESS_MS = int(os.getenv("NOW_PLAYING_ETAG_PROGRESS_MS", "5000"))
+
+# /user/now-playing/stream/ poller intervals, in seconds
+NOW_PLAYING_STREAM_MIN_INTERVAL = float(os.getenv("NOW_PLAYING_STREAM_MIN_INTERVAL", "2"))
+NOW_PLAYING_STREAM_MAX_INTERVAL = float(os.getenv("NOW_PLAYING_STREAM_MAX_INTERVAL", "15"))
+NOW_PLAYING_STREAM_IDLE_INTERVAL = float(os.getenv("NOW_PLAYING_STREAM_IDLE_INTERVAL", "30"))
+NOW_PLAYING_STREAM_KEEPALIVE = float(os.getenv("NOW_PLAYING_STREAM_KEEPALIVE", "20"))
+
+# Listening history sync (see core/listening_history.py)
+PLAY_HISTORY_SYNC_INTERVAL = int(os.getenv("PLAY_HISTORY_SYNC_INTERVAL", "30"))
+PLAY_HISTORY_MAX_PAGES = int(os.getenv("PLAY_HISTORY_MAX_PAGES", "4"))
+# Latest plays scanned per requested item when deduplicating recent tracks
+PLAY_HISTORY_UNIQUE_SCAN = int(os.getenv("PLAY_HISTORY_UNIQUE_SCAN", "20"))
+
+# Local Spotify catalog metadata is refetched after this many seconds
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", str(7 * 24 * 3600)))
+# Art size (px) stored on catalog rows (see core.images.pick_image)
+CATALOG_IMAGE_SIZE = int(os.getenv("CATALOG_IMAGE_SIZE", "300"))
+
+# POST /ratings/bulk/ and /reviews/bulk/
+BULK_UPSERT_MAX_ITEMS = int(os.getenv("BULK_UPSERT_MAX_ITEMS", "10000"))
+BULK_UPSERT_BATCH_SIZE = int(os.getenv("BULK_UPSERT_BATCH_SIZE", "1000"))
+
+# GET /ratings/ and /reviews/ page sizes
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+# Precomputed "top rated" charts (see core/leaderboards.py)
+LEADERBOARD_WINDOWS = os.getenv("LEADERBOARD_WINDOWS", "all,30d,7d")
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_PRIOR_WEIGHT = float(os.getenv("LEADERBOARD_PRIOR_WEIGHT", "5"))
+LEADERBOARD_MAX_AGE = int(os.getenv("LEADERBOARD_MAX_AGE", "900"))
+
+# Item-item recommendations (see core/recommendations.py)
+RECS_TOP_K = int(os.getenv("RECS_TOP_K", "50"))
+RECS_MIN_OVERLAP = int(os.getenv("RECS_MIN_OVERLAP", "2"))
+RECS_CHUNK_SIZE = int(os.getenv("RECS_CHUNK_SIZE", "50000"))
+RECS_BLOCK_SIZE = int(os.getenv("RECS_BLOCK_SIZE", "1000"))
+RECS_SEED_ITEMS = int(os.getenv("RECS_SEED_ITEMS", "200"))
+
+# User taste match (see core/taste_match.py)
+TASTE_MIN_OVERLAP = int(os.getenv("TASTE_MIN_OVERLAP", "3"))
+TASTE_SHRINKAGE = float(os.getenv("TASTE_SHRINKAGE", "10"))
+TASTE_NEIGHBORS = int(os.getenv("TASTE_NEIGHBORS", "50"))
+TASTE_BLOCK_SIZE = int(os.getenv("TASTE_BLOCK_SIZE", "200"))
+TASTE_INVALIDATE_CHANGES = int(os.getenv("TASTE_INVALIDATE_CHANGES", "5"))
+TASTE_CACHE_TTL = int(os.getenv("TASTE_CACHE_TTL", str(24 * 3600)))
+
+# Max (spotify_id, item_type) pairs per /items/state/ lookup
+ITEM_STATE_MAX_ITEMS = int(os.getenv("ITEM_STATE_MAX_ITEMS", "300"))
+
+# Spotify search paging (/discover/search/music/)
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "10"))
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))  # Spotify's cap
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))  # Spotify's cap
+# Market sent with searches that don't pass ?market= ("" = none)
+SEARCH_DEFAULT_MARKET = os.getenv("SEARCH_DEFAULT_MARKET", "US")
+SEARCH_PREFETCH = os.getenv("SEARCH_PREFETCH", "true").lower() == "true"
+
+# Typeahead (/discover/autocomplete/, core/autocomplete.py)
+AUTOCOMPLETE_DEFAULT_LIMIT = int(os.getenv("AUTOCOMPLETE_DEFAULT_LIMIT", "8"))
+AUTOCOMPLETE_MAX_LIMIT = int(os.getenv("AUTOCOMPLETE_MAX_LIMIT", "20"))
+# Reload the in-memory index from the database in the background after
+# this many seconds; new search results are merged in memory once this
+# many have been seen
+AUTOCOMPLETE_INDEX_TTL = int(os.getenv("AUTOCOMPLETE_INDEX_TTL", "300"))
+AUTOCOMPLETE_PENDING_MAX = int(os.getenv("AUTOCOMPLETE_PENDING_MAX", "2000"))
+# Recent search results kept for the index (per process)
+AUTOCOMPLETE_RECENT_MAX = int(os.getenv("AUTOCOMPLETE_RECENT_MAX", "5000"))
+# Ask Spotify when the index has fewer suggestions than this...
+AUTOCOMPLETE_UPSTREAM_BELOW = int(os.getenv("AUTOCOMPLETE_UPSTREAM_BELOW", "3"))
+# ... for prefixes at least this long, after this quiet period per user
+AUTOCOMPLETE_UPSTREAM_MIN_CHARS = int(os.getenv("AUTOCOMPLETE_UPSTREAM_MIN_CHARS", "3"))
+AUTOCOMPLETE_DEBOUNCE_MS = int(os.getenv("AUTOCOMPLETE_DEBOUNCE_MS", "150"))
+# Results per type fetched for a fallback
+AUTOCOMPLETE_UPSTREAM_LIMIT = int(os.getenv("AUTOCOMPLETE_UPSTREAM_LIMIT", "5"))
+
+# Album-art proxy (/images/proxy/) with a bounded on-disk LRU cache
+IMAGE_PROXY_ENABLED = os.getenv("IMAGE_PROXY_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", str(BASE_DIR / "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# How often each worker re-scans the cache dir to correct its size total
+IMAGE_CACHE_RESCAN_SECONDS = int(os.getenv("IMAGE_CACHE_RESCAN_SECONDS", "300"))
+# Largest single image the proxy will store
+IMAGE_PROXY_MAX_BYTES = int(os.getenv("IMAGE_PROXY_MAX_BYTES", str(2 * 1024 * 1024)))
+IMAGE_PROXY_HOST_SUFFIXES = [
+    suffix.strip()
+    for suffix in os.getenv("IMAGE_PROXY_HOST_SUFFIXES", ".scdn.co,.spotifycdn.com").split(",")
+    if suffix.strip()
+]
+
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8081")
@@ -0,0 +1,170 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from .models import Rating, RatingAggregate
+
+HISTOGRAM_BUCKETS = 6  # whole stars 0..5
+
+AGGREGATE_FIELDS = ["count", "sum", "sum_sq"] + [
+    f"hist_{bucket}" for bucket in range(HISTOGRAM_BUCKETS)
+]
+
+
+def histogram_bucket(value) -> int:
+    return min(int(value), HISTOGRAM_BUCKETS - 1)
+
+
+def apply_rating_change(spotify_id, item_type, old, new):
+    """
+    Applies one user's rating change (old -> new, either may be None) to the
+    item's aggregate row as relative F() updates, so concurrent writers to
+    the same item don't overwrite each other.
+
+    Call it inside the transaction that wrote the Rating.
+    """
+    if old == new:
+        return
+
+    deltas = {"count": 0, "sum": Decimal(0), "sum_sq": Decimal(0)}
+    if old is not None:
+        deltas["count"] -= 1
+        deltas["sum"] -= old
+        deltas["sum_sq"] -= old * old
+        bucket = f"hist_{histogram_bucket(old)}"
+        deltas[bucket] = deltas.get(bucket, 0) - 1
+    if new is not None:
+        deltas["count"] += 1
+        deltas["sum"] += new
+        deltas["sum_sq"] += new * new
+        bucket = f"hist_{histogram_bucket(new)}"
+        deltas[bucket] = deltas.get(bucket, 0) + 1
+
+    # Make sure the row exists, then bump it in place
+    RatingAggregate.objects.bulk_create(
+        [RatingAggregate(spotify_id=spotify_id, item_type=item_type)],
+        ignore_conflicts=True,
+    )
+    # update() skips auto_now, so updated_at is set explicitly
+    RatingAggregate.objects.filter(spotify_id=spotify_id, item_type=item_type).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items() if delta},
+    )
+
+
+def _aggregate_rows(ratings):
+    """
+    GROUP BY (spotify_id, item_type) over `ratings`, as unsaved RatingAggregate rows
+    """
+    bucket_counts = {
+        f"hist_{bucket}": Count(
+            "id",
+            filter=Q(rating__gte=bucket)
+            & (Q(rating__lt=bucket + 1) if bucket < HISTOGRAM_BUCKETS - 1 else Q()),
+        )
+        for bucket in range(HISTOGRAM_BUCKETS)
+    }
+    grouped = (
+        ratings.order_by()
+        .values("spotify_id", "item_type")
+        .annotate(
+            count=Count("id"),
+            sum=Sum("rating"),
+            sum_sq=Sum(
+                ExpressionWrapper(
+                    F("rating") * F("rating"),
+                    output_field=DecimalField(max_digits=18, decimal_places=4),
+                )
+            ),
+            **bucket_counts,
+        )
+    )
+    for row in grouped.iterator(chunk_size=2000):
+        yield RatingAggregate(**row)
+
+
+def _upsert(rows, batch_size=1000):
+    RatingAggregate.objects.bulk_create(
+        rows,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["spotify_id", "item_type"],
+        update_fields=AGGREGATE_FIELDS + ["updated_at"],
+    )
+
+
+def refresh_rating_aggregates(pairs):
+    """
+    Recomputes the aggregates of the given (spotify_id, item_type) pairs from
+    Rating with one grouped query (used after set-based writes).
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+
+    ratings = Rating.objects.filter(
+        spotify_id__in={spotify_id for spotify_id, _ in pairs},
+        item_type__in={item_type for _, item_type in pairs},
+    )
+    rows = [
+        row for row in _aggregate_rows(ratings)
+        if (row.spotify_id, row.item_type) in pairs
+    ]
+
+    with transaction.atomic():
+        if rows:
+            _upsert(rows)
+        # Pairs nobody rates any more
+        rated = {(row.spotify_id, row.item_type) for row in rows}
+        for spotify_id, item_type in pairs - rated:
+            RatingAggregate.objects.filter(
+                spotify_id=spotify_id, item_type=item_type
+            ).delete()
+
+
+def rebuild_rating_aggregates(batch_size=1000):
+    """
+    Recomputes every aggregate from scratch. Returns the number of rows written.
+    """
+    written = 0
+    with transaction.atomic():
+        RatingAggregate.objects.all().delete()
+
+        batch = []
+        for row in _aggregate_rows(Rating.objects.all()):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                RatingAggregate.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            RatingAggregate.objects.bulk_create(batch)
+            written += len(batch)
+
+    return written
+
+
+def rating_stats(aggregate):
+    """
+    Public stats for one item from its aggregate row (or None if unrated)
+    """
+    if aggregate is None or not aggregate.count:
+        return {
+            "count": 0,
+            "average": None,
+            "stddev": None,
+            "histogram": [0] * HISTOGRAM_BUCKETS,
+        }
+
+    count = aggregate.count
+    mean = aggregate.sum / count
+    # Population variance; clamp tiny negative rounding noise
+    variance = max(aggregate.sum_sq / count - mean * mean, Decimal(0))
+    return {
+        "count": count,
+        "average": round(float(mean), 2),
+        "stddev": round(float(variance.sqrt()), 2),
+        "histogram": aggregate.histogram,
+    }
@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+# Profile claims embedded in tokens issued by tokens_for_user()
+PROFILE_CLAIMS = ("username", "email", "spotify_id", "display_name")
+
+
+def tokens_for_user(user, account=None) -> RefreshToken:
+    """
+    Refresh token (its .access_token copies the claims) carrying the
+    profile fields most requests need, so they don't touch the database
+    """
+    refresh = RefreshToken.for_user(user)
+    refresh["username"] = user.username
+    refresh["email"] = user.email or ""
+    refresh["spotify_id"] = account.spotify_id if account else None
+    refresh["display_name"] = (account.display_name if account else "") or user.username
+    return refresh
+
+
+def _user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_cached_user(user_id):
+    cache.delete(_user_cache_key(user_id))
+
+
+# Cached per user: flags and profile fields only, never the password hash
+# or the SpotifyAccount tokens
+CACHED_USER_FIELDS = {
+    "is_active": "is_active",
+    "is_staff": "is_staff",
+    "is_superuser": "is_superuser",
+    "username": "username",
+    "email": "email",
+    "spotify_id": "spotify_account__spotify_id",
+    "display_name": "spotify_account__display_name",
+}
+
+
+def cached_user_fields(user_id):
+    """
+    CACHED_USER_FIELDS of one user (None if there is no such user), through
+    a short TTL cache (AUTH_USER_CACHE_TTL)
+    """
+    key = _user_cache_key(user_id)
+    fields = cache.get(key)
+    if fields is None:
+        row = User.objects.filter(pk=user_id).values(*CACHED_USER_FIELDS.values()).first()
+        if row is None:
+            return None
+        fields = {name: row[lookup] for name, lookup in CACHED_USER_FIELDS.items()}
+        fields["display_name"] = fields["display_name"] or fields["username"]
+        cache.set(key, fields, timeout=settings.AUTH_USER_CACHE_TTL)
+    return fields
+
+
+class ClaimsUser:
+    """
+    Authenticated user backed by JWT claims.
+
+    id / username / email / spotify_id / display_name come straight from
+    the token; is_active / is_staff / is_superuser (and profile fields
+    missing from old tokens) from cached_user_fields(). Anything else
+    (e.g. .spotify_account, .date_joined) loads User + SpotifyAccount in
+    one select_related query on first access.
+
+    Query with user_id=request.user.id rather than user=request.user; the
+    ORM only accepts model instances for the latter.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        # simplejwt puts the id in the token as a string
+        self.id = self.pk = User._meta.pk.to_python(token[api_settings.USER_ID_CLAIM])
+        self._user = None
+        self._fields = None
+        # Old tokens without profile claims fall back to the lazy lookup
+        for claim in PROFILE_CLAIMS:
+            if claim in token:
+                setattr(self, claim, token[claim])
+
+    def __str__(self):
+        return f"ClaimsUser {self.id}"
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def cached_fields(self):
+        if self._fields is None:
+            fields = cached_user_fields(self.id)
+            if fields is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            self._fields = fields
+        return self._fields
+
+    @property
+    def is_active(self):
+        return self.cached_fields()["is_active"]
+
+    def get_user(self):
+        """
+        The full User (with spotify_account joined), loaded once per request
+        """
+        if self._user is None:
+            user = User.objects.select_related("spotify_account").filter(pk=self.id).first()
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if not user.is_active:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            self._user = user
+        return self._user
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set from claims
+        if name.startswith("__") or name in ("token", "_user", "_fields"):
+            raise AttributeError(name)
+        if name in CACHED_USER_FIELDS:
+            return self.cached_fields()[name]
+        return getattr(self.get_user(), name)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request User query: request.user is a
+    ClaimsUser built from the validated token. Deactivated users are
+    rejected like JWTAuthentication does, from the cached is_active flag.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        user = ClaimsUser(validated_token)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
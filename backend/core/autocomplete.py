@@ -0,0 +1,406 @@
+import asyncio
+import heapq
+import threading
+import time
+import weakref
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .background import run_in_background
+from .models import CatalogItem, Rating, RatingAggregate, Review
+from .normalizers import compile_normalizer
+from .search import asearch_pages, normalize_query
+
+# Typeahead over a per-process, in-memory prefix index.
+#
+# Entries come from the local catalog, rated/reviewed items and recently
+# seen search results. They are sorted best-first by (local rating count,
+# Spotify popularity), so an entry's position is its rank. Keys are the
+# normalized name and every word suffix of it ("swift" finds "Taylor
+# Swift"), held in one sorted array that a prefix is bisected into.
+# Prefixes of up to SHORT_PREFIX characters, whose ranges are the largest,
+# get precomputed top lists (overall and per item type, so a type filter
+# can't empty them).
+
+SHORT_PREFIX = 2
+SHORT_PREFIX_TOP = 50
+
+_normalizers = {
+    "track": compile_normalizer("track", frozenset({"id", "name", "artists", "album_image"})),
+    "album": compile_normalizer("album", frozenset({"id", "name", "artists", "image"})),
+    "artist": compile_normalizer("artist", frozenset({"id", "name", "image"})),
+}
+
+
+def _entry(spotify_id, item_type, name, artists=(), image=None, popularity=None, rating_count=0):
+    return {
+        "id": spotify_id,
+        "type": item_type,
+        "name": name,
+        "artists": list(artists or []),
+        "image": image or None,
+        "rating_count": rating_count,
+        "popularity": popularity or 0,
+    }
+
+
+def _score(entry):
+    return (entry["rating_count"], entry["popularity"])
+
+
+def _index_keys(name):
+    words = normalize_query(name).split()
+    return {" ".join(words[start:]) for start in range(len(words))}
+
+
+class PrefixIndex:
+    def __init__(self, entries, built_at=None):
+        self.entries = sorted(entries, key=_score, reverse=True)
+        # When the entries were loaded from the database
+        self.built_at = built_at or time.time()
+
+        pairs = sorted(
+            (key, position)
+            for position, entry in enumerate(self.entries)
+            for key in _index_keys(entry["name"])
+        )
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+        top = {}
+        for key, position in pairs:
+            for length in range(1, min(SHORT_PREFIX, len(key)) + 1):
+                top.setdefault(key[:length], set()).add(position)
+        self.top = {}
+        for prefix, positions in top.items():
+            positions = sorted(positions)
+            lists = {None: positions[:SHORT_PREFIX_TOP]}
+            for position in positions:
+                typed = lists.setdefault(self.entries[position]["type"], [])
+                if len(typed) < SHORT_PREFIX_TOP:
+                    typed.append(position)
+            self.top[prefix] = lists
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, prefix, limit, item_types=None):
+        if len(prefix) <= SHORT_PREFIX:
+            lists = self.top.get(prefix)
+            if not lists:
+                return []
+            if item_types is None:
+                return self._take(lists[None], limit, None)
+            return self._take(
+                heapq.merge(*(lists.get(item_type, ()) for item_type in item_types)),
+                limit,
+                item_types,
+            )
+
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        window = self.positions[lo:hi]
+        if len(window) <= limit * 64:
+            return self._take(sorted(window), limit, item_types)
+
+        # Big range: the best few positions usually suffice, so don't sort
+        # it all unless the type filter leaves too few
+        results = self._take(heapq.nsmallest(limit * 4, window), limit, item_types)
+        if len(results) < limit:
+            results = self._take(sorted(window), limit, item_types)
+        return results
+
+    def _take(self, positions, limit, item_types):
+        """
+        First `limit` entries of sorted `positions` (duplicates skipped)
+        """
+        results = []
+        last = None
+        for position in positions:
+            if position == last:
+                continue
+            last = position
+            entry = self.entries[position]
+            if item_types is None or entry["type"] in item_types:
+                results.append(entry)
+                if len(results) == limit:
+                    break
+        return results
+
+
+def _load_entries(recent):
+    counts = {
+        (spotify_id, item_type): count
+        for spotify_id, item_type, count in RatingAggregate.objects.filter(count__gt=0)
+        .values_list("spotify_id", "item_type", "count")
+        .iterator(chunk_size=5000)
+    }
+
+    entries = {}
+    for item in CatalogItem.objects.only(
+        "spotify_id", "item_type", "name", "artists", "image_url", "popularity"
+    ).iterator(chunk_size=5000):
+        key = (item.spotify_id, item.item_type)
+        entries[key] = _entry(
+            item.spotify_id, item.item_type, item.name, item.artists,
+            item.image_url, item.popularity, counts.get(key, 0),
+        )
+
+    for key, entry in recent.items():
+        if key not in entries:
+            entries[key] = dict(entry, rating_count=counts.get(key, 0))
+
+    # Rated/reviewed items the catalog hasn't hydrated yet
+    for model in (Rating, Review):
+        named = (
+            model.objects.exclude(item_name__isnull=True)
+            .exclude(item_name="")
+            .values_list("spotify_id", "item_type", "item_name")
+            .distinct()
+        )
+        for spotify_id, item_type, item_name in named.iterator(chunk_size=5000):
+            key = (spotify_id, item_type)
+            if key not in entries:
+                entries[key] = _entry(
+                    spotify_id, item_type, item_name, rating_count=counts.get(key, 0)
+                )
+
+    return list(entries.values())
+
+
+# Index state (per process)
+#
+# _recent holds the last AUTOCOMPLETE_RECENT_MAX search results seen, so
+# they survive rebuilds. Results not in the index yet are _pending, with
+# their keys in _overlay: a small sorted array of (key, (id, type)) that
+# lookups bisect alongside the index. Once AUTOCOMPLETE_PENDING_MAX pile
+# up they are folded into a new index in memory; the database is only
+# read again when the index is older than AUTOCOMPLETE_INDEX_TTL.
+
+_index = None
+_recent = OrderedDict()
+_pending = {}
+_overlay = []
+_guard = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def _drop_pending(keys):
+    """
+    Forgets pending entries the index now has (hold _guard)
+    """
+    for key in keys:
+        _pending.pop(key, None)
+    _overlay[:] = [pair for pair in _overlay if pair[1] in _pending]
+
+
+def _build():
+    global _index
+
+    with _guard:
+        recent = OrderedDict(_recent)
+    index = PrefixIndex(_load_entries(recent))
+    with _guard:
+        _index = index
+        _drop_pending(recent)
+    return index
+
+
+def _fold_pending():
+    global _index
+
+    with _build_lock:
+        index = _index
+        if index is None:
+            return
+        with _guard:
+            pending = dict(_pending)
+
+        entries = {(entry["id"], entry["type"]): entry for entry in index.entries}
+        for key, entry in pending.items():
+            # Keep the rating counts the index loaded
+            current = entries.get(key)
+            entries[key] = dict(entry, rating_count=current["rating_count"] if current else 0)
+        folded = PrefixIndex(entries.values(), built_at=index.built_at)
+
+        with _guard:
+            _index = folded
+            _drop_pending(pending)
+
+
+def rebuild_index():
+    with _build_lock:
+        return _build()
+
+
+def _schedule_rebuild():
+    run_in_background(rebuild_index, key="autocomplete-index")
+
+
+def _schedule_fold():
+    run_in_background(_fold_pending, key="autocomplete-fold")
+
+
+def _ensure_index():
+    with _build_lock:
+        # Concurrent first requests build once
+        return _index if _index is not None else _build()
+
+
+def get_index():
+    """
+    The current index, built on first use and refreshed in the background
+    once older than AUTOCOMPLETE_INDEX_TTL
+    """
+    index = _index
+    if index is None:
+        return _ensure_index()
+    if time.time() - index.built_at > settings.AUTOCOMPLETE_INDEX_TTL:
+        _schedule_rebuild()
+    return index
+
+
+def entries_from_pages(pages):
+    """
+    Index entries for {item_type: {"items": [...]}} search pages
+    """
+    return [
+        _entry(
+            item["id"], item_type, item["name"], item.get("artists"),
+            item.get("album_image") or item.get("image"), raw.get("popularity"),
+        )
+        for item_type, page in pages.items()
+        for raw in page["items"]
+        if raw
+        for item in [_normalizers[item_type](raw)]
+        if item["id"] and item["name"]
+    ]
+
+
+def merge_suggestions(results, extra, limit):
+    """
+    `results` plus the `extra` entries not already in it, best `limit` first
+    """
+    seen = {(entry["id"], entry["type"]) for entry in results}
+    unique = []
+    for entry in extra:
+        key = (entry["id"], entry["type"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(entry)
+    if not unique:
+        return results
+    return sorted(results + unique, key=_score, reverse=True)[:limit]
+
+
+def note_search_results(pages):
+    """
+    Feeds {item_type: {"items": [...]}} search pages into the index
+    """
+    entries = entries_from_pages(pages)
+    if not entries:
+        return
+
+    with _guard:
+        for entry in entries:
+            key = (entry["id"], entry["type"])
+            _recent[key] = entry
+            _recent.move_to_end(key)
+            if key not in _pending:
+                for index_key in _index_keys(entry["name"]):
+                    insort(_overlay, (index_key, key))
+            _pending[key] = entry
+        while len(_recent) > settings.AUTOCOMPLETE_RECENT_MAX:
+            _recent.popitem(last=False)
+        fold = len(_pending) >= settings.AUTOCOMPLETE_PENDING_MAX
+
+    if fold:
+        _schedule_fold()
+
+
+def lookup(query, limit, item_types=None):
+    """
+    Best `limit` entries whose name (or a word suffix of it) starts with
+    `query`, from the index plus results seen since it was built
+    """
+    prefix = normalize_query(query)
+    if not prefix:
+        return []
+
+    results = get_index().lookup(prefix, limit, item_types)
+
+    with _guard:
+        lo = bisect_left(_overlay, (prefix,))
+        hi = bisect_left(_overlay, (prefix + "\U0010ffff",), lo)
+        pending = [_pending[key] for _, key in _overlay[lo:hi]]
+    if pending:
+        results = merge_suggestions(
+            results,
+            [entry for entry in pending if item_types is None or entry["type"] in item_types],
+            limit,
+        )
+
+    return results
+
+
+async def alookup(query, limit, item_types=None):
+    """
+    lookup() for async views; only the very first build touches the database
+    """
+    if _index is None:
+        await sync_to_async(_ensure_index)()
+    return lookup(query, limit, item_types)
+
+
+# Upstream fallback
+#
+# Per event loop: the latest request per user (debounce: a request that
+# was superseded while waiting AUTOCOMPLETE_DEBOUNCE_MS doesn't go
+# upstream) and one in-flight fetch per query (dedupe). Across users and
+# processes, fetches also share the search cache.
+
+_loop_state = weakref.WeakKeyDictionary()
+
+
+def _state():
+    return _loop_state.setdefault(
+        asyncio.get_running_loop(), {"latest": {}, "inflight": {}}
+    )
+
+
+async def _fetch_upstream(query, item_types, market):
+    pages = await asearch_pages(
+        query,
+        {item_type: (0, settings.AUTOCOMPLETE_UPSTREAM_LIMIT) for item_type in item_types},
+        market=market,
+    )
+    note_search_results(pages)
+    return pages
+
+
+async def aupstream_suggestions(user_id, query, item_types, market):
+    """
+    Spotify search pages for `query`, or None if a newer request from the
+    same user arrived during the debounce window
+    """
+    state = _state()
+    marker = object()
+    state["latest"][user_id] = marker
+
+    await asyncio.sleep(settings.AUTOCOMPLETE_DEBOUNCE_MS / 1000)
+    if state["latest"].get(user_id) is not marker:
+        return None
+    state["latest"].pop(user_id, None)
+
+    query = normalize_query(query)
+    key = (query, tuple(sorted(item_types)), market)
+    task = state["inflight"].get(key)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_fetch_upstream(query, item_types, market))
+        state["inflight"][key] = task
+        task.add_done_callback(lambda _t: state["inflight"].pop(key, None))
+
+    return await asyncio.shield(task)
@@ -0,0 +1,48 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Small in-process pool for work that shouldn't hold up a response
+# (token refreshes inside the skew window, catalog hydration, ...)
+_executor = None
+_pending = set()
+_guard = threading.Lock()
+
+
+def _run(key, fn, args):
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("Background task %s failed", key or fn.__name__)
+    finally:
+        if key is not None:
+            with _guard:
+                _pending.discard(key)
+        close_old_connections()
+
+
+def run_in_background(fn, *args, key=None):
+    """
+    Runs fn(*args) on the background pool. With a `key`, at most one task
+    per key is queued or running at a time; duplicates are dropped.
+    """
+    global _executor
+
+    with _guard:
+        if key is not None:
+            if key in _pending:
+                return
+            _pending.add(key)
+
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix="core-background",
+            )
+
+    _executor.submit(_run, key, fn, args)
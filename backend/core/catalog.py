@@ -0,0 +1,208 @@
+import hashlib
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .background import run_in_background
+from .images import pick_image
+from .models import CatalogItem, SpotifyAccount
+from .spotify_client import SpotifyAPIError, spotify_user_get
+
+# Spotify multi-get endpoints: item_type -> (path, response key, max IDs per call)
+MULTI_GET = {
+    "track": ("/tracks", "tracks", 50),
+    "album": ("/albums", "albums", 20),
+    "artist": ("/artists", "artists", 50),
+}
+
+# Spotify IDs are 22 base62 characters; anything else fails the whole
+# multi-get batch with a 400
+SPOTIFY_ID_RE = re.compile(r"^[0-9A-Za-z]{22}$")
+
+CATALOG_FIELDS = [
+    "name",
+    "artists",
+    "album",
+    "image_url",
+    "duration_ms",
+    "release_date",
+    "popularity",
+    "fetched_at",
+]
+
+
+def catalog_item_from_spotify(item_type, raw, fetched_at):
+    """
+    Build an (unsaved) CatalogItem from a Spotify track/album/artist object
+    """
+    if item_type == "track":
+        album = raw.get("album") or {}
+        images = album.get("images")
+    else:
+        album = {}
+        images = raw.get("images")
+
+    return CatalogItem(
+        spotify_id=raw["id"],
+        item_type=item_type,
+        name=(raw.get("name") or "")[:255],
+        artists=[a.get("name") for a in raw.get("artists") or []],
+        album=(album.get("name") or "")[:255],
+        image_url=pick_image(images, settings.CATALOG_IMAGE_SIZE) or "",
+        duration_ms=raw.get("duration_ms"),
+        release_date=raw.get("release_date") or "",
+        popularity=raw.get("popularity"),
+        fetched_at=fetched_at,
+    )
+
+
+def _fresh_keys(pairs):
+    """
+    (spotify_id, item_type) pairs already in the catalog within the TTL
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CATALOG_TTL)
+    rows = CatalogItem.objects.filter(
+        spotify_id__in={spotify_id for spotify_id, _ in pairs},
+        fetched_at__gte=cutoff,
+    ).values_list("spotify_id", "item_type")
+    return set(rows) & set(pairs)
+
+
+# IDs Spotify answered with null (deleted/unknown) are remembered for
+# CATALOG_TTL, so lists keep treating them as settled instead of asking
+# for them again on every request.
+
+
+def _missing_key(pair):
+    spotify_id, item_type = pair
+    return f"catalog:missing:{item_type}:{spotify_id}"
+
+
+def _known_missing(pairs):
+    """
+    Pairs Spotify recently reported as unknown
+    """
+    if not pairs:
+        return set()
+    keys = {_missing_key(pair): pair for pair in pairs}
+    return {keys[key] for key in cache.get_many(keys)}
+
+
+def _remember_missing(pairs):
+    if pairs:
+        cache.set_many({_missing_key(pair): True for pair in pairs}, timeout=settings.CATALOG_TTL)
+
+
+def hydrate_catalog(pairs, account: SpotifyAccount, force=False):
+    """
+    Makes sure every (spotify_id, item_type) pair has fresh catalog metadata.
+
+    Pairs are deduplicated, fresh rows and known-missing IDs are skipped
+    (unless `force`), and the rest are fetched with one multi-get call per
+    batch of IDs and upserted. Malformed IDs, and every ID of a batch
+    Spotify rejects, are remembered as missing. Returns the number of items
+    written.
+    """
+    pairs = {(spotify_id, item_type) for spotify_id, item_type in pairs if spotify_id}
+    malformed = {pair for pair in pairs if not SPOTIFY_ID_RE.match(pair[0])}
+    _remember_missing(malformed)
+    pairs -= malformed
+    if not force:
+        pairs -= _fresh_keys(pairs)
+        pairs -= _known_missing(pairs)
+
+    by_type = {}
+    for spotify_id, item_type in sorted(pairs):
+        if item_type in MULTI_GET:
+            by_type.setdefault(item_type, []).append(spotify_id)
+
+    written = 0
+    for item_type, ids in by_type.items():
+        path, key, batch_size = MULTI_GET[item_type]
+
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            try:
+                data = spotify_user_get(path, account, params={"ids": ",".join(batch)}) or {}
+            except SpotifyAPIError as exc:
+                if exc.status_code != 400:
+                    raise
+                # Don't retry a rejected batch on every list request
+                _remember_missing({(spotify_id, item_type) for spotify_id in batch})
+                continue
+
+            now = timezone.now()
+            items = [
+                catalog_item_from_spotify(item_type, raw, now)
+                for raw in data.get(key) or []
+                # Unknown IDs come back as null
+                if raw and raw.get("id")
+            ]
+            found = {item.spotify_id for item in items}
+            _remember_missing(
+                {(spotify_id, item_type) for spotify_id in batch if spotify_id not in found}
+            )
+            if items:
+                CatalogItem.objects.bulk_create(
+                    items,
+                    update_conflicts=True,
+                    unique_fields=["spotify_id", "item_type"],
+                    update_fields=CATALOG_FIELDS,
+                )
+                written += len(items)
+
+    return written
+
+
+def _hydrate_for_user(user_id, pairs):
+    account = SpotifyAccount.objects.filter(user_id=user_id).first()
+    if account is None:
+        return
+    try:
+        hydrate_catalog(pairs, account)
+    except SpotifyAPIError:
+        # Best effort; the next list/write retries missing items
+        pass
+
+
+def schedule_catalog_hydration(user_id, pairs):
+    """
+    Hydrates missing/stale pairs in the background with the user's token
+    """
+    pairs = sorted(set(pairs))
+    if pairs:
+        # Repeated list requests queue the same work once
+        digest = hashlib.md5(repr(pairs).encode()).hexdigest()
+        run_in_background(_hydrate_for_user, user_id, pairs, key=("catalog", user_id, digest))
+
+
+def attach_catalog(objs):
+    """
+    Sets `obj.catalog_item` (or None) on each Rating/Review with a single
+    catalog query, and returns the pairs that are missing or past the TTL
+    (minus malformed IDs and IDs Spotify doesn't know)
+    """
+    pairs = {(obj.spotify_id, obj.item_type) for obj in objs}
+    if not pairs:
+        return []
+
+    catalog = {
+        (item.spotify_id, item.item_type): item
+        for item in CatalogItem.objects.filter(
+            spotify_id__in={spotify_id for spotify_id, _ in pairs}
+        )
+    }
+    for obj in objs:
+        obj.catalog_item = catalog.get((obj.spotify_id, obj.item_type))
+
+    cutoff = timezone.now() - timedelta(seconds=settings.CATALOG_TTL)
+    stale = {
+        pair
+        for pair in pairs
+        if (pair not in catalog or catalog[pair].fetched_at < cutoff)
+        and SPOTIFY_ID_RE.match(pair[0])
+    }
+    return sorted(stale - _known_missing(stale))
@@ -0,0 +1,123 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# The request being served in this thread/task, set by the middleware
+_current = ContextVar("db_router_request", default=None)
+
+
+def _pin_key(user_id):
+    return f"db:pinned:{user_id}"
+
+
+def _authenticated_user_id(request):
+    """
+    The user id DRF authenticated, without forcing Django's lazy session
+    user (that lookup would itself be routed here)
+    """
+    user = request.__dict__.get("user")
+    if user is None or type(user) is SimpleLazyObject:
+        return None
+    return user.pk if user.is_authenticated else None
+
+
+class _RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.pinned = None  # resolved once per request, after authentication
+
+    def reads_from_primary(self):
+        if self.request.method not in SAFE_METHODS:
+            return True
+        if self.pinned is None:
+            user_id = _authenticated_user_id(self.request)
+            if user_id is None:
+                return False
+            self.pinned = bool(cache.get(_pin_key(user_id)))
+        return self.pinned
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to "default"; reads made while serving a safe (GET/HEAD)
+    request go to a random replica, except:
+    - inside a transaction
+    - for a user who wrote within DB_REPLICA_STICKY_SECONDS
+    - outside requests (commands, background tasks)
+    """
+
+    def __init__(self):
+        self.replicas = [alias for alias in settings.DATABASES if alias != "default"]
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or connections["default"].in_atomic_block:
+            return "default"
+        state = _current.get()
+        if state is None or state.reads_from_primary():
+            return "default"
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Exposes the request to PrimaryReplicaRouter, and after a successful
+    unsafe request pins the user's reads to the primary for
+    DB_REPLICA_STICKY_SECONDS so they see their own writes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _user_to_pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        return _authenticated_user_id(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _current.set(_RequestState(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        user_id = self._user_to_pin(request, response)
+        if user_id is not None:
+            cache.set(_pin_key(user_id), True, timeout=settings.DB_REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        token = _current.set(_RequestState(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        user_id = self._user_to_pin(request, response)
+        if user_id is not None:
+            await cache.aset(_pin_key(user_id), True, timeout=settings.DB_REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+from .spotify_client import _http_timeout, get_http_session
+
+
+def pick_image(images, size=None):
+    """
+    URL of the smallest Spotify image whose longest side is at least
+    `size` px (falls back to the largest). Without a size, the largest.
+    """
+    largest = fitting = None
+    largest_side = fitting_side = -1
+
+    # Single pass; this runs for every item of every list payload
+    for image in images or ():
+        if not image or not image.get("url"):
+            continue
+        width = image.get("width") or 0
+        height = image.get("height") or 0
+        side = width if width > height else height
+        if side > largest_side:
+            largest, largest_side = image, side
+        if size and side >= size and (fitting is None or side < fitting_side):
+            fitting, fitting_side = image, side
+
+    image = fitting or largest
+    return image["url"] if image else None
+
+
+def image_size_param(request):
+    """
+    ?image_size=<px> as an int, or None if absent/invalid
+    """
+    try:
+        size = int(request.query_params.get("image_size", ""))
+    except ValueError:
+        return None
+    return size if size > 0 else None
+
+
+# Image proxy
+#
+# GET /images/proxy/?url=... serves Spotify CDN art from a bounded on-disk
+# cache. Spotify image URLs are content-addressed (a new image gets a new
+# URL), so cached files never go stale and can be served as immutable.
+
+class ImageProxyError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_MAGIC = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def sniff_content_type(head: bytes):
+    for magic, content_type in _MAGIC:
+        if head.startswith(magic):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_allowed_image_url(url) -> bool:
+    parts = urlsplit(url or "")
+    host = (parts.hostname or "").lower()
+    return parts.scheme == "https" and any(
+        host == suffix.lstrip(".") or host.endswith(suffix)
+        for suffix in settings.IMAGE_PROXY_HOST_SUFFIXES
+    )
+
+
+def _cache_path(url):
+    return os.path.join(settings.IMAGE_CACHE_DIR, hashlib.sha256(url.encode()).hexdigest())
+
+
+# Cache bookkeeping
+#
+# _cache_bytes is this process's running total of IMAGE_CACHE_DIR: set by a
+# directory scan, then bumped by each download. The directory is only
+# scanned again when the total goes over IMAGE_CACHE_MAX_BYTES (to evict)
+# or is older than IMAGE_CACHE_RESCAN_SECONDS (to pick up other workers'
+# downloads). Misses for the same URL are single-flight per process through
+# a striped lock; the second caller finds the first one's file.
+
+_FETCH_LOCK_STRIPES = 64
+_fetch_locks = [threading.Lock() for _ in range(_FETCH_LOCK_STRIPES)]
+
+_cache_bytes = None
+_scanned_at = 0.0
+_guard = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+def _evict(cache_dir, max_bytes):
+    """
+    Least-recently-used eviction (hits bump mtime) down to 90% of max_bytes
+    if over it. Returns the cache size afterwards.
+    """
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            try:
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            except FileNotFoundError:
+                continue
+
+    if total <= max_bytes:
+        return total
+    for _mtime, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        if total <= max_bytes * 0.9:
+            break
+    return total
+
+
+def _record_download(size):
+    global _cache_bytes, _scanned_at
+
+    with _guard:
+        if _cache_bytes is not None and time.monotonic() - _scanned_at < settings.IMAGE_CACHE_RESCAN_SECONDS:
+            _cache_bytes += size
+            if _cache_bytes <= settings.IMAGE_CACHE_MAX_BYTES:
+                return
+
+    # One scan at a time; concurrent downloads just add to the total
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        total = _evict(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+        with _guard:
+            _cache_bytes, _scanned_at = total, time.monotonic()
+    finally:
+        _evict_lock.release()
+
+
+def _open_cached(path):
+    """
+    Open handle on a cached image (FileNotFoundError on a miss). An
+    eviction after open() can't break the response; the handle stays valid.
+    """
+    image = open(path, "rb")
+    try:
+        os.utime(path)  # LRU bump
+    except FileNotFoundError:
+        pass
+    return image
+
+
+def _download(url, path):
+    """
+    Fetches `url` into `path`. Returns (open handle, size).
+    """
+    try:
+        resp = get_http_session().get(
+            url, timeout=_http_timeout(), stream=True, allow_redirects=False
+        )
+    except requests.RequestException:
+        raise ImageProxyError("Failed to fetch image", 502)
+
+    with resp:
+        if resp.status_code != 200:
+            raise ImageProxyError("Upstream image not available", 404 if resp.status_code == 404 else 502)
+
+        max_bytes = settings.IMAGE_PROXY_MAX_BYTES
+        # Write to a temp file and rename, so readers never see partial images
+        fd, tmp_path = tempfile.mkstemp(dir=settings.IMAGE_CACHE_DIR, prefix=".partial-")
+        written = None
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as out:
+                for chunk in resp.iter_content(64 * 1024):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ImageProxyError("Image too large", 502)
+                    out.write(chunk)
+            # Opened before the rename, so eviction can't pull it from under us
+            written = open(tmp_path, "rb")
+            if sniff_content_type(written.read(12)) is None:
+                raise ImageProxyError("Upstream response is not an image", 502)
+            written.seek(0)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if written is not None:
+                written.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return written, size
+
+
+def _fetch(url, path):
+    lock = _fetch_locks[hash(path) % _FETCH_LOCK_STRIPES]
+    with lock:
+        try:
+            return _open_cached(path)  # fetched while we waited
+        except FileNotFoundError:
+            pass
+        image, size = _download(url, path)
+    _record_download(size)
+    return image
+
+
+def cached_image(url):
+    """
+    (open binary file, content type) of the cached copy of `url`, fetching
+    it on a miss. The caller closes the file. Raises ImageProxyError.
+    """
+    if not is_allowed_image_url(url):
+        raise ImageProxyError("Only Spotify CDN image URLs can be proxied", 400)
+
+    os.makedirs(settings.IMAGE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(url)
+    try:
+        image = _open_cached(path)
+    except FileNotFoundError:
+        image = _fetch(url, path)
+
+    try:
+        content_type = sniff_content_type(image.read(12))
+        image.seek(0)
+    except BaseException:
+        image.close()
+        raise
+    return image, content_type
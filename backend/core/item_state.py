@@ -0,0 +1,62 @@
+from .models import Rating, Review
+
+# kind -> model holding the user's state for an item
+STATE_MODELS = {
+    "rating": Rating,
+    "review": Review,
+}
+
+VALID_ITEM_TYPES = {choice[0] for choice in Rating.ITEM_TYPE_CHOICES}
+
+
+def parse_item_pairs(items, max_items):
+    """
+    Turns request input into a list of unique (spotify_id, item_type) pairs.
+
+    Accepts {"spotify_id": ..., "item_type": ...} dicts or "item_type:spotify_id"
+    strings. Returns (pairs, error); error is a message for a 400 or None.
+    """
+    if not isinstance(items, list) or not items:
+        return [], "items must be a non-empty list."
+    if len(items) > max_items:
+        return [], f"At most {max_items} items per request."
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            spotify_id, item_type = item.get("spotify_id"), item.get("item_type")
+        elif isinstance(item, str) and ":" in item:
+            item_type, spotify_id = item.split(":", 1)
+        else:
+            return [], f"Invalid item: {item!r}"
+
+        if not spotify_id or not isinstance(spotify_id, str):
+            return [], "Each item needs a spotify_id."
+        if item_type not in VALID_ITEM_TYPES:
+            return [], f"item_type must be one of {sorted(VALID_ITEM_TYPES)}"
+        pairs.append((spotify_id, item_type))
+
+    # Keep request order, drop repeats
+    return list(dict.fromkeys(pairs)), None
+
+
+def item_states(user, pairs, kinds=("rating", "review")):
+    """
+    The user's rating/review objects for each (spotify_id, item_type) pair:
+    {pair: {"rating": Rating | None, "review": Review | None}}
+
+    One query per table, on the (user, spotify_id, item_type) unique index.
+    """
+    states = {pair: {kind: None for kind in kinds} for pair in pairs}
+    if not states:
+        return states
+
+    spotify_ids = {spotify_id for spotify_id, _ in states}
+    for kind in kinds:
+        rows = STATE_MODELS[kind].objects.filter(user_id=user.id, spotify_id__in=spotify_ids)
+        for obj in rows:
+            pair = (obj.spotify_id, obj.item_type)
+            if pair in states:
+                states[pair][kind] = obj
+
+    return states
@@ -0,0 +1,186 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, Sum, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .background import run_in_background
+from .models import CatalogItem, LeaderboardEntry, Rating, RatingAggregate
+
+ITEM_TYPES = [choice[0] for choice in Rating.ITEM_TYPE_CHOICES]
+
+_WINDOW_RE = re.compile(r"^(\d+)d$")
+
+
+def parse_window(window):
+    """
+    "all" -> None, "30d" -> timedelta(days=30); ValueError otherwise
+    """
+    if window == "all":
+        return None
+    match = _WINDOW_RE.match(window or "")
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid leaderboard window: {window!r}")
+    return timedelta(days=int(match.group(1)))
+
+
+def leaderboard_windows():
+    return [window.strip() for window in settings.LEADERBOARD_WINDOWS.split(",") if window.strip()]
+
+
+def _bayesian_score(prior_weight, prior_mean):
+    """
+    (C * m + sum) / (C + n): pulls items with few ratings towards the mean,
+    so a single 5.00 doesn't top the chart
+    """
+    return (
+        Value(prior_weight * prior_mean) + Cast(F("sum"), FloatField())
+    ) / (Value(prior_weight) + Cast(F("count"), FloatField()))
+
+
+def _ranked_groups(item_type, since):
+    """
+    Queryset of {spotify_id, count, sum, score} ordered best first.
+    The all-time chart reads the maintained RatingAggregate rows; windows
+    group the ratings given (or changed) since `since`.
+    """
+    if since is None:
+        groups = RatingAggregate.objects.filter(item_type=item_type, count__gt=0)
+    else:
+        groups = (
+            Rating.objects.filter(item_type=item_type, updated_at__gte=since)
+            .order_by()
+            .values("spotify_id")
+            .annotate(count=Count("id"), sum=Sum("rating"))
+        )
+
+    totals = groups.aggregate(n=Sum("count"), total=Sum("sum"))
+    if not totals["n"]:
+        return None
+    prior_mean = float(totals["total"]) / totals["n"]
+
+    return (
+        groups.annotate(score=_bayesian_score(settings.LEADERBOARD_PRIOR_WEIGHT, prior_mean))
+        .order_by("-score", "-count", "spotify_id")
+        .values("spotify_id", "count", "sum", "score")
+    )
+
+
+def _item_names(item_type, spotify_ids):
+    """
+    Catalog names, falling back to a rater-supplied item_name (one grouped
+    row per item, not one per rater) for items the catalog doesn't have
+    """
+    names = dict(
+        CatalogItem.objects.filter(item_type=item_type, spotify_id__in=spotify_ids)
+        .values_list("spotify_id", "name")
+    )
+    missing = set(spotify_ids) - set(names)
+    if missing:
+        names.update(
+            Rating.objects.filter(item_type=item_type, spotify_id__in=missing)
+            .exclude(item_name__isnull=True)
+            .exclude(item_name="")
+            .order_by()
+            .values("spotify_id")
+            .annotate(name=Max("item_name"))
+            .values_list("spotify_id", "name")
+        )
+    return names
+
+
+def compute_leaderboard(item_type, window, now=None):
+    """
+    Top LEADERBOARD_SIZE items for one chart, as unsaved LeaderboardEntry rows
+    """
+    now = now or timezone.now()
+    delta = parse_window(window)
+    groups = _ranked_groups(item_type, None if delta is None else now - delta)
+    if groups is None:
+        return []
+
+    top = list(groups[: settings.LEADERBOARD_SIZE])
+    names = _item_names(item_type, [row["spotify_id"] for row in top])
+
+    return [
+        LeaderboardEntry(
+            window=window,
+            item_type=item_type,
+            rank=rank,
+            spotify_id=row["spotify_id"],
+            item_name=names.get(row["spotify_id"], "")[:255],
+            count=row["count"],
+            average=round(float(row["sum"]) / row["count"], 2),
+            score=row["score"],
+            computed_at=now,
+        )
+        for rank, row in enumerate(top, start=1)
+    ]
+
+
+def _computed_at_key(window, item_type):
+    return f"leaderboard:{window}:{item_type}:computed-at"
+
+
+def refresh_leaderboards(windows=None, item_types=None):
+    """
+    Recomputes the given charts (default: every configured window and type),
+    each swapped in atomically. Returns the number of entries written.
+    """
+    now = timezone.now()
+    written = 0
+    for window in windows or leaderboard_windows():
+        for item_type in item_types or ITEM_TYPES:
+            entries = compute_leaderboard(item_type, window, now=now)
+            with transaction.atomic():
+                LeaderboardEntry.objects.filter(window=window, item_type=item_type).delete()
+                LeaderboardEntry.objects.bulk_create(entries)
+            # Also covers empty charts, which have no row to carry computed_at
+            cache.set(_computed_at_key(window, item_type), now, timeout=None)
+            written += len(entries)
+    return written
+
+
+def schedule_leaderboard_refresh(window, item_type):
+    run_in_background(
+        refresh_leaderboards, [window], [item_type],
+        key=f"leaderboard-refresh:{window}:{item_type}",
+    )
+
+
+def _computed_at(window, item_type):
+    computed_at = cache.get(_computed_at_key(window, item_type))
+    if computed_at is None:
+        computed_at = (
+            LeaderboardEntry.objects.filter(window=window, item_type=item_type)
+            .values_list("computed_at", flat=True)
+            .first()
+        )
+    return computed_at
+
+
+def leaderboard_page(item_type, window, offset=0, limit=20):
+    """
+    One page of a chart, read by rank range. Returns (entries, computed_at).
+
+    A chart older than LEADERBOARD_MAX_AGE is served as is while a refresh
+    runs in the background; a chart that was never computed is built inline.
+    """
+    computed_at = _computed_at(window, item_type)
+    if computed_at is None:
+        refresh_leaderboards([window], [item_type])
+        computed_at = _computed_at(window, item_type)
+    elif timezone.now() - computed_at > timedelta(seconds=settings.LEADERBOARD_MAX_AGE):
+        schedule_leaderboard_refresh(window, item_type)
+
+    entries = LeaderboardEntry.objects.filter(
+        window=window,
+        item_type=item_type,
+        rank__gt=offset,
+        rank__lte=offset + limit,
+    )
+    return list(entries), computed_at
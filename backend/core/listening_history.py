@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, Value, Window
+from django.db.models.functions import Coalesce, NullIf, RowNumber
+from django.utils.dateparse import parse_datetime
+
+from .models import PlayEvent, SpotifyAccount
+from .normalizers import compile_normalizer
+from .spotify_client import aspotify_user_get
+
+# Spotify caps recently-played at 50 items per page
+PAGE_SIZE = 50
+
+# Fields of /user/recently-played/ items (for ?fields=)
+RECENTLY_PLAYED_FIELDS = frozenset(
+    {"played_at", "track_name", "artists", "album", "album_image", "duration_ms"}
+)
+
+_normalize_track = compile_normalizer(
+    "track", frozenset({"id", "name", "artists", "album", "album_image", "duration_ms"})
+)
+
+
+def _sync_key(account_id):
+    return f"play-history:sync:{account_id}"
+
+
+def _play_event(user_id, item):
+    raw = item.get("track") or {}
+    track = _normalize_track(raw)
+    played_at = parse_datetime(item.get("played_at") or "")
+
+    # Skip broken entries
+    if not track["name"] or played_at is None:
+        return None
+
+    return PlayEvent(
+        user_id=user_id,
+        spotify_id=track["id"] or "",
+        track_name=track["name"][:255],
+        artists=track["artists"],
+        album=(track["album"] or "")[:255],
+        album_image=track["album_image"] or "",
+        album_images=(raw.get("album") or {}).get("images") or [],
+        duration_ms=track["duration_ms"],
+        played_at=played_at,
+    )
+
+
+async def aupdate_play_history(account: SpotifyAccount) -> int:
+    """
+    Pulls plays newer than the latest stored one, using Spotify's `after`
+    cursor, and returns how many plays were fetched.
+
+    Runs at most once per PLAY_HISTORY_SYNC_INTERVAL per account; the
+    cache key doubles as a lease so concurrent requests don't sync twice.
+    """
+    if not await cache.aadd(
+        _sync_key(account.pk), 1, timeout=settings.PLAY_HISTORY_SYNC_INTERVAL
+    ):
+        return 0
+
+    try:
+        latest = (
+            await PlayEvent.objects.filter(user_id=account.user_id).aaggregate(
+                latest=Max("played_at")
+            )
+        )["latest"]
+
+        params = {"limit": PAGE_SIZE}
+        if latest is not None:
+            # Cursor is a unix timestamp in ms; Spotify returns plays after it
+            params["after"] = int(latest.timestamp() * 1000)
+
+        fetched = 0
+        for _page in range(settings.PLAY_HISTORY_MAX_PAGES):
+            data = await aspotify_user_get(
+                "/me/player/recently-played", account=account, params=params
+            ) or {}
+
+            events = [
+                event
+                for event in (_play_event(account.user_id, item) for item in data.get("items", []))
+                if event is not None
+            ]
+            if events:
+                await PlayEvent.objects.abulk_create(events, ignore_conflicts=True)
+                fetched += len(events)
+
+            after = (data.get("cursors") or {}).get("after")
+            if latest is None or not data.get("next") or not after:
+                # First sync only gets Spotify's 50-item window anyway
+                break
+            params = {"limit": PAGE_SIZE, "after": after}
+
+        return fetched
+    except Exception:
+        # Let the next request retry instead of waiting out the interval
+        await cache.adelete(_sync_key(account.pk))
+        raise
+
+
+def recent_unique_plays(user_id, limit=5):
+    """
+    Most recent play of each distinct track (by Spotify ID, falling back to
+    name for local files), newest first, deduplicated in the database.
+
+    Only the latest `limit` * PLAY_HISTORY_UNIQUE_SCAN plays are ranked, so
+    the cost doesn't grow with the user's history.
+    """
+    track_key = Coalesce(NullIf(F("spotify_id"), Value("")), F("track_name"))
+    latest = (
+        PlayEvent.objects.filter(user_id=user_id)
+        .order_by("-played_at")
+        .values("pk")[: limit * settings.PLAY_HISTORY_UNIQUE_SCAN]
+    )
+
+    return (
+        PlayEvent.objects.filter(pk__in=latest)
+        .annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[track_key],
+                order_by=F("played_at").desc(),
+            )
+        )
+        .filter(position=1)
+        .order_by("-played_at")[:limit]
+    )
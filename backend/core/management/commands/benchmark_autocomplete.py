@@ -0,0 +1,75 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import autocomplete
+from core.autocomplete import PrefixIndex, _entry
+
+WORDS = [
+    "midnight", "golden", "hour", "blue", "love", "song", "city", "lights", "summer",
+    "dream", "fire", "heart", "night", "wild", "river", "echo", "paper", "moon",
+    "electric", "silver", "rain", "ghost", "velvet", "ocean", "neon", "honey",
+]
+
+
+def _fake_entries(count):
+    return [
+        _entry(
+            f"{index:022d}",
+            random.choice(["track", "album", "artist"]),
+            " ".join(random.choice(WORDS) for _ in range(random.randint(1, 4))),
+            popularity=random.randint(0, 100),
+            rating_count=int(random.paretovariate(1.5)) - 1,
+        )
+        for index in range(count)
+    ]
+
+
+def _percentile(samples, fraction):
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure /discover/autocomplete/ index lookups (p50/p99/max per "
+        "prefix length) on a synthetic index, or the real one with --live."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=100_000,
+                            help="Synthetic index size (default: 100000).")
+        parser.add_argument("--lookups", type=int, default=20_000,
+                            help="Lookups per prefix length (default: 20000).")
+        parser.add_argument("--limit", type=int, default=8,
+                            help="Suggestions per lookup (default: 8).")
+        parser.add_argument("--live", action="store_true",
+                            help="Build the index from the database instead.")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+
+        started = time.perf_counter()
+        if options["live"]:
+            index = autocomplete.rebuild_index()
+        else:
+            index = PrefixIndex(_fake_entries(options["entries"]))
+        self.stdout.write(
+            f"Index: {len(index)} entries, {len(index.keys)} keys, "
+            f"built in {time.perf_counter() - started:.2f}s"
+        )
+        if not index.keys:
+            return
+
+        for length in (1, 2, 3, 5, 8):
+            samples = []
+            for _ in range(options["lookups"]):
+                prefix = random.choice(index.keys)[:length]
+                started = time.perf_counter()
+                index.lookup(prefix, options["limit"])
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            self.stdout.write(
+                f"  prefix length {length}: p50 {_percentile(samples, 0.5):.3f} ms  "
+                f"p99 {_percentile(samples, 0.99):.3f} ms  max {samples[-1]:.3f} ms"
+            )
@@ -0,0 +1,139 @@
+import gzip
+import json
+import random
+import time
+from decimal import Decimal
+
+import brotli
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Review
+from core.normalizers import normalize_search_results
+from core.renderers import ORJSONParser, ORJSONRenderer
+from core.serializers import ReviewSerializer
+
+
+def _fake_reviews(count, text_length):
+    now = timezone.now()
+    words = ["bridge", "chorus", "production", "lyrics", "vocals", "synth", "melody", "album"]
+    return [
+        Review(
+            id=index,
+            user_id=1,
+            spotify_id=f"{index:022d}",
+            item_type="album",
+            item_name=f"Album {index}",
+            text=" ".join(random.choice(words) for _ in range(text_length // 7)),
+            created_at=now,
+            updated_at=now,
+        )
+        for index in range(count)
+    ]
+
+
+def _fake_search(per_type):
+    image = [{"url": "https://i.scdn.co/image/ab67616d0000b273" + "0" * 24, "height": 640, "width": 640}]
+    artist = {"id": "0" * 22, "name": "Some Artist"}
+    return {
+        "tracks": {"items": [
+            {"id": f"t{i:021d}", "name": f"Track {i}", "artists": [artist],
+             "album": {"name": f"Album {i}", "images": image}, "duration_ms": 200000 + i}
+            for i in range(per_type)
+        ]},
+        "albums": {"items": [
+            {"id": f"a{i:021d}", "name": f"Album {i}", "artists": [artist],
+             "images": image, "release_date": "2024-01-01"}
+            for i in range(per_type)
+        ]},
+        "artists": {"items": [
+            {"id": f"r{i:021d}", "name": f"Artist {i}", "images": image,
+             "followers": {"total": 1000 * i}, "genres": ["pop", "indie"]}
+            for i in range(per_type)
+        ]},
+    }
+
+
+def _cpu_ms(fn, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        result = fn()
+    return (time.process_time() - started) * 1000 / repeat, result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare JSON rendering/parsing and compression of /reviews/ and "
+        "/discover/search/music/ payloads: stdlib JSONRenderer vs orjson, "
+        "bytes on the wire and CPU per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reviews", type=int, default=200,
+                            help="Reviews per /reviews/ page (default: 200).")
+        parser.add_argument("--review-length", type=int, default=2000,
+                            help="Characters of text per review (default: 2000).")
+        parser.add_argument("--search-results", type=int, default=50,
+                            help="Search results per type (default: 50).")
+        parser.add_argument("--repeat", type=int, default=50,
+                            help="Iterations per measurement (default: 50).")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        repeat = options["repeat"]
+
+        reviews = ReviewSerializer(
+            _fake_reviews(options["reviews"], options["review_length"]), many=True
+        ).data
+        payloads = {
+            "/reviews/": {"results": reviews, "next_cursor": None},
+            "/discover/search/music/": normalize_search_results(
+                _fake_search(options["search_results"])
+            ),
+            "Decimal values": {"count": 12, "average": 4.1, "sum": Decimal("49.20")},
+        }
+
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+        for path, data in payloads.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(path))
+
+            stdlib_ms, stdlib_body = _cpu_ms(lambda: stdlib.render(data), repeat)
+            fast_ms, fast_body = _cpu_ms(lambda: fast.render(data), repeat)
+            if json.loads(stdlib_body) != json.loads(fast_body):
+                self.stdout.write(self.style.WARNING("  orjson output differs from stdlib"))
+
+            parse_std_ms, _ = _cpu_ms(lambda: json.loads(stdlib_body), repeat)
+            parse_fast_ms, _ = _cpu_ms(
+                lambda: ORJSONParser().parse(_Stream(fast_body)), repeat
+            )
+
+            self.stdout.write(
+                f"  render  stdlib {stdlib_ms:8.3f} ms  orjson {fast_ms:8.3f} ms  "
+                f"({stdlib_ms / max(fast_ms, 1e-6):.1f}x)"
+            )
+            self.stdout.write(
+                f"  parse   stdlib {parse_std_ms:8.3f} ms  orjson {parse_fast_ms:8.3f} ms  "
+                f"({parse_std_ms / max(parse_fast_ms, 1e-6):.1f}x)"
+            )
+            self.stdout.write(
+                f"  bytes   stdlib {len(stdlib_body):9d}  orjson {len(fast_body):9d}"
+            )
+
+            gzip_ms, gzipped = _cpu_ms(lambda: gzip.compress(fast_body, compresslevel=6, mtime=0), repeat)
+            br_ms, brotlied = _cpu_ms(
+                lambda: brotli.compress(fast_body, quality=settings.COMPRESSION_BROTLI_QUALITY), repeat
+            )
+            self.stdout.write(
+                f"  gzip    {len(gzipped):9d} bytes  {gzip_ms:8.3f} ms"
+                f"   brotli {len(brotlied):9d} bytes  {br_ms:8.3f} ms"
+            )
+
+
+class _Stream:
+    def __init__(self, body):
+        self.body = body
+
+    def read(self):
+        return self.body
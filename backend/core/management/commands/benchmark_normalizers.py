@@ -0,0 +1,191 @@
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.images import pick_image
+from core.normalizers import SEARCH_FIELDS, normalize_search_results, parse_fields
+from core.renderers import ORJSONRenderer
+
+# What DiscoverScreen renders
+DEFAULT_FIELD_SETS = [
+    "id,name,artists,image,album_image,genres",
+    "id,name,image,album_image",
+]
+
+
+def _images(seed):
+    base = "https://i.scdn.co/image/ab67616d0000"
+    return [
+        {"url": f"{base}b273{seed:024d}", "height": 640, "width": 640},
+        {"url": f"{base}1e02{seed:024d}", "height": 300, "width": 300},
+        {"url": f"{base}4851{seed:024d}", "height": 64, "width": 64},
+    ]
+
+
+def _fake_search(per_type):
+    """
+    /search response close to Spotify's real shape, including the fields
+    the normalizers drop (markets, external URLs, ...)
+    """
+    markets = ["US", "GB", "DE", "FR", "SE", "BR", "JP", "MX", "CA", "AU"] * 8
+    artist = {
+        "id": "0" * 22, "name": "Some Artist", "type": "artist",
+        "uri": "spotify:artist:" + "0" * 22,
+        "external_urls": {"spotify": "https://open.spotify.com/artist/" + "0" * 22},
+    }
+
+    def album(i):
+        return {
+            "id": f"a{i:021d}", "name": f"Album {i}", "type": "album",
+            "album_type": "album", "artists": [artist], "images": _images(i),
+            "release_date": "2024-01-01", "release_date_precision": "day",
+            "total_tracks": 12, "available_markets": markets,
+            "uri": f"spotify:album:a{i:021d}",
+            "external_urls": {"spotify": f"https://open.spotify.com/album/a{i:021d}"},
+        }
+
+    return {
+        "tracks": {"items": [
+            {
+                "id": f"t{i:021d}", "name": f"Track {i}", "type": "track",
+                "artists": [artist], "album": album(i), "duration_ms": 200000 + i,
+                "popularity": 50, "explicit": False, "track_number": 1,
+                "available_markets": markets, "uri": f"spotify:track:t{i:021d}",
+                "external_ids": {"isrc": f"USRC1{i:07d}"},
+            }
+            for i in range(per_type)
+        ]},
+        "albums": {"items": [album(i) for i in range(per_type)]},
+        "artists": {"items": [
+            {
+                "id": f"r{i:021d}", "name": f"Artist {i}", "type": "artist",
+                "images": _images(i), "followers": {"href": None, "total": 1000 * i},
+                "genres": ["pop", "indie"], "popularity": 60,
+                "uri": f"spotify:artist:r{i:021d}",
+            }
+            for i in range(per_type)
+        ]},
+    }
+
+
+def _inline_normalize_search_results(raw, image_size=None):
+    """
+    The per-type loops SearchMusicView used before core/normalizers.py,
+    kept as the baseline
+    """
+    def first_image(images):
+        return pick_image(images, image_size)
+
+    results = {
+        "tracks": [],
+        "albums": [],
+        "artists": [],
+    }
+
+    tracks_block = raw.get("tracks") or {}
+    for item in tracks_block.get("items", []):
+        results["tracks"].append(
+            {
+                "id": item.get("id"),
+                "type": "track",
+                "name": item.get("name"),
+                "artists": [a.get("name") for a in (item.get("artists") or [])],
+                "album": (item.get("album") or {}).get("name"),
+                "album_image": first_image((item.get("album") or {}).get("images") or []),
+                "duration_ms": item.get("duration_ms"),
+            }
+        )
+
+    albums_block = raw.get("albums") or {}
+    for item in albums_block.get("items", []):
+        results["albums"].append(
+            {
+                "id": item.get("id"),
+                "type": "album",
+                "name": item.get("name"),
+                "artists": [a.get("name") for a in (item.get("artists") or [])],
+                "image": first_image(item.get("images") or []),
+                "release_date": item.get("release_date"),
+            }
+        )
+
+    artists_block = raw.get("artists") or {}
+    for item in artists_block.get("items", []):
+        results["artists"].append(
+            {
+                "id": item.get("id"),
+                "type": "artist",
+                "name": item.get("name"),
+                "image": first_image(item.get("images") or []),
+                "followers": (item.get("followers") or {}).get("total"),
+                "genres": item.get("genres") or [],
+            }
+        )
+
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure core/normalizers.py on /discover/search/music/ pages: CPU "
+        "per item and response bytes for the full payload and ?fields= subsets, "
+        "against the old inline normalizer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--search-results", type=int, default=50,
+                            help="Search results per type (default: 50).")
+        parser.add_argument("--repeat", type=int, default=200,
+                            help="Iterations per measurement (default: 200).")
+        parser.add_argument("--image-size", type=int, default=300,
+                            help="?image_size= to normalize with (default: 300).")
+        parser.add_argument("--fields", action="append",
+                            help="Field set to compare, e.g. id,name,image "
+                                 "(repeatable; default: what DiscoverScreen renders).")
+
+    def handle(self, *args, **options):
+        raw = _fake_search(options["search_results"])
+        items = sum(len(block["items"]) for block in raw.values())
+        repeat = options["repeat"]
+        renderer = ORJSONRenderer()
+
+        try:
+            field_sets = [None] + [
+                parse_fields(value, SEARCH_FIELDS)
+                for value in options["fields"] or DEFAULT_FIELD_SETS
+            ]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"/discover/search/music/ with {items} items, image_size={options['image_size']}"
+            )
+        )
+        runs = [("inline (baseline)", _inline_normalize_search_results, {})] + [
+            (
+                "all fields" if fields is None else ",".join(sorted(fields)),
+                normalize_search_results,
+                {"fields": fields},
+            )
+            for fields in field_sets
+        ]
+
+        baseline = None
+        for label, normalize, kwargs in runs:
+            started = time.process_time()
+            for _ in range(repeat):
+                data = normalize(raw, image_size=options["image_size"], **kwargs)
+            per_item_us = (time.process_time() - started) * 1e6 / repeat / items
+
+            body = renderer.render(data)
+            gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+            if baseline is None:
+                baseline = (per_item_us, len(body))
+
+            self.stdout.write(f"  {label}")
+            self.stdout.write(
+                f"    normalize {per_item_us:7.2f} us/item ({per_item_us / baseline[0]:.0%})  "
+                f"bytes {len(body):8d} ({len(body) / baseline[1]:.0%})  gzip {len(gzipped):7d}"
+            )
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.recommendations import refresh_item_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute item-item neighbors from the Rating table. By default only "
+        "items whose ratings changed since the last run are refreshed; "
+        "--full recomputes everything."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Recompute every item instead of only changed ones.",
+        )
+        parser.add_argument(
+            "--top-k", type=int,
+            help="Neighbors kept per item (default: RECS_TOP_K).",
+        )
+        parser.add_argument(
+            "--min-overlap", type=int,
+            help="Minimum users who rated both items (default: RECS_MIN_OVERLAP).",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int,
+            help="Ratings loaded per query (default: RECS_CHUNK_SIZE).",
+        )
+        parser.add_argument(
+            "--block-size", type=int,
+            help="Items whose similarities are computed at once (default: RECS_BLOCK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        items, written = refresh_item_similarities(
+            full=options["full"],
+            top_k=options["top_k"],
+            min_overlap=options["min_overlap"],
+            chunk_size=options["chunk_size"],
+            block_size=options["block_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[{timezone.now():%Y-%m-%d %H:%M:%S}] "
+                f"{items} items refreshed, {written} neighbors written "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.taste_match import refresh_user_similarities
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each user's most similar users by taste. By default only "
+        "users who changed at least TASTE_INVALIDATE_CHANGES ratings since the "
+        "last run are refreshed; --full recomputes everyone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Recompute every user instead of only changed ones.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int,
+            help="Ratings loaded per query (default: RECS_CHUNK_SIZE).",
+        )
+        parser.add_argument(
+            "--block-size", type=int,
+            help="Users whose similarities are computed at once (default: TASTE_BLOCK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users, written = refresh_user_similarities(
+            full=options["full"],
+            chunk_size=options["chunk_size"],
+            block_size=options["block_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"[{timezone.now():%Y-%m-%d %H:%M:%S}] "
+                f"{users} users refreshed, {written} neighbors written "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+        )
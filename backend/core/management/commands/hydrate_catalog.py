@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog import hydrate_catalog
+from core.models import Rating, Review, SpotifyAccount
+from core.spotify_client import SpotifyAPIError
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the local catalog with Spotify metadata for every rated or "
+        "reviewed item that is missing or past CATALOG_TTL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account",
+            help="spotify_id of the linked account whose token is used "
+                 "(default: the most recently updated account).",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Refetch items even if their metadata is still fresh.",
+        )
+
+    def handle(self, *args, **options):
+        accounts = SpotifyAccount.objects.order_by("-updated_at")
+        if options["account"]:
+            accounts = accounts.filter(spotify_id=options["account"])
+        account = accounts.first()
+        if account is None:
+            raise CommandError("No linked Spotify account to fetch metadata with.")
+
+        pairs = set(Rating.objects.values_list("spotify_id", "item_type").distinct())
+        pairs |= set(Review.objects.values_list("spotify_id", "item_type").distinct())
+
+        try:
+            written = hydrate_catalog(pairs, account, force=options["force"])
+        except SpotifyAPIError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(pairs)} distinct items, {written} catalog rows written")
+        )
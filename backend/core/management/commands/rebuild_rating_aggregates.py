@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.aggregates import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute every RatingAggregate row from the Rating table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000,
+            help="Aggregate rows inserted per query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_rating_aggregates(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{written} rating aggregates rebuilt"))
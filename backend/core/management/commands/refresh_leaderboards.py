@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.leaderboards import ITEM_TYPES, leaderboard_windows, parse_window, refresh_leaderboards
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the precomputed top-rated charts. Run once (cron) or with "
+        "--loop as a worker; LEADERBOARD_MAX_AGE bounds staleness either way."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", action="append",
+            help="Only this window (repeatable; default: LEADERBOARD_WINDOWS).",
+        )
+        parser.add_argument(
+            "--item-type", action="append", choices=ITEM_TYPES,
+            help="Only this item type (repeatable; default: all).",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep running, refreshing every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval", type=int, default=600,
+            help="Seconds between refreshes with --loop (default: 600).",
+        )
+
+    def handle(self, *args, **options):
+        windows = options["window"] or leaderboard_windows()
+        for window in windows:
+            try:
+                parse_window(window)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        while True:
+            started = time.monotonic()
+            written = refresh_leaderboards(windows, options["item_type"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"[{timezone.now():%Y-%m-%d %H:%M:%S}] "
+                    f"{written} leaderboard entries written "
+                    f"in {time.monotonic() - started:.2f}s"
+                )
+            )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import SpotifyAccount
+from core.spotify_client import (
+    SpotifyAPIError,
+    SpotifyAuthError,
+    SpotifyRateLimitError,
+    refresh_spotify_token_if_expiring,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Spaces out calls so at most `rate` start per second (shared by all workers).
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        # Push every pending call back, e.g. after a 429
+        with self.lock:
+            self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh Spotify access tokens that expire within the next N minutes, "
+        "in bounded parallel batches. Run once (cron) or with --loop as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--within", type=int, default=15,
+            help="Refresh tokens expiring within this many minutes (default: 15).",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Accounts loaded per query (default: 500).",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=8,
+            help="Concurrent refresh requests (default: 8).",
+        )
+        parser.add_argument(
+            "--rate", type=float, default=20.0,
+            help="Max refreshes started per second, 0 for unlimited (default: 20).",
+        )
+        parser.add_argument(
+            "--backoff", type=float, default=30.0,
+            help="Seconds to pause all workers after a 429 without Retry-After (default: 30).",
+        )
+        parser.add_argument(
+            "--revoked-retry", type=float, default=24.0,
+            help="Hours before retrying an account whose refresh token Spotify "
+                 "rejected (default: 24).",
+        )
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep running, sweeping every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval", type=int, default=60,
+            help="Seconds between sweeps with --loop (default: 60).",
+        )
+
+    def handle(self, *args, **options):
+        limiter = RateLimiter(options["rate"])
+
+        while True:
+            stats = self.sweep(limiter, options)
+            self.report(stats)
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def sweep(self, limiter, options):
+        within = timedelta(minutes=options["within"])
+        now = timezone.now()
+        cutoff = now + within
+        # Revoked accounts can't succeed until the user logs in again
+        retry_revoked_before = now - timedelta(hours=options["revoked_retry"])
+        stats = {
+            "seen": 0,
+            "refreshed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "revoked": 0,
+            "rate_limited": 0,
+            "failed_ids": [],
+        }
+        started = time.monotonic()
+
+        # Keyset pagination on (token_expires_at, pk) so each batch is an
+        # index range scan, no matter how many accounts are linked
+        last = None
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                qs = SpotifyAccount.objects.filter(token_expires_at__lte=cutoff).filter(
+                    Q(token_refresh_failed_at__isnull=True)
+                    | Q(token_refresh_failed_at__lte=retry_revoked_before)
+                )
+                if last is not None:
+                    qs = qs.filter(
+                        Q(token_expires_at__gt=last[0])
+                        | Q(token_expires_at=last[0], pk__gt=last[1])
+                    )
+                batch = list(
+                    qs.order_by("token_expires_at", "pk")
+                    .only("pk", "access_token", "refresh_token", "token_expires_at")
+                    [: options["batch_size"]]
+                )
+                if not batch:
+                    break
+                last = (batch[-1].token_expires_at, batch[-1].pk)
+
+                futures = {
+                    executor.submit(self.refresh_one, account, within, limiter, options): account
+                    for account in batch
+                }
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    stats["seen"] += 1
+                    stats[outcome] += 1
+                    if outcome in ("failed", "revoked", "rate_limited"):
+                        stats["failed_ids"].append(futures[future].pk)
+
+        stats["elapsed"] = time.monotonic() - started
+        return stats
+
+    def refresh_one(self, account, within, limiter, options):
+        previous_expiry = account.token_expires_at
+        limiter.acquire()
+
+        try:
+            refresh_spotify_token_if_expiring(account, within)
+        except SpotifyRateLimitError as exc:
+            limiter.pause(exc.retry_after or options["backoff"])
+            return "rate_limited"
+        except SpotifyAuthError:
+            # invalid_grant: skipped by later sweeps for --revoked-retry hours
+            SpotifyAccount.objects.filter(pk=account.pk).update(
+                token_refresh_failed_at=timezone.now()
+            )
+            return "revoked"
+        except SpotifyAPIError:
+            logger.warning("Token refresh failed for account %s", account.pk, exc_info=True)
+            return "failed"
+        except Exception:
+            logger.exception("Token refresh crashed for account %s", account.pk)
+            return "failed"
+        finally:
+            # Worker threads each hold their own connection
+            connection.close()
+
+        # Another worker or a request may have refreshed it first
+        if account.token_expires_at == previous_expiry:
+            return "skipped"
+        return "refreshed"
+
+    def report(self, stats):
+        elapsed = stats["elapsed"]
+        rate = stats["refreshed"] / elapsed if elapsed > 0 else 0.0
+
+        line = (
+            f"[{timezone.now():%Y-%m-%d %H:%M:%S}] "
+            f"seen={stats['seen']} refreshed={stats['refreshed']} "
+            f"skipped={stats['skipped']} failed={stats['failed']} "
+            f"revoked={stats['revoked']} rate_limited={stats['rate_limited']} "
+            f"elapsed={elapsed:.2f}s throughput={rate:.1f}/s"
+        )
+
+        if stats["failed"] or stats["revoked"] or stats["rate_limited"]:
+            self.stdout.write(self.style.WARNING(line))
+            sample = ", ".join(str(pk) for pk in stats["failed_ids"][:20])
+            self.stdout.write(self.style.WARNING(f"  failed account ids: {sample}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(line))
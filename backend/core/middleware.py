@@ -0,0 +1,46 @@
+import brotli
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import has_vary_header, patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+_accepts_br = _lazy_re_compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware (with its BREACH mitigation) that prefers brotli when the
+    client accepts it. Responses under COMPRESSION_MIN_SIZE bytes and
+    streaming responses (e.g. the now-playing SSE stream) pass through.
+
+    Brotli has no header to pad with random bytes the way Django's gzip
+    does, so responses that vary on Cookie (session/CSRF pages such as the
+    admin) always get gzip; the JSON API authenticates with bearer tokens.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        accept = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if not _accepts_br.search(accept) or has_vary_header(response, "Cookie"):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        # Not worth it for incompressible bodies
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        response.headers["Content-Encoding"] = "br"
+
+        # The body bytes changed, so a strong ETag no longer applies
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+
+        return response
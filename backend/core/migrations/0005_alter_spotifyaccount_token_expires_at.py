@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_review'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='spotifyaccount',
+            name='token_expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_spotifyaccount_token_expires_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(blank=True, help_text='Spotify ID of the track (blank for local files)', max_length=64)),
+                ('track_name', models.CharField(max_length=255)),
+                ('artists', models.JSONField(blank=True, default=list)),
+                ('album', models.CharField(blank=True, max_length=255)),
+                ('album_image', models.CharField(blank=True, max_length=512)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('played_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='play_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-played_at'],
+                'unique_together': {('user', 'played_at')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_playevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('item_type', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('artist', 'Artist')], max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('artists', models.JSONField(blank=True, default=list)),
+                ('album', models.CharField(blank=True, help_text='Album name (tracks only).', max_length=255)),
+                ('image_url', models.CharField(blank=True, max_length=512)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('release_date', models.CharField(blank=True, max_length=20)),
+                ('popularity', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(help_text='When the metadata was last fetched from Spotify.')),
+            ],
+            options={
+                'unique_together': {('spotify_id', 'item_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_rating_rating_user_updated_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('item_type', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('artist', 'Artist')], max_length=10)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sum_sq', models.DecimalField(decimal_places=4, default=0, max_digits=18)),
+                ('hist_0', models.PositiveIntegerField(default=0)),
+                ('hist_1', models.PositiveIntegerField(default=0)),
+                ('hist_2', models.PositiveIntegerField(default=0)),
+                ('hist_3', models.PositiveIntegerField(default=0)),
+                ('hist_4', models.PositiveIntegerField(default=0)),
+                ('hist_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('spotify_id', 'item_type')},
+            },
+        ),
+    ]
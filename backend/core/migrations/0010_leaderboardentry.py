@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ratingaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(help_text='Time window the chart covers, e.g. "all", "30d", "7d".', max_length=10)),
+                ('item_type', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('artist', 'Artist')], max_length=10)),
+                ('rank', models.PositiveIntegerField()),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('item_name', models.CharField(blank=True, max_length=255)),
+                ('count', models.PositiveIntegerField()),
+                ('average', models.FloatField()),
+                ('score', models.FloatField(help_text='Bayesian average the chart is ranked by.')),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['window', 'item_type', 'rank'],
+                'unique_together': {('window', 'item_type', 'rank')},
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations
+
+# Full-text index over Review.item_name + Review.text (see core/review_search.py).
+# Vendor-specific, so it lives in raw SQL rather than on the model:
+# - SQLite: an external-content FTS5 table kept in sync by triggers
+# - PostgreSQL: a GIN index on the weighted tsvector expression
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE core_review_fts USING fts5(
+        item_name, text,
+        content='core_review', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_review_fts_ai AFTER INSERT ON core_review BEGIN
+        INSERT INTO core_review_fts(rowid, item_name, text)
+        VALUES (new.id, new.item_name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER core_review_fts_ad AFTER DELETE ON core_review BEGIN
+        INSERT INTO core_review_fts(core_review_fts, rowid, item_name, text)
+        VALUES ('delete', old.id, old.item_name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER core_review_fts_au AFTER UPDATE OF item_name, text ON core_review BEGIN
+        INSERT INTO core_review_fts(core_review_fts, rowid, item_name, text)
+        VALUES ('delete', old.id, old.item_name, old.text);
+        INSERT INTO core_review_fts(rowid, item_name, text)
+        VALUES (new.id, new.item_name, new.text);
+    END
+    """,
+    "INSERT INTO core_review_fts(core_review_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS core_review_fts_au",
+    "DROP TRIGGER IF EXISTS core_review_fts_ad",
+    "DROP TRIGGER IF EXISTS core_review_fts_ai",
+    "DROP TABLE IF EXISTS core_review_fts",
+]
+
+POSTGRES_FORWARDS = [
+    """
+    CREATE INDEX core_review_search_idx ON core_review USING GIN ((
+        setweight(to_tsvector('english', coalesce(item_name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(text, '')), 'B')
+    ))
+    """,
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS core_review_search_idx",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_FORWARDS, "postgresql": POSTGRES_FORWARDS}),
+            _run({"sqlite": SQLITE_BACKWARDS, "postgresql": POSTGRES_BACKWARDS}),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_review_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_id', models.CharField(max_length=64)),
+                ('item_type', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('artist', 'Artist')], max_length=10)),
+                ('neighbor_id', models.CharField(max_length=64)),
+                ('neighbor_type', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('artist', 'Artist')], max_length=10)),
+                ('similarity', models.FloatField()),
+                ('overlap', models.PositiveIntegerField(help_text='Users who rated both items.')),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['spotify_id', 'item_type', '-similarity'], name='itemsim_item_similarity_idx'), models.Index(fields=['neighbor_id', 'neighbor_type'], name='itemsim_neighbor_idx')],
+                'unique_together': {('spotify_id', 'item_type', 'neighbor_id', 'neighbor_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_usersimilarity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playevent',
+            name='album_images',
+            field=models.JSONField(blank=True, default=list, help_text='All sizes Spotify offers ([{url, width, height}, ...])'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_playevent_album_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spotifyaccount',
+            name='token_refresh_failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -21,13 +21,20 @@ class SpotifyAccount(models.Model):
 
     access_token = models.CharField(max_length=512)
     refresh_token = models.CharField(max_length=512)
-    token_expires_at = models.DateTimeField()
+    # Indexed for the background refresher (refresh_spotify_tokens)
+    token_expires_at = models.DateTimeField(db_index=True)
+    # Set when Spotify rejects the refresh token (revoked access); the
+    # refresher backs off these accounts until the user logs in again
+    token_refresh_failed_at = models.DateTimeField(null=True, blank=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    def is_token_expired(self) -> bool:
-        return timezone.now() >= self.token_expires_at
+    def is_token_expired(self, skew: timedelta = timedelta(0)) -> bool:
+        """
+        True if the token has expired, or will within `skew`
+        """
+        return timezone.now() + skew >= self.token_expires_at
 
     def __str__(self):
         return f"SpotifyAccount({self.user.username}, {self.spotify_id})"
@@ -77,6 +84,14 @@ class Rating(models.Model):
         # Ensure one rating per user per item (per type)
         unique_together = ("user", "spotify_id", "item_type")
         ordering = ["-updated_at"]
+        indexes = [
+            # Keyset pagination of a user's list, with and without a type filter
+            models.Index(fields=["user", "-updated_at", "-id"], name="rating_user_updated_idx"),
+            models.Index(
+                fields=["user", "item_type", "-updated_at", "-id"],
+                name="rating_user_type_updated_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -129,6 +144,14 @@ class Review(models.Model):
     class Meta:
         unique_together = ("user", "spotify_id", "item_type")
         ordering = ["-updated_at"]
+        indexes = [
+            # Keyset pagination of a user's list, with and without a type filter
+            models.Index(fields=["user", "-updated_at", "-id"], name="review_user_updated_idx"),
+            models.Index(
+                fields=["user", "item_type", "-updated_at", "-id"],
+                name="review_user_type_updated_idx",
+            ),
+        ]
 
     def __str__(self):
         return (
@@ -136,3 +159,233 @@ class Review(models.Model):
             f"{self.item_type}={self.spotify_id}, "
             f"{(self.text[:30] + '...') if self.text else ''})"
         )
+
+class PlayEvent(models.Model):
+    """
+    One play from the user's Spotify listening history.
+    Synced incrementally from /me/player/recently-played (see listening_history.py).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="play_events",
+    )
+    spotify_id = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Spotify ID of the track (blank for local files)",
+    )
+    track_name = models.CharField(max_length=255)
+    artists = models.JSONField(default=list, blank=True)
+    album = models.CharField(max_length=255, blank=True)
+    album_image = models.CharField(max_length=512, blank=True)
+    album_images = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="All sizes Spotify offers ([{url, width, height}, ...])",
+    )
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    played_at = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # One play per user per timestamp; doubles as the (user, played_at)
+        # index the recently-played queries run on
+        unique_together = ("user", "played_at")
+        ordering = ["-played_at"]
+
+    def __str__(self):
+        return (
+            f"PlayEvent(user={self.user_id}, "
+            f"{self.track_name}, played_at={self.played_at})"
+        )
+
+class CatalogItem(models.Model):
+    """
+    Local copy of Spotify metadata for a track, album, or artist.
+    Filled in batches from Spotify's multi-ID endpoints (see catalog.py).
+    """
+    ITEM_TYPE_CHOICES = [
+        ("track", "Track"),
+        ("album", "Album"),
+        ("artist", "Artist"),
+    ]
+
+    spotify_id = models.CharField(max_length=64)
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+
+    name = models.CharField(max_length=255)
+    artists = models.JSONField(default=list, blank=True)
+    album = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Album name (tracks only).",
+    )
+    image_url = models.CharField(max_length=512, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+    release_date = models.CharField(max_length=20, blank=True)
+    popularity = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    fetched_at = models.DateTimeField(
+        help_text="When the metadata was last fetched from Spotify.",
+    )
+
+    class Meta:
+        unique_together = ("spotify_id", "item_type")
+
+    def __str__(self):
+        return f"CatalogItem({self.item_type}={self.spotify_id}, {self.name})"
+
+class RatingAggregate(models.Model):
+    """
+    Running totals of every user's rating for one item, kept in step with
+    Rating writes (see aggregates.py) so item stats are a single-row read.
+    Histogram buckets are whole stars: hist_N counts ratings in [N, N+1),
+    with 5.00 in hist_5.
+    """
+    ITEM_TYPE_CHOICES = [
+        ("track", "Track"),
+        ("album", "Album"),
+        ("artist", "Artist"),
+    ]
+
+    spotify_id = models.CharField(max_length=64)
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+
+    count = models.PositiveIntegerField(default=0)
+    sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sum_sq = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+
+    hist_0 = models.PositiveIntegerField(default=0)
+    hist_1 = models.PositiveIntegerField(default=0)
+    hist_2 = models.PositiveIntegerField(default=0)
+    hist_3 = models.PositiveIntegerField(default=0)
+    hist_4 = models.PositiveIntegerField(default=0)
+    hist_5 = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("spotify_id", "item_type")
+
+    @property
+    def histogram(self):
+        return [getattr(self, f"hist_{bucket}") for bucket in range(6)]
+
+    def __str__(self):
+        return (
+            f"RatingAggregate({self.item_type}={self.spotify_id}, "
+            f"count={self.count})"
+        )
+
+class LeaderboardEntry(models.Model):
+    """
+    One ranked row of a precomputed "top rated" chart for an item type and
+    time window (see leaderboards.py). Rebuilt wholesale per chart.
+    """
+    ITEM_TYPE_CHOICES = [
+        ("track", "Track"),
+        ("album", "Album"),
+        ("artist", "Artist"),
+    ]
+
+    window = models.CharField(
+        max_length=10,
+        help_text='Time window the chart covers, e.g. "all", "30d", "7d".',
+    )
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+    rank = models.PositiveIntegerField()
+
+    spotify_id = models.CharField(max_length=64)
+    item_name = models.CharField(max_length=255, blank=True)
+    count = models.PositiveIntegerField()
+    average = models.FloatField()
+    score = models.FloatField(help_text="Bayesian average the chart is ranked by.")
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("window", "item_type", "rank")
+        ordering = ["window", "item_type", "rank"]
+
+    def __str__(self):
+        return (
+            f"LeaderboardEntry({self.window}/{self.item_type} #{self.rank}: "
+            f"{self.spotify_id}, score={self.score:.2f})"
+        )
+
+class ItemSimilarity(models.Model):
+    """
+    One of an item's top-K nearest neighbors by mean-centered cosine
+    similarity over user ratings (see recommendations.py).
+    """
+    ITEM_TYPE_CHOICES = [
+        ("track", "Track"),
+        ("album", "Album"),
+        ("artist", "Artist"),
+    ]
+
+    spotify_id = models.CharField(max_length=64)
+    item_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+
+    neighbor_id = models.CharField(max_length=64)
+    neighbor_type = models.CharField(max_length=10, choices=ITEM_TYPE_CHOICES)
+
+    similarity = models.FloatField()
+    overlap = models.PositiveIntegerField(help_text="Users who rated both items.")
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("spotify_id", "item_type", "neighbor_id", "neighbor_type")
+        indexes = [
+            models.Index(
+                fields=["spotify_id", "item_type", "-similarity"],
+                name="itemsim_item_similarity_idx",
+            ),
+            models.Index(fields=["neighbor_id", "neighbor_type"], name="itemsim_neighbor_idx"),
+        ]
+
+    def __str__(self):
+        return (
+            f"ItemSimilarity({self.item_type}={self.spotify_id} -> "
+            f"{self.neighbor_type}={self.neighbor_id}, {self.similarity:.3f})"
+        )
+
+class UserSimilarity(models.Model):
+    """
+    One of a user's nearest neighbors by taste: mean-centered cosine
+    similarity over the items both have rated (see taste_match.py).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="taste_neighbors",
+    )
+    other = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    similarity = models.FloatField()
+    overlap = models.PositiveIntegerField(help_text="Items both users rated.")
+    score = models.FloatField(
+        help_text="Taste compatibility 0-100, similarity shrunk towards 50 by overlap.",
+    )
+
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "other")
+        indexes = [
+            models.Index(fields=["user", "-score"], name="usersim_user_score_idx"),
+        ]
+
+    def __str__(self):
+        return (
+            f"UserSimilarity(user={self.user_id} -> {self.other_id}, "
+            f"score={self.score:.0f})"
+        )
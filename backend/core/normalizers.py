@@ -0,0 +1,150 @@
+from functools import lru_cache
+
+from .images import pick_image
+
+# Shapes Spotify track/album/artist objects into the payloads the API
+# returns. Each item type maps output field -> getter(raw, image_size) over
+# the Spotify object and the art size the client asked for.
+# compile_normalizer() builds one function per (type, fields) that calls
+# only the requested getters.
+
+_EMPTY = {}
+
+
+def _get(key):
+    return lambda raw, image_size: raw.get(key)
+
+
+def _const(value):
+    return lambda raw, image_size: value
+
+
+def _artist_names(raw, image_size):
+    return [a.get("name") for a in raw.get("artists") or ()]
+
+
+def _image(raw, image_size):
+    return pick_image(raw.get("images"), image_size)
+
+
+TRACK_FIELDS = {
+    "id": _get("id"),
+    "type": _const("track"),
+    "name": _get("name"),
+    "artists": _artist_names,
+    "album": lambda raw, image_size: (raw.get("album") or _EMPTY).get("name"),
+    "album_image": lambda raw, image_size: _image(raw.get("album") or _EMPTY, image_size),
+    "duration_ms": _get("duration_ms"),
+}
+
+ALBUM_FIELDS = {
+    "id": _get("id"),
+    "type": _const("album"),
+    "name": _get("name"),
+    "artists": _artist_names,
+    "image": _image,
+    "release_date": _get("release_date"),
+}
+
+ARTIST_FIELDS = {
+    "id": _get("id"),
+    "type": _const("artist"),
+    "name": _get("name"),
+    "image": _image,
+    "followers": lambda raw, image_size: (raw.get("followers") or _EMPTY).get("total"),
+    "genres": lambda raw, image_size: raw.get("genres") or [],
+}
+
+NORMALIZER_FIELDS = {
+    "track": TRACK_FIELDS,
+    "album": ALBUM_FIELDS,
+    "artist": ARTIST_FIELDS,
+}
+
+# /search response block -> (item type, key in our payload)
+SEARCH_BLOCKS = {
+    "tracks": "track",
+    "albums": "album",
+    "artists": "artist",
+}
+
+SEARCH_FIELDS = frozenset().union(*NORMALIZER_FIELDS.values())
+
+
+def compile_normalizer(item_type, fields=None):
+    """
+    Returns normalize(raw, image_size=None) -> dict for one item type,
+    limited to `fields` (None for all)
+    """
+    getters = NORMALIZER_FIELDS[item_type]
+    if fields is not None:
+        # Fields of other types don't change the result; dropping them keeps
+        # the cache to one entry per subset of this type's fields
+        fields = frozenset(fields).intersection(getters)
+        if len(fields) == len(getters):
+            fields = None
+    return _compile_normalizer(item_type, fields)
+
+
+# Every (type, canonical subset) fits: 2**7 + 2**6 + 2**6
+@lru_cache(maxsize=256)
+def _compile_normalizer(item_type, fields):
+    selected = tuple(
+        (name, get)
+        for name, get in NORMALIZER_FIELDS[item_type].items()
+        if fields is None or name in fields
+    )
+
+    def normalize(raw, image_size=None):
+        return {name: get(raw, image_size) for name, get in selected}
+
+    return normalize
+
+
+def normalize_search_results(raw, fields=None, image_size=None):
+    """
+    Shape a Spotify /search response into:
+
+    {
+      "tracks": [...],
+      "albums": [...],
+      "artists": [...]
+    }
+    """
+    results = {}
+    for block, item_type in SEARCH_BLOCKS.items():
+        normalize = compile_normalizer(item_type, fields)
+        results[block] = [
+            normalize(item, image_size)
+            for item in (raw.get(block) or {}).get("items") or []
+            # Spotify pads some result pages with nulls
+            if item
+        ]
+    return results
+
+
+def parse_fields(value, allowed):
+    """
+    ?fields=a,b,c as a frozenset, or None when absent (= every field).
+    Raises ValueError naming any field not in `allowed`.
+    """
+    if not value:
+        return None
+
+    fields = frozenset(name.strip() for name in value.split(",") if name.strip())
+    unknown = fields - allowed
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. "
+            f"Valid fields: {', '.join(sorted(allowed))}"
+        )
+    return fields or None
+
+
+def select_fields(payload, fields):
+    """
+    `payload` limited to `fields` (None keeps everything)
+    """
+    if fields is None:
+        return payload
+    return {name: value for name, value in payload.items() if name in fields}
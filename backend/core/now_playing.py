@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+from .images import pick_image
+from .models import SpotifyAccount
+from .normalizers import compile_normalizer
+from .spotify_client import aspotify_user_get
+
+INACTIVE_PAYLOAD = {
+    "status": "inactive",
+    "is_playing": False,
+    "track_name": None,
+    "artists": [],
+    "album": None,
+    "album_image": None,
+    "progress_ms": None,
+    "duration_ms": None,
+}
+
+NOW_PLAYING_FIELDS = frozenset(INACTIVE_PAYLOAD)
+
+_normalize_track = compile_normalizer(
+    "track", frozenset({"name", "artists", "album", "album_image", "duration_ms"})
+)
+
+
+def build_now_playing_payload(data):
+    """
+    Shape a /me/player/currently-playing response into the
+    /user/now-playing/ payload
+    """
+    # No active device or nothing playing
+    if data is None:
+        return dict(INACTIVE_PAYLOAD)
+
+    item = data.get("item")
+
+    # Active device but no track item
+    if not item:
+        return dict(INACTIVE_PAYLOAD)
+
+    # Determine play state
+    is_playing = data.get("is_playing", False)
+    status = "playing" if is_playing else "paused"
+    track = _normalize_track(item)
+
+    return {
+        "status": status,
+        "is_playing": is_playing,
+        "progress_ms": data.get("progress_ms"),
+        "duration_ms": track["duration_ms"],
+        "track_name": track["name"],
+        "artists": track["artists"],
+        "album": track["album"],
+        "album_image": track["album_image"],
+    }
+
+
+# Snapshot cache
+#
+# A snapshot is {"payload": ..., "track_id": ..., "album_images": [...],
+# "fetched_at": <unix time>} and lives for NOW_PLAYING_CACHE_TTL seconds. Polls from every tab/device
+# of a user inside that window are served from it, with progress_ms
+# extrapolated from fetched_at.
+
+def _snapshot_key(account_id):
+    return f"now-playing:{account_id}"
+
+
+def _lease_key(account_id):
+    return f"now-playing:lease:{account_id}"
+
+
+def make_snapshot(data):
+    item = (data or {}).get("item") or {}
+    return {
+        "payload": build_now_playing_payload(data),
+        "track_id": item.get("id"),
+        # Every size Spotify offers, so each client can pick its own
+        "album_images": (item.get("album") or {}).get("images") or [],
+        "fetched_at": time.time(),
+    }
+
+
+async def astore_snapshot(account_id, snapshot):
+    await cache.aset(
+        _snapshot_key(account_id), snapshot, timeout=settings.NOW_PLAYING_CACHE_TTL
+    )
+
+
+async def _afetch_snapshot(account: SpotifyAccount):
+    data = await aspotify_user_get("/me/player/currently-playing", account=account)
+    snapshot = make_snapshot(data)
+    await astore_snapshot(account.pk, snapshot)
+    return snapshot
+
+
+async def _afetch_coalesced(account: SpotifyAccount, stale=None):
+    """
+    Cross-process coalescing: only the holder of the lease polls Spotify,
+    everyone else waits for a snapshot newer than `stale` to be stored.
+    The lease is released even when the fetch fails, so a waiter then
+    takes it over and fetches itself.
+    (Needs a shared cache backend; with LocMemCache this is per process.)
+    """
+    lease_timeout = settings.NOW_PLAYING_LEASE_TIMEOUT
+    seen = stale["fetched_at"] if stale else None
+
+    deadline = time.monotonic() + lease_timeout
+    while True:
+        if await cache.aadd(_lease_key(account.pk), 1, timeout=lease_timeout):
+            try:
+                return await _afetch_snapshot(account)
+            finally:
+                await cache.adelete(_lease_key(account.pk))
+
+        if time.monotonic() >= deadline:
+            # Lease holder is too slow; fetch ourselves
+            return await _afetch_snapshot(account)
+
+        await asyncio.sleep(0.05)
+        snapshot = await cache.aget(_snapshot_key(account.pk))
+        if snapshot is not None and (seen is None or snapshot["fetched_at"] > seen):
+            return snapshot
+
+
+# In-process coalescing: concurrent polls on the same event loop await a
+# single fetch task per account
+_inflight = weakref.WeakKeyDictionary()
+
+
+async def aget_now_playing_snapshot(account: SpotifyAccount, max_age=None):
+    """
+    Returns a fresh-enough snapshot, polling Spotify at most once per
+    NOW_PLAYING_CACHE_TTL per user (or per `max_age` seconds, if shorter)
+    """
+    snapshot = await cache.aget(_snapshot_key(account.pk))
+    if snapshot is not None and (
+        max_age is None or time.time() - snapshot["fetched_at"] <= max_age
+    ):
+        return snapshot
+
+    loop = asyncio.get_running_loop()
+    tasks = _inflight.setdefault(loop, {})
+
+    task = tasks.get(account.pk)
+    if task is None:
+        task = loop.create_task(_afetch_coalesced(account, snapshot))
+        tasks[account.pk] = task
+        task.add_done_callback(lambda _t: tasks.pop(account.pk, None))
+
+    return await asyncio.shield(task)
+
+
+def snapshot_payload(snapshot, now=None, image_size=None):
+    """
+    The cached payload with progress_ms moved forward to `now`, and
+    album_image right-sized for `image_size` px if given
+    """
+    payload = dict(snapshot["payload"])
+    if image_size and snapshot.get("album_images"):
+        payload["album_image"] = pick_image(snapshot["album_images"], image_size)
+    progress = payload.get("progress_ms")
+    duration = payload.get("duration_ms")
+
+    if payload.get("is_playing") and progress is not None:
+        elapsed_ms = int(((now or time.time()) - snapshot["fetched_at"]) * 1000)
+        progress = progress + max(elapsed_ms, 0)
+        if duration is not None:
+            progress = min(progress, duration)
+        payload["progress_ms"] = progress
+
+    return payload
+
+
+def snapshot_state(snapshot):
+    """
+    What counts as a change for push/ETag purposes
+    """
+    payload = snapshot["payload"]
+    return (
+        payload["status"],
+        snapshot.get("track_id") or payload["track_name"],
+        payload["album_image"],
+        payload["duration_ms"],
+    )
+
+
+def snapshot_etag(snapshot, now=None, variant=""):
+    """
+    ETag over the playback state (track + play status), the representation
+    (`variant`, e.g. image size and fields) and, while playing, progress_ms
+    in NOW_PLAYING_ETAG_PROGRESS_MS steps: polls inside a step revalidate
+    for free, while progress and seeks still reach the client
+    """
+    parts = [*snapshot_state(snapshot), variant]
+    payload = snapshot_payload(snapshot, now=now)
+    if payload["is_playing"] and payload["progress_ms"] is not None:
+        parts.append(payload["progress_ms"] // settings.NOW_PLAYING_ETAG_PROGRESS_MS)
+
+    state = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(state.encode()).hexdigest())
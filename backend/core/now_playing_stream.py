@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+from django.conf import settings
+
+from .models import SpotifyAccount
+from .now_playing import aget_now_playing_snapshot, snapshot_payload, snapshot_state
+from .spotify_client import SpotifyAPIError
+
+logger = logging.getLogger(__name__)
+
+
+def next_poll_interval(snapshot, now=None):
+    """
+    Seconds until the poller should look again:
+    - playing: shortly after the current track should end, capped so
+      skips/pauses are still picked up
+    - paused / inactive: the idle interval
+    """
+    payload = snapshot_payload(snapshot, now=now)
+    min_interval = settings.NOW_PLAYING_STREAM_MIN_INTERVAL
+    max_interval = settings.NOW_PLAYING_STREAM_MAX_INTERVAL
+
+    if not payload["is_playing"]:
+        return settings.NOW_PLAYING_STREAM_IDLE_INTERVAL
+
+    progress = payload["progress_ms"]
+    duration = payload["duration_ms"]
+    if progress is None or duration is None:
+        return max_interval
+
+    remaining = (duration - progress) / 1000 + 0.5
+    return min(max(remaining, min_interval), max_interval)
+
+
+class UserPoller:
+    """
+    Polls currently-playing for one user and fans changes out to every
+    connected stream of that user. Stops when the last stream disconnects.
+    """
+
+    def __init__(self, account: SpotifyAccount, registry):
+        self.account = account
+        self.registry = registry
+        self.subscribers = set()
+        self.last_snapshot = None
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers.add(queue)
+
+        # New streams get the current state straight away
+        if self.last_snapshot is not None:
+            queue.put_nowait(("now-playing", self.last_snapshot))
+
+        # (Re)start polling; a task that died must not strand its subscribers
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.stop()
+
+    def stop(self):
+        self.registry.pop(self.account.pk, None)
+        if self.task is not None:
+            self.task.cancel()
+
+    def publish(self, event, data):
+        for queue in self.subscribers:
+            # Only the latest state matters to a slow client
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+    async def run(self):
+        min_interval = settings.NOW_PLAYING_STREAM_MIN_INTERVAL
+
+        while self.subscribers:
+            try:
+                # Reuses a snapshot another poller/poll just fetched
+                snapshot = await aget_now_playing_snapshot(
+                    self.account, max_age=min_interval
+                )
+            except SpotifyAPIError as exc:
+                self.publish(
+                    "error",
+                    {
+                        "detail": "Failed to fetch currently playing",
+                        "code": exc.code,
+                        "retry_after": exc.retry_after,
+                    },
+                )
+                await asyncio.sleep(
+                    max(settings.NOW_PLAYING_STREAM_IDLE_INTERVAL, exc.retry_after or 0)
+                )
+                continue
+            except Exception:
+                # Keep polling: the streams of this user depend on this task
+                logger.exception("Now-playing poll failed for account %s", self.account.pk)
+                self.publish("error", {"detail": "Failed to fetch currently playing"})
+                await asyncio.sleep(settings.NOW_PLAYING_STREAM_IDLE_INTERVAL)
+                continue
+
+            # Push only when the track or play state changes
+            if self.last_snapshot is None or (
+                snapshot_state(snapshot) != snapshot_state(self.last_snapshot)
+            ):
+                self.publish("now-playing", snapshot)
+            self.last_snapshot = snapshot
+
+            await asyncio.sleep(next_poll_interval(snapshot))
+
+
+# One poller per user per event loop (i.e. per ASGI worker)
+_pollers = weakref.WeakKeyDictionary()
+
+
+def get_poller(account: SpotifyAccount) -> UserPoller:
+    registry = _pollers.setdefault(asyncio.get_running_loop(), {})
+    poller = registry.get(account.pk)
+    if poller is None:
+        poller = UserPoller(account, registry)
+        registry[account.pk] = poller
+    return poller
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def now_playing_events(account: SpotifyAccount, image_size=None):
+    """
+    Server-sent event stream for one connected client
+    """
+    poller = get_poller(account)
+    queue = poller.subscribe()
+    keepalive = settings.NOW_PLAYING_STREAM_KEEPALIVE
+
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            if event == "now-playing":
+                data = snapshot_payload(data, now=time.time(), image_size=image_size)
+            yield _sse(event, data)
+    finally:
+        poller.unsubscribe(queue)
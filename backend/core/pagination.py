@@ -0,0 +1,53 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj):
+    """
+    Opaque cursor pointing just after `obj` in (-updated_at, -id) order
+    """
+    raw = json.dumps([obj.updated_at.isoformat(), obj.pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        updated_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        updated_at = parse_datetime(updated_at)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor.")
+
+    if updated_at is None or not isinstance(pk, int):
+        raise InvalidCursor("Invalid cursor.")
+    return updated_at, pk
+
+
+def keyset_page(queryset, cursor=None, limit=50):
+    """
+    One page of `queryset`, newest first, using keyset pagination on
+    (updated_at, id) so the cost doesn't grow with how deep the page is.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises InvalidCursor for a cursor we didn't hand out.
+    """
+    queryset = queryset.order_by("-updated_at", "-id")
+    if cursor:
+        updated_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=pk)
+        )
+
+    # One extra row tells us whether there is a next page
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
@@ -0,0 +1,180 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+
+
+class SharedRateLimiter:
+    """
+    App-wide request budget for Spotify, shared by every worker through the
+    default cache (Redis when REDIS_URL is set).
+
+    Each one-second slot holds `rate` tokens; a caller takes one with an
+    atomic incr and, if the slot is spent, waits for the next slot up to
+    `max_wait` seconds. A 429 pauses the whole budget for Retry-After.
+
+    acquire()/aacquire() return 0 on success, or the number of seconds the
+    caller would have to wait (so it can fail fast with a retry hint).
+    """
+
+    def __init__(self, name: str, rate: int, max_wait: float):
+        self.name = name
+        self.rate = rate
+        self.max_wait = max_wait
+
+    def _slot_key(self, slot):
+        return f"ratelimit:{self.name}:{slot}"
+
+    def _pause_key(self):
+        return f"ratelimit:{self.name}:paused-until"
+
+    def _plan(self, now, paused_until, taken):
+        """
+        Seconds to sleep before trying the next slot, or None if `taken`
+        fits in the current one
+        """
+        if paused_until is not None and paused_until > now:
+            return paused_until - now
+        if taken is not None and taken > self.rate:
+            return int(now) + 1 - now
+        return None
+
+    def acquire(self) -> float:
+        if self.rate <= 0:
+            return 0
+
+        deadline = time.time() + self.max_wait
+        while True:
+            now = time.time()
+            wait = self._plan(now, cache.get(self._pause_key()), None)
+            if wait is None:
+                key = self._slot_key(int(now))
+                cache.add(key, 0, timeout=2)
+                wait = self._plan(now, None, cache.incr(key))
+                if wait is None:
+                    return 0
+
+            if now + wait > deadline:
+                return wait
+            time.sleep(wait)
+
+    async def aacquire(self) -> float:
+        if self.rate <= 0:
+            return 0
+
+        deadline = time.time() + self.max_wait
+        while True:
+            now = time.time()
+            wait = self._plan(now, await cache.aget(self._pause_key()), None)
+            if wait is None:
+                key = self._slot_key(int(now))
+                await cache.aadd(key, 0, timeout=2)
+                wait = self._plan(now, None, await cache.aincr(key))
+                if wait is None:
+                    return 0
+
+            if now + wait > deadline:
+                return wait
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        cache.set(self._pause_key(), time.time() + seconds, timeout=int(seconds) + 1)
+
+    async def apause(self, seconds: float):
+        await cache.aset(self._pause_key(), time.time() + seconds, timeout=int(seconds) + 1)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive upstream failures (5xx / network),
+    and fails fast for `cooldown` seconds. After the cooldown it is
+    half-open: a single caller (claimed with cache.add) goes through as a
+    probe while the rest keep failing fast. A probe success closes it;
+    a failure re-opens it for another cooldown.
+    State is kept in the default cache so all workers share it.
+    """
+
+    # Seconds the others wait for the probe's verdict
+    PROBE_WAIT = 1
+
+    def __init__(self, name: str, threshold: int, cooldown: float):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        # Skip the cache write on success unless this process saw a failure
+        # (or took the probe)
+        self._dirty = False
+
+    def _failures_key(self):
+        return f"breaker:{self.name}:failures"
+
+    def _open_key(self):
+        return f"breaker:{self.name}:open-until"
+
+    def _probe_key(self):
+        return f"breaker:{self.name}:probe"
+
+    def _probe_timeout(self):
+        # A probe that never reports back frees the slot for another caller
+        return max(int(self.cooldown), 1)
+
+    def _remaining(self, open_until):
+        return max(open_until - time.time(), 0) if open_until else 0
+
+    def open_for(self) -> float:
+        """
+        Seconds left while open, 0 when closed (or for the half-open probe)
+        """
+        open_until = cache.get(self._open_key())
+        if open_until is None:
+            return 0
+        remaining = self._remaining(open_until)
+        if remaining:
+            return remaining
+        if cache.add(self._probe_key(), 1, timeout=self._probe_timeout()):
+            self._dirty = True
+            return 0
+        return self.PROBE_WAIT
+
+    async def aopen_for(self) -> float:
+        open_until = await cache.aget(self._open_key())
+        if open_until is None:
+            return 0
+        remaining = self._remaining(open_until)
+        if remaining:
+            return remaining
+        if await cache.aadd(self._probe_key(), 1, timeout=self._probe_timeout()):
+            self._dirty = True
+            return 0
+        return self.PROBE_WAIT
+
+    def record_failure(self):
+        self._dirty = True
+        key = self._failures_key()
+        cache.add(key, 0, timeout=max(int(self.cooldown) * 2, 1))
+        # Any failure while open/half-open (i.e. a failed probe) re-opens it
+        if cache.incr(key) >= self.threshold or cache.get(self._open_key()) is not None:
+            # Kept past the cooldown: the half-open state lasts until a probe succeeds
+            cache.set(self._open_key(), time.time() + self.cooldown, timeout=None)
+            cache.delete(self._probe_key())
+
+    async def arecord_failure(self):
+        self._dirty = True
+        key = self._failures_key()
+        await cache.aadd(key, 0, timeout=max(int(self.cooldown) * 2, 1))
+        if (
+            await cache.aincr(key) >= self.threshold
+            or await cache.aget(self._open_key()) is not None
+        ):
+            await cache.aset(self._open_key(), time.time() + self.cooldown, timeout=None)
+            await cache.adelete(self._probe_key())
+
+    def record_success(self):
+        if self._dirty:
+            self._dirty = False
+            cache.delete_many([self._failures_key(), self._open_key(), self._probe_key()])
+
+    async def arecord_success(self):
+        if self._dirty:
+            self._dirty = False
+            await cache.adelete_many([self._failures_key(), self._open_key(), self._probe_key()])
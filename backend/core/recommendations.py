@@ -0,0 +1,316 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Max
+from django.utils import timezone
+from scipy import sparse
+
+from .models import ItemSimilarity, Rating
+
+
+class RatingMatrix:
+    """
+    Sparse item x user view of the Rating table:
+    - centered: ratings minus each user's mean rating (float32)
+    - rated: 1 wherever a rating exists (for co-rating counts)
+    - items: row index -> (spotify_id, item_type)
+    - users: column index -> user id
+    """
+
+    def __init__(self, centered, rated, items, users):
+        self.centered = centered
+        self.rated = rated
+        self.items = items
+        self.users = users
+        self.index = {key: row for row, key in enumerate(items)}
+
+
+def load_rating_matrix(chunk_size=None) -> RatingMatrix:
+    """
+    Streams Rating in primary-key chunks straight into flat NumPy arrays,
+    so peak memory is the matrix itself plus one chunk of rows.
+    """
+    chunk_size = chunk_size or settings.RECS_CHUNK_SIZE
+    item_index, user_index = {}, {}
+    rows, cols, values = [], [], []
+
+    last_pk = 0
+    while True:
+        chunk = list(
+            Rating.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "user_id", "spotify_id", "item_type", "rating")
+            [:chunk_size]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+
+        count = len(chunk)
+        rows.append(np.fromiter(
+            (item_index.setdefault((spotify_id, item_type), len(item_index))
+             for _, _, spotify_id, item_type, _ in chunk),
+            dtype=np.int32, count=count,
+        ))
+        cols.append(np.fromiter(
+            (user_index.setdefault(user_id, len(user_index)) for _, user_id, _, _, _ in chunk),
+            dtype=np.int32, count=count,
+        ))
+        values.append(np.fromiter(
+            (float(rating) for _, _, _, _, rating in chunk),
+            dtype=np.float32, count=count,
+        ))
+
+    shape = (len(item_index), len(user_index))
+    if not item_index:
+        empty = sparse.csr_matrix(shape, dtype=np.float32)
+        return RatingMatrix(empty, empty, [], [])
+
+    rows, cols, values = np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+    # Mean-center per user, so generous and harsh raters compare fairly
+    user_means = np.bincount(cols, weights=values) / np.bincount(cols)
+    centered = (values - user_means[cols]).astype(np.float32)
+
+    items = [None] * len(item_index)
+    for key, row in item_index.items():
+        items[row] = key
+    users = [None] * len(user_index)
+    for user_id, col in user_index.items():
+        users[col] = user_id
+
+    return RatingMatrix(
+        sparse.csr_matrix((centered, (rows, cols)), shape=shape),
+        sparse.csr_matrix((np.ones_like(values), (rows, cols)), shape=shape),
+        items,
+        users,
+    )
+
+
+def _top_neighbors(sim_row, overlap_row, self_row, top_k, min_overlap):
+    """
+    (neighbor rows, similarities, overlaps) of one item, best first
+    """
+    neighbors, sims = sim_row.indices, sim_row.data
+    # Same rows in both products, but the overlap row can have more entries
+    # (co-rated at the user's mean -> centered value 0)
+    positions = np.searchsorted(overlap_row.indices, neighbors)
+    overlaps = overlap_row.data[positions]
+
+    keep = (sims > 0) & (overlaps >= min_overlap) & (neighbors != self_row)
+    neighbors, sims, overlaps = neighbors[keep], sims[keep], overlaps[keep]
+
+    if len(sims) > top_k:
+        best = np.argpartition(-sims, top_k)[:top_k]
+        neighbors, sims, overlaps = neighbors[best], sims[best], overlaps[best]
+    order = np.argsort(-sims, kind="stable")
+    return neighbors[order], sims[order], overlaps[order]
+
+
+def item_neighbors(matrix: RatingMatrix, rows=None, top_k=None, min_overlap=None, block_size=None):
+    """
+    Yields (item row, [(neighbor row, similarity, overlap), ...]) for the
+    given item rows (default: all), computing cosine similarities of the
+    centered rows a block of items at a time to bound memory.
+    """
+    top_k = top_k or settings.RECS_TOP_K
+    min_overlap = min_overlap or settings.RECS_MIN_OVERLAP
+    block_size = block_size or settings.RECS_BLOCK_SIZE
+
+    centered = matrix.centered
+    norms = np.sqrt(np.asarray(centered.multiply(centered).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = sparse.diags(inverse.astype(np.float32)) @ centered
+
+    normalized = normalized.tocsr()
+    normalized_t = normalized.T.tocsc()
+    rated = matrix.rated
+    rated_t = rated.T.tocsc()
+
+    rows = np.arange(len(matrix.items)) if rows is None else np.asarray(rows, dtype=np.int64)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        sims = (normalized[block] @ normalized_t).tocsr()
+        overlaps = (rated[block] @ rated_t).tocsr()
+        sims.sort_indices()
+        overlaps.sort_indices()
+
+        for offset, item_row in enumerate(block):
+            neighbors, values, counts = _top_neighbors(
+                sims[offset], overlaps[offset], item_row, top_k, min_overlap
+            )
+            yield int(item_row), list(zip(neighbors.tolist(), values.tolist(), counts.tolist()))
+
+
+def _rows_to_refresh(matrix: RatingMatrix, since):
+    """
+    Incremental refresh: items rated/re-rated since the last run, plus the
+    items that list one of them as a neighbor
+    """
+    changed = set(
+        Rating.objects.filter(updated_at__gt=since)
+        .values_list("spotify_id", "item_type")
+        .distinct()
+    )
+    if not changed:
+        return []
+
+    affected = set(changed)
+    by_neighbor = ItemSimilarity.objects.filter(
+        neighbor_id__in={spotify_id for spotify_id, _ in changed}
+    ).values_list("neighbor_id", "neighbor_type", "spotify_id", "item_type")
+    for neighbor_id, neighbor_type, spotify_id, item_type in by_neighbor.iterator():
+        if (neighbor_id, neighbor_type) in changed:
+            affected.add((spotify_id, item_type))
+
+    return sorted(matrix.index[key] for key in affected if key in matrix.index)
+
+
+def refresh_item_similarities(full=False, **options):
+    """
+    Recomputes ItemSimilarity, either for every item (`full`) or only for
+    items whose ratings changed since the previous run. Similarities are
+    replaced per block of items, each block in its own transaction.
+    Returns (items refreshed, neighbor rows written).
+    """
+    started = timezone.now()
+    last_run = None if full else ItemSimilarity.objects.aggregate(at=Max("computed_at"))["at"]
+
+    matrix = load_rating_matrix(options.get("chunk_size"))
+    rows = None if last_run is None else _rows_to_refresh(matrix, last_run)
+    if rows is not None and not rows:
+        return 0, 0
+
+    block_size = options.get("block_size") or settings.RECS_BLOCK_SIZE
+    items_done, written = 0, 0
+    pending, pending_keys = [], []
+
+    def flush():
+        # Replace the block's neighbor lists; readers never see a gap
+        by_type = defaultdict(list)
+        for spotify_id, item_type in pending_keys:
+            by_type[item_type].append(spotify_id)
+        with transaction.atomic():
+            for item_type, spotify_ids in by_type.items():
+                ItemSimilarity.objects.filter(
+                    item_type=item_type, spotify_id__in=spotify_ids
+                ).delete()
+            ItemSimilarity.objects.bulk_create(pending, batch_size=1000)
+
+    neighbors_by_item = item_neighbors(
+        matrix,
+        rows=rows,
+        top_k=options.get("top_k"),
+        min_overlap=options.get("min_overlap"),
+        block_size=block_size,
+    )
+    for item_row, neighbors in neighbors_by_item:
+        spotify_id, item_type = matrix.items[item_row]
+        pending_keys.append((spotify_id, item_type))
+        for neighbor_row, similarity, overlap in neighbors:
+            neighbor_id, neighbor_type = matrix.items[neighbor_row]
+            pending.append(ItemSimilarity(
+                spotify_id=spotify_id,
+                item_type=item_type,
+                neighbor_id=neighbor_id,
+                neighbor_type=neighbor_type,
+                similarity=similarity,
+                overlap=overlap,
+                computed_at=started,
+            ))
+        items_done += 1
+
+        if len(pending_keys) >= block_size:
+            flush()
+            written += len(pending)
+            pending, pending_keys = [], []
+
+    if pending_keys:
+        flush()
+        written += len(pending)
+
+    if rows is None:
+        # Full run: drop items that nobody rates any more
+        ItemSimilarity.objects.filter(computed_at__lt=started).delete()
+
+    return items_done, written
+
+
+def similar_items(spotify_id, item_type, limit=20):
+    """
+    "Because you rated X": X's stored neighbors, most similar first
+    """
+    return list(
+        ItemSimilarity.objects.filter(spotify_id=spotify_id, item_type=item_type)
+        .order_by("-similarity")
+        .values("neighbor_id", "neighbor_type", "similarity", "overlap")[:limit]
+    )
+
+
+def recommend_for_user(user_id, limit=20, item_type=None):
+    """
+    Scores unrated neighbors of the user's most recently rated items
+    (RECS_SEED_ITEMS) by sum(similarity * (rating - user mean)).
+
+    Returns dicts with spotify_id, item_type, score, predicted_rating
+    (user mean + weighted average deviation) and `because`: the seed item
+    that contributed most.
+    """
+    ratings = Rating.objects.filter(user_id=user_id)
+    mean = ratings.aggregate(mean=Avg("rating"))["mean"]
+    if mean is None:
+        return []
+    mean = float(mean)
+
+    seeds = {
+        (spotify_id, seed_type): float(rating) - mean
+        for spotify_id, seed_type, rating in ratings.order_by("-updated_at")
+        .values_list("spotify_id", "item_type", "rating")[: settings.RECS_SEED_ITEMS]
+    }
+    rated = set(ratings.values_list("spotify_id", "item_type"))
+
+    neighbor_rows = ItemSimilarity.objects.filter(
+        spotify_id__in={spotify_id for spotify_id, _ in seeds}
+    )
+    if item_type:
+        neighbor_rows = neighbor_rows.filter(neighbor_type=item_type)
+
+    totals = defaultdict(float)
+    weights = defaultdict(float)
+    because = {}
+    for seed_id, seed_type, neighbor_id, neighbor_type, similarity in neighbor_rows.values_list(
+        "spotify_id", "item_type", "neighbor_id", "neighbor_type", "similarity"
+    ):
+        seed = (seed_id, seed_type)
+        candidate = (neighbor_id, neighbor_type)
+        if seed not in seeds or candidate in rated:
+            continue
+
+        contribution = similarity * seeds[seed]
+        totals[candidate] += contribution
+        weights[candidate] += abs(similarity)
+        if contribution > because.get(candidate, (None, 0.0))[1]:
+            because[candidate] = (seed, contribution)
+
+    ranked = sorted(
+        (candidate for candidate, total in totals.items() if total > 0),
+        key=lambda candidate: totals[candidate],
+        reverse=True,
+    )[:limit]
+
+    results = []
+    for candidate in ranked:
+        predicted = mean + totals[candidate] / weights[candidate]
+        seed = because[candidate][0]
+        results.append(
+            {
+                "spotify_id": candidate[0],
+                "item_type": candidate[1],
+                "score": round(totals[candidate], 4),
+                "predicted_rating": round(min(max(predicted, 0.0), 5.0), 2),
+                "because": {"spotify_id": seed[0], "item_type": seed[1]},
+            }
+        )
+    return results
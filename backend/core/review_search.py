@@ -0,0 +1,149 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Review
+
+# Same expression as the GIN index in migration 0011, so Postgres uses it
+PG_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(r.item_name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(r.text, '')), 'B')"
+)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts5_query(query):
+    """
+    User input -> FTS5 MATCH expression: every word must appear, the last
+    one as a prefix (so results show up while typing). Quoting each token
+    keeps FTS5 operators/syntax in the input from being interpreted.
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _scope_sql(user_id, item):
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("r.user_id = %s")
+        params.append(user_id)
+    if item is not None:
+        clauses.append("r.spotify_id = %s AND r.item_type = %s")
+        params.extend(item)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def _search_sqlite(query, user_id, item, offset, limit):
+    match = fts5_query(query)
+    if match is None:
+        return []
+    scope, scope_params = _scope_sql(user_id, item)
+    # bm25() is lower-is-better; item_name hits weigh more than body hits
+    sql = f"""
+        SELECT r.id,
+               bm25(core_review_fts, 4.0, 1.0) AS score,
+               snippet(core_review_fts, 1, '[', ']', '…', 16) AS snippet
+        FROM core_review_fts
+        JOIN core_review r ON r.id = core_review_fts.rowid
+        WHERE core_review_fts MATCH %s{scope}
+        ORDER BY score, r.id DESC
+        LIMIT %s OFFSET %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, *scope_params, limit, offset])
+        return [(pk, -score, snippet) for pk, score, snippet in cursor.fetchall()]
+
+
+def _search_postgres(query, user_id, item, offset, limit):
+    scope, scope_params = _scope_sql(user_id, item)
+    # Rank + page first, then build headlines for the page rows only
+    sql = f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+        hits AS (
+            SELECT r.id, r.text, ts_rank_cd({PG_DOCUMENT}, q.query) AS score
+            FROM core_review r, q
+            WHERE ({PG_DOCUMENT}) @@ q.query{scope}
+            ORDER BY score DESC, r.id DESC
+            LIMIT %s OFFSET %s
+        )
+        SELECT hits.id, hits.score,
+               ts_headline('english', hits.text, q.query,
+                           'StartSel=[, StopSel=], MaxFragments=1, MaxWords=24, MinWords=8')
+        FROM hits, q
+        ORDER BY hits.score DESC, hits.id DESC
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, *scope_params, limit, offset])
+        return cursor.fetchall()
+
+
+def _plain_snippet(text, token, width=60):
+    """
+    `text` around the first occurrence of `token`, which is [bracketed]
+    like the FTS snippets
+    """
+    start = text.casefold().find(token.casefold())
+    if start < 0:
+        return text[: width * 2]
+    end = start + len(token)
+    before = max(start - width, 0)
+    after = end + width
+    return (
+        ("…" if before else "")
+        + f"{text[before:start]}[{text[start:end]}]{text[end:after]}"
+        + ("…" if after < len(text) else "")
+    )
+
+
+def _search_icontains(query, user_id, item, offset, limit):
+    """
+    Unindexed fallback for other backends: every word must appear in the
+    name or text, newest first, unranked
+    """
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return []
+    reviews = Review.objects.all()
+    for token in tokens:
+        reviews = reviews.filter(Q(item_name__icontains=token) | Q(text__icontains=token))
+    if user_id is not None:
+        reviews = reviews.filter(user_id=user_id)
+    if item is not None:
+        reviews = reviews.filter(spotify_id=item[0], item_type=item[1])
+
+    rows = reviews.order_by("-updated_at", "-id").values_list("id", "text")
+    return [
+        (pk, 0.0, _plain_snippet(text, tokens[0]))
+        for pk, text in rows[offset:offset + limit]
+    ]
+
+
+def search_reviews(query, user_id=None, item=None, offset=0, limit=20):
+    """
+    Ranked full-text search over review names and text (unranked
+    icontains matching on backends without an index set up).
+
+    `user_id` and `item` ((spotify_id, item_type)) narrow the search.
+    Returns a list of (Review, score, snippet), best first; higher scores
+    rank higher, but values are only comparable within one backend.
+    """
+    if connection.vendor == "postgresql":
+        hits = _search_postgres(query, user_id, item, offset, limit)
+    elif connection.vendor == "sqlite":
+        hits = _search_sqlite(query, user_id, item, offset, limit)
+    else:
+        hits = _search_icontains(query, user_id, item, offset, limit)
+
+    # The full rows (minus text, the snippet stands in) in one query
+    reviews = Review.objects.defer("text").in_bulk([pk for pk, _, _ in hits])
+    return [
+        (reviews[pk], float(score), snippet)
+        for pk, score, snippet in hits
+        if pk in reviews
+    ]
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from .background import run_in_background
+from .normalizers import SEARCH_BLOCKS
+from .spotify_client import SpotifyAPIError, aspotify_app_get, spotify_app_get
+
+# item_type -> /search response block
+TYPE_BLOCKS = {item_type: block for block, item_type in SEARCH_BLOCKS.items()}
+
+MARKET_RE = re.compile(r"^[A-Z]{2}$")
+
+# Search pages
+#
+# A page is one type's slice of /search results: (offset, limit). Catalog
+# results don't depend on the user, so pages are fetched with the app token
+# and shared by everyone through the "search" cache alias (TTL + LRU, see
+# settings.CACHES), keyed on the normalized query, type, market and page.
+# Pages are stored as {"items": [...], "total": n}, both when served and
+# when prefetched, so "load more" is usually a cache hit.
+
+
+def search_cache():
+    return caches["search"]
+
+
+def normalize_query(query):
+    """
+    Case-folded with whitespace collapsed, so "Taylor  Swift" and
+    "taylor swift" share cache entries (and the upstream query)
+    """
+    return " ".join(query.casefold().split())
+
+
+def _page_key(query, item_type, market, offset, limit):
+    digest = hashlib.md5(f"{query}|{item_type}|{market}|{offset}|{limit}".encode()).hexdigest()
+    return f"search:page:{digest}"
+
+
+def _group_pages(pages):
+    """
+    {item_type: (offset, limit)} -> {(offset, limit): [item_type, ...]}, so
+    types paged together share one upstream call
+    """
+    groups = {}
+    for item_type, page in pages.items():
+        groups.setdefault(page, []).append(item_type)
+    return groups
+
+
+def _search_params(query, item_types, market, offset, limit):
+    params = {"q": query, "type": ",".join(item_types), "offset": offset, "limit": limit}
+    if market:
+        params["market"] = market
+    return params
+
+
+def _split_blocks(raw, item_types):
+    """
+    Per-type pages out of one /search response, keeping only what the
+    normalizers read
+    """
+    pages = {}
+    for item_type in item_types:
+        block = (raw or {}).get(TYPE_BLOCKS[item_type]) or {}
+        pages[item_type] = {"items": block.get("items") or [], "total": block.get("total") or 0}
+    return pages
+
+
+# Counters (default cache, never expire)
+#
+# requested_calls is what /search calls would have cost without the cache
+# (one per distinct page group a response needed) and upstream_calls what
+# responses actually sent, so their difference is what the cache saved.
+# prefetch_calls (sent ahead of "load more", used or not) are reported on
+# their own.
+
+STAT_NAMES = ("hits", "misses", "requested_calls", "upstream_calls", "prefetch_calls")
+
+
+def _stat_key(name):
+    return f"search:stats:{name}"
+
+
+def _count(name, amount=1):
+    if not amount:
+        return
+    try:
+        cache.incr(_stat_key(name), amount)
+    except ValueError:
+        cache.add(_stat_key(name), 0, timeout=None)
+        cache.incr(_stat_key(name), amount)
+
+
+async def _acount(name, amount=1):
+    if not amount:
+        return
+    try:
+        await cache.aincr(_stat_key(name), amount)
+    except ValueError:
+        await cache.aadd(_stat_key(name), 0, timeout=None)
+        await cache.aincr(_stat_key(name), amount)
+
+
+def search_cache_stats():
+    values = cache.get_many([_stat_key(name) for name in STAT_NAMES])
+    stats = {name: values.get(_stat_key(name), 0) for name in STAT_NAMES}
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+    stats["upstream_calls_saved"] = stats["requested_calls"] - stats["upstream_calls"]
+    return stats
+
+
+async def asearch_pages(query, pages, market=None):
+    """
+    {item_type: (offset, limit)} -> {item_type: {"items": [...], "total": n}}
+
+    Cached pages are reused; the rest are fetched with one /search call per
+    distinct (offset, limit), run concurrently.
+    """
+    page_cache = search_cache()
+    keys = {
+        item_type: _page_key(query, item_type, market, *page)
+        for item_type, page in pages.items()
+    }
+    cached = await page_cache.aget_many(keys.values())
+    results = {item_type: cached[key] for item_type, key in keys.items() if key in cached}
+
+    groups = _group_pages({t: page for t, page in pages.items() if t not in results})
+    await _acount("hits", len(results))
+    await _acount("misses", len(pages) - len(results))
+    await _acount("requested_calls", len(_group_pages(pages)))
+    await _acount("upstream_calls", len(groups))
+
+    responses = await asyncio.gather(
+        *(
+            aspotify_app_get("/search", params=_search_params(query, item_types, market, *page))
+            for page, item_types in groups.items()
+        )
+    )
+
+    fetched = {}
+    for item_types, raw in zip(groups.values(), responses):
+        fetched.update(_split_blocks(raw, item_types))
+    if fetched:
+        await page_cache.aset_many({keys[item_type]: page for item_type, page in fetched.items()})
+
+    results.update(fetched)
+    return results
+
+
+def next_offset(page, offset, limit):
+    """
+    Offset of the page after this one, or None at the end of the results
+    (or past the deepest offset Spotify serves)
+    """
+    following = offset + limit
+    if len(page["items"]) < limit or following >= page["total"]:
+        return None
+    if following > settings.SEARCH_MAX_OFFSET:
+        return None
+    return following
+
+
+def _prefetch_pages(query, pages, market):
+    page_cache = search_cache()
+    keys = {
+        item_type: _page_key(query, item_type, market, *page)
+        for item_type, page in pages.items()
+    }
+    cached = page_cache.get_many(keys.values())
+
+    groups = _group_pages({t: page for t, page in pages.items() if keys[t] not in cached})
+    for page, item_types in groups.items():
+        try:
+            raw = spotify_app_get("/search", params=_search_params(query, item_types, market, *page))
+        except SpotifyAPIError:
+            # Best effort; "load more" fetches the page itself
+            return
+        finally:
+            _count("prefetch_calls")
+        page_cache.set_many(
+            {keys[t]: block for t, block in _split_blocks(raw, item_types).items()}
+        )
+
+
+def schedule_search_prefetch(query, pages, market=None):
+    """
+    Warms the cache with the given {item_type: (offset, limit)} pages in the
+    background (one task per query + market + pages at a time)
+    """
+    if pages and settings.SEARCH_PREFETCH:
+        run_in_background(
+            _prefetch_pages,
+            query,
+            pages,
+            market,
+            key=("search-prefetch", query, market, tuple(sorted(pages.items()))),
+        )
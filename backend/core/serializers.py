@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from rest_framework import serializers
 
-from .models import SpotifyAccount, Rating, Review
+from .authentication import ClaimsUser
+from .aggregates import apply_rating_change, refresh_rating_aggregates
+from .models import SpotifyAccount, Rating, Review, CatalogItem
+from .taste_match import note_rating_changes
 
 User = get_user_model()
 
@@ -16,6 +21,9 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "email", "display_name", "spotify_id"]
 
     def get_display_name(self, obj):
+        # Token-backed users carry it as a claim
+        if isinstance(obj, ClaimsUser):
+            return obj.display_name
         # If user has a SpotifyAccount, use display_name
         account = getattr(obj, "spotify_account", None)
         if account and account.display_name:
@@ -23,20 +31,52 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.username
 
     def get_spotify_id(self, obj):
+        if isinstance(obj, ClaimsUser):
+            return obj.spotify_id
         account = getattr(obj, "spotify_account", None)
         if account:
             return account.spotify_id
         return None
 
 
+class CatalogItemSerializer(serializers.ModelSerializer):
+    """
+    Read-only Spotify metadata attached to rating/review rows
+    """
+
+    class Meta:
+        model = CatalogItem
+        fields = [
+            "name",
+            "artists",
+            "album",
+            "image_url",
+            "duration_ms",
+            "release_date",
+            "popularity",
+        ]
+        read_only_fields = fields
+
+
+def _catalog_data(obj):
+    # Set by catalog.attach_catalog() on list endpoints; absent otherwise
+    item = getattr(obj, "catalog_item", None)
+    if item is None:
+        return None
+    return CatalogItemSerializer(item).data
+
+
 class RatingSerializer(serializers.ModelSerializer):
     """
     Serializer for creating/updating numeric ratings.
 
     - user is taken from request.user (not from the payload)
     - upsert based on (user, spotify_id, item_type)
+    - catalog: local Spotify metadata, when attached (list endpoint)
     """
 
+    catalog = serializers.SerializerMethodField()
+
     class Meta:
         model = Rating
         fields = [
@@ -45,10 +85,16 @@ class RatingSerializer(serializers.ModelSerializer):
             "item_type",
             "item_name",   
             "rating",
+            "catalog",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        # Field written by bulk_upsert() besides item_name
+        upsert_value_field = "rating"
+
+    def get_catalog(self, obj):
+        return _catalog_data(obj)
 
     def create(self, validated_data):
         """
@@ -56,6 +102,7 @@ class RatingSerializer(serializers.ModelSerializer):
         If rating for (user, spotify_id, item_type) already exists,
         update its rating value (and item_name if provided)
         instead of creating a duplicate row.
+        The item's RatingAggregate is updated in the same transaction.
         """
         user = self.context["request"].user
 
@@ -68,12 +115,29 @@ class RatingSerializer(serializers.ModelSerializer):
         if item_name is not None:
             defaults["item_name"] = item_name
 
-        rating_obj, _created = Rating.objects.update_or_create(
-            user=user,
-            spotify_id=spotify_id,
-            item_type=item_type,
-            defaults=defaults,
-        )
+        with transaction.atomic():
+            # Previous value, locked, so the aggregate gets the right delta
+            old_value = (
+                Rating.objects.select_for_update()
+                .filter(user_id=user.id, spotify_id=spotify_id, item_type=item_type)
+                .values_list("rating", flat=True)
+                .first()
+            )
+            rating_obj, created = Rating.objects.update_or_create(
+                user_id=user.id,
+                spotify_id=spotify_id,
+                item_type=item_type,
+                defaults=defaults,
+            )
+            if old_value is None and not created:
+                # A concurrent first rating inserted the row after our read
+                # (nothing to lock then); its previous value is unknown, so
+                # recount the item instead of applying a delta twice
+                refresh_rating_aggregates([(spotify_id, item_type)])
+            else:
+                apply_rating_change(spotify_id, item_type, old_value, rating_obj.rating)
+        if old_value != rating_obj.rating:
+            note_rating_changes(user.id)
         return rating_obj
 class ReviewSerializer(serializers.ModelSerializer):
     """
@@ -82,6 +146,7 @@ class ReviewSerializer(serializers.ModelSerializer):
     - user is taken from request.user (not from the payload)
     - upsert based on (user, spotify_id, item_type)
     - text limited to 10,000 characters
+    - catalog: local Spotify metadata, when attached (list endpoint)
     """
 
     # Enforce 10,000 char limit 
@@ -92,6 +157,8 @@ class ReviewSerializer(serializers.ModelSerializer):
         help_text="User's review text, up to 10,000 characters.",
     )
 
+    catalog = serializers.SerializerMethodField()
+
     class Meta:
         model = Review
         fields = [
@@ -100,10 +167,15 @@ class ReviewSerializer(serializers.ModelSerializer):
             "item_type",
             "item_name",
             "text",
+            "catalog",
             "created_at",
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        upsert_value_field = "text"
+
+    def get_catalog(self, obj):
+        return _catalog_data(obj)
 
     def create(self, validated_data):
         """
@@ -123,9 +195,105 @@ class ReviewSerializer(serializers.ModelSerializer):
             defaults["item_name"] = item_name
 
         review_obj, _created = Review.objects.update_or_create(
-            user=user,
+            user_id=user.id,
             spotify_id=spotify_id,
             item_type=item_type,
             defaults=defaults,
         )
         return review_obj
+
+
+def bulk_upsert(serializer_class, user, items):
+    """
+    Validate a list of rating/review payloads and upsert the valid ones
+    with one INSERT ... ON CONFLICT DO UPDATE per batch, against the
+    (user, spotify_id, item_type) unique constraint.
+
+    Same semantics as serializer.create(): item_name is only overwritten
+    when the item provides it. If a key appears more than once, the last
+    occurrence wins.
+
+    Returns (results, objs): one result dict per input item, in order, and
+    the saved model instances.
+    """
+    model = serializer_class.Meta.model
+    value_field = serializer_class.Meta.upsert_value_field
+
+    # One serializer instance validates every item (no per-item field setup)
+    validator = serializer_class()
+    results = []
+    latest = {}  # (spotify_id, item_type) -> index of its last occurrence
+
+    for index, item in enumerate(items):
+        result = {"index": index}
+        try:
+            data = validator.run_validation(item)
+        except serializers.ValidationError as exc:
+            result.update(status="invalid", errors=exc.detail)
+            results.append(result)
+            continue
+
+        key = (data["spotify_id"], data["item_type"])
+        result.update(spotify_id=key[0], item_type=key[1], data=data)
+        if key in latest:
+            earlier = results[latest[key]]
+            earlier["status"] = "superseded"
+            # Same outcome as applying the items one by one
+            if data.get("item_name") is None and earlier["data"].get("item_name") is not None:
+                data["item_name"] = earlier["data"]["item_name"]
+            earlier.pop("data")
+        latest[key] = index
+        results.append(result)
+
+    if not latest:
+        return results, []
+
+    # One query to tell creates from updates in the per-item report
+    existing = set(
+        model.objects.filter(
+            user_id=user.id,
+            spotify_id__in={spotify_id for spotify_id, _ in latest},
+        ).values_list("spotify_id", "item_type")
+    )
+
+    with_name, without_name = [], []
+    for key, index in latest.items():
+        data = results[index].pop("data")
+        obj = model(user_id=user.id, **data)
+        results[index]["status"] = "updated" if key in existing else "created"
+        results[index]["obj"] = obj
+        (without_name if data.get("item_name") is None else with_name).append(obj)
+
+    batch_size = settings.BULK_UPSERT_BATCH_SIZE
+    unique_fields = ["user", "spotify_id", "item_type"]
+    with transaction.atomic():
+        if with_name:
+            model.objects.bulk_create(
+                with_name,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=[value_field, "item_name", "updated_at"],
+            )
+        if without_name:
+            model.objects.bulk_create(
+                without_name,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=[value_field, "updated_at"],
+            )
+        if model is Rating:
+            refresh_rating_aggregates(latest)
+    if model is Rating:
+        note_rating_changes(user.id, len(latest))
+
+    objs = []
+    for result in results:
+        obj = result.pop("obj", None)
+        if obj is not None:
+            # pk is only filled in on backends that support RETURNING
+            result["id"] = obj.pk
+            objs.append(obj)
+
+    return results, objs
@@ -1,85 +1,607 @@
+import asyncio
 import base64
+import random
+import threading
+import time
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
 import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
+from .background import run_in_background
 from .models import SpotifyAccount
+from .rate_limit import CircuitBreaker, SharedRateLimiter
 
 BASE_URL = "https://api.spotify.com/v1"
+TOKEN_URL = "https://accounts.spotify.com/api/token"
 
 class SpotifyAPIError(Exception):
     """Raised when Spotify returns a non-success response."""
-    pass
 
+    code = "spotify_error"
 
-def refresh_spotify_token(account: SpotifyAccount):
+    def __init__(self, message, status_code=None, detail=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.detail = detail
+        # Seconds the caller should wait before trying again, if known
+        self.retry_after = retry_after
+
+
+class SpotifyAuthError(SpotifyAPIError):
+    """401 from the API, or a refresh token Spotify no longer accepts."""
+
+    code = "spotify_auth_failed"
+
+
+class SpotifyRateLimitError(SpotifyAPIError):
+    """429 from Spotify, or our own app-wide budget is spent."""
+
+    code = "spotify_rate_limited"
+
+
+class SpotifyUnavailableError(SpotifyAPIError):
+    """5xx, network failure, or the circuit breaker is open."""
+
+    code = "spotify_unavailable"
+
+
+class SpotifyCircuitOpenError(SpotifyUnavailableError):
+    """Failing fast while Spotify is degraded; not worth retrying."""
+
+
+# App-wide request budget and circuit breaker, shared through the cache
+api_rate_limiter = SharedRateLimiter(
+    "spotify-api",
+    rate=settings.SPOTIFY_API_RATE_LIMIT,
+    max_wait=settings.SPOTIFY_API_RATE_LIMIT_MAX_WAIT,
+)
+api_circuit_breaker = CircuitBreaker(
+    "spotify-api",
+    threshold=settings.SPOTIFY_BREAKER_THRESHOLD,
+    cooldown=settings.SPOTIFY_BREAKER_COOLDOWN,
+)
+
+
+# Shared HTTP transport
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
     """
-    Refreshes user's Spotify access token if expired
-    Returns a valid access token
+    Returns the process-wide pooled session used for every Spotify call.
+
+    Connections are kept alive and reused per host (api.spotify.com,
+    accounts.spotify.com), so only the first request on a connection
+    pays for the TCP + TLS handshake.
     """
-    if not account.is_token_expired():
-        return account.access_token
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Never keep cookies: the session is shared by every user
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+                adapter = HTTPAdapter(
+                    pool_connections=settings.SPOTIFY_HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=settings.SPOTIFY_HTTP_POOL_MAXSIZE,
+                    pool_block=settings.SPOTIFY_HTTP_POOL_BLOCK,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+
+def _http_timeout():
+    return (settings.SPOTIFY_HTTP_CONNECT_TIMEOUT, settings.SPOTIFY_HTTP_READ_TIMEOUT)
+
+
+# One AsyncClient per event loop: httpx pools are bound to the loop that
+# created them, and an ASGI worker runs a single long-lived loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled httpx.AsyncClient for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.SPOTIFY_ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.SPOTIFY_ASYNC_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(
+                settings.SPOTIFY_HTTP_READ_TIMEOUT,
+                connect=settings.SPOTIFY_HTTP_CONNECT_TIMEOUT,
+            ),
+        )
+        _async_clients[loop] = client
+
+    return client
+
+
+def _error_detail(resp):
+    try:
+        return resp.json()
+    except ValueError:
+        return resp.text
+
+
+def _retry_after(resp):
+    try:
+        return max(int(resp.headers.get("Retry-After", "")), 0)
+    except ValueError:
+        return None
+
+
+def _api_error(resp, message, auth_statuses=(401,)):
+    """
+    Maps a failed response onto the SpotifyAPIError subclass callers
+    branch on (works for requests and httpx responses)
+    """
+    status = resp.status_code
+    detail = _error_detail(resp)
 
-    token_url = "https://accounts.spotify.com/api/token"
+    if status == 429:
+        error_class = SpotifyRateLimitError
+    elif status >= 500:
+        error_class = SpotifyUnavailableError
+    elif status in auth_statuses:
+        error_class = SpotifyAuthError
+    else:
+        error_class = SpotifyAPIError
 
+    return error_class(
+        f"{message}: {detail}",
+        status_code=status,
+        detail=detail,
+        retry_after=_retry_after(resp),
+    )
+
+
+def _parse_api_response(resp, path: str):
+    """
+    Shared by the sync (requests) and async (httpx) clients.
+    """
+    if resp.status_code == 204:
+        return None
+
+    if resp.status_code >= 400:
+        raise _api_error(resp, f"Spotify GET {path} failed")
+
+    return resp.json()
+
+
+def _retry_delay(exc: SpotifyAPIError, attempt: int):
+    """
+    Seconds to wait before retrying after `exc`, or None to give up:
+    - 429: honor Retry-After, if it is short enough to wait inline
+    - 5xx / network: jittered exponential backoff
+    - anything else (incl. 401, handled by the *_user_get callers): no retry
+    """
+    if attempt >= settings.SPOTIFY_MAX_RETRIES:
+        return None
+
+    if isinstance(exc, SpotifyRateLimitError):
+        if exc.retry_after is not None and exc.retry_after <= settings.SPOTIFY_MAX_RETRY_AFTER:
+            return exc.retry_after
+        return None
+
+    if isinstance(exc, SpotifyUnavailableError) and not isinstance(exc, SpotifyCircuitOpenError):
+        ceiling = min(
+            settings.SPOTIFY_BACKOFF_MAX, settings.SPOTIFY_BACKOFF_BASE * (2 ** attempt)
+        )
+        return random.uniform(0, ceiling)
+
+    return None
+
+
+def _circuit_open_error(path, open_for):
+    return SpotifyCircuitOpenError(
+        f"Spotify GET {path} skipped: circuit open",
+        retry_after=int(open_for) + 1,
+    )
+
+
+def _budget_spent_error(path, wait):
+    return SpotifyRateLimitError(
+        f"Spotify GET {path} skipped: app rate limit reached",
+        retry_after=int(wait) + 1,
+    )
+
+
+def _basic_auth_header():
     auth_header = base64.b64encode(
         f"{settings.SPOTIFY_CLIENT_ID}:{settings.SPOTIFY_CLIENT_SECRET}".encode()
     ).decode()
+    return f"Basic {auth_header}"
 
-    headers = {
-        "Authorization": f"Basic {auth_header}",
+
+def _token_headers():
+    return {
+        "Authorization": _basic_auth_header(),
         "Content-Type": "application/x-www-form-urlencoded",
     }
 
-    data = {
-        "grant_type": "refresh_token",
-        "refresh_token": account.refresh_token,
-    }
 
-    resp = requests.post(token_url, headers=headers, data=data)
+def _parse_token_response(resp, action: str):
     if resp.status_code != 200:
-        raise Exception(f"Failed to refresh token: {resp.text}")
+        # 400 invalid_grant: the refresh token was revoked
+        raise _api_error(resp, f"Failed to {action}", auth_statuses=(400, 401))
+
+    return resp.json()
+
+
+def _post_token(data: dict, action: str):
+    """
+    POSTs to Spotify's token endpoint and returns the decoded body.
+    """
+    try:
+        resp = get_http_session().post(
+            TOKEN_URL, headers=_token_headers(), data=data, timeout=_http_timeout()
+        )
+    except requests.RequestException as exc:
+        raise SpotifyUnavailableError(f"Failed to {action}: {exc}") from exc
+    return _parse_token_response(resp, action)
 
-    body = resp.json()
-    new_access = body["access_token"]
-    expires_in = body.get("expires_in", 3600)
 
-    # Save new token
-    account.access_token = new_access
-    account.token_expires_at = timezone.now() + timedelta(seconds=expires_in)
-    account.save(update_fields=["access_token", "token_expires_at"])
+def _apply_token_response(account: SpotifyAccount, body: dict):
+    account.access_token = body["access_token"]
+    account.token_expires_at = timezone.now() + timedelta(
+        seconds=body.get("expires_in", 3600)
+    )
 
-    return new_access
 
-def spotify_get(path: str, access_token: str, params=None):
+def exchange_code_for_tokens(code: str):
+    """
+    Exchanges an OAuth authorization code for access + refresh tokens
+    """
+    return _post_token(
+        {
+            "grant_type": "authorization_code",
+            "code": code,
+            "redirect_uri": settings.SPOTIFY_REDIRECT_URI,
+        },
+        action="exchange code for tokens",
+    )
+
+
+# Token refresh
+#
+# Refresh is single-flight per SpotifyAccount:
+# - a striped lock dedupes concurrent callers inside this process
+# - a lease in the shared cache dedupes across processes; callers that
+#   don't get it re-read the row until the holder has saved a new token
+# The POST to accounts.spotify.com runs with no transaction open (SQLite
+# takes its write lock at BEGIN), and the new token is written with one
+# short UPDATE.
+
+_REFRESH_LOCK_STRIPES = 64
+_refresh_locks = [threading.Lock() for _ in range(_REFRESH_LOCK_STRIPES)]
+
+# Seconds between row re-reads while another process holds the lease
+_REFRESH_LEASE_POLL = 0.1
+
+
+def _refresh_skew():
+    return timedelta(seconds=settings.SPOTIFY_TOKEN_REFRESH_SKEW)
+
+
+def _refresh_lease_timeout():
+    # Outlives the token POST, so a crashed holder only delays others
+    return settings.SPOTIFY_HTTP_CONNECT_TIMEOUT + settings.SPOTIFY_HTTP_READ_TIMEOUT + 5
+
+
+def _needs_refresh(account: SpotifyAccount, skew: timedelta, rejected_token=None):
+    return account.is_token_expired(skew=skew) or (
+        rejected_token is not None and account.access_token == rejected_token
+    )
+
+
+def _current_token_row(account_pk):
+    # From the primary: a lagging replica would hide the holder's new token
+    return SpotifyAccount.objects.using("default").only(
+        "access_token", "refresh_token", "token_expires_at"
+    ).get(pk=account_pk)
+
+
+def _refresh_locked(account: SpotifyAccount, skew: timedelta, rejected_token=None):
+    """
+    Refreshes the token if it expires within `skew` (or is still the
+    `rejected_token` Spotify just answered 401 to), single-flight per
+    account, and copies the result onto `account`.
+    """
+    lease_key = f"spotify:token-refresh:{account.pk}"
+
+    with _refresh_locks[account.pk % _REFRESH_LOCK_STRIPES]:
+        current = _current_token_row(account.pk)
+        while _needs_refresh(current, skew, rejected_token):
+            if not cache.add(lease_key, True, timeout=_refresh_lease_timeout()):
+                # Another process is refreshing; wait for its token
+                time.sleep(_REFRESH_LEASE_POLL)
+                current = _current_token_row(account.pk)
+                continue
+
+            try:
+                # The previous holder may have finished since our read
+                current = _current_token_row(account.pk)
+                if _needs_refresh(current, skew, rejected_token):
+                    body = _post_token(
+                        {
+                            "grant_type": "refresh_token",
+                            "refresh_token": current.refresh_token,
+                        },
+                        action="refresh token",
+                    )
+
+                    # Save new token
+                    _apply_token_response(current, body)
+                    current.token_refresh_failed_at = None
+                    current.save(
+                        update_fields=[
+                            "access_token", "token_expires_at", "token_refresh_failed_at"
+                        ]
+                    )
+            finally:
+                cache.delete(lease_key)
+            break
+
+    account.access_token = current.access_token
+    account.token_expires_at = current.token_expires_at
+    return account.access_token
+
+
+def _background_refresh(account_pk):
+    account = SpotifyAccount.objects.get(pk=account_pk)
+    _refresh_locked(account, _refresh_skew())
+
+
+def _schedule_background_refresh(account: SpotifyAccount):
+    """
+    Queues a refresh for a token that is still valid but inside the skew
+    window. At most one refresh per account is queued at a time.
+    """
+    run_in_background(
+        _background_refresh, account.pk, key=f"token-refresh:{account.pk}"
+    )
+
+
+def refresh_spotify_token(account: SpotifyAccount):
+    """
+    Returns a valid access token for the account:
+    - expired: refreshed inline (single-flight, see above)
+    - expiring within SPOTIFY_TOKEN_REFRESH_SKEW: the current token is
+      returned and a refresh is scheduled in the background
+    """
+    if not account.is_token_expired(skew=_refresh_skew()):
+        return account.access_token
+
+    if not account.is_token_expired():
+        _schedule_background_refresh(account)
+        return account.access_token
+
+    return _refresh_locked(account, _refresh_skew())
+
+def refresh_spotify_token_if_expiring(account: SpotifyAccount, within: timedelta):
+    """
+    Refreshes inline if the token expires within `within`.
+    Used by the refresh_spotify_tokens worker; safe to race with requests.
+    """
+    return _refresh_locked(account, within)
+
+async def arefresh_spotify_token(account: SpotifyAccount):
+    """
+    Async version of refresh_spotify_token()
+
+    The inline refresh may wait on another process's lease and the token
+    POST, so it runs on the sync path in a worker thread; the common case
+    (token still valid) never leaves the event loop.
+    """
+    if not account.is_token_expired(skew=_refresh_skew()):
+        return account.access_token
+
+    if not account.is_token_expired():
+        _schedule_background_refresh(account)
+        return account.access_token
+
+    return await sync_to_async(_refresh_locked)(account, _refresh_skew())
+
+def _spotify_get_once(path: str, access_token: str, params=None):
+    open_for = api_circuit_breaker.open_for()
+    if open_for:
+        raise _circuit_open_error(path, open_for)
+
+    wait = api_rate_limiter.acquire()
+    if wait:
+        raise _budget_spent_error(path, wait)
+
     url = f"{BASE_URL}{path}"
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    resp = requests.get(url, headers=headers, params=params or {})
+    try:
+        resp = get_http_session().get(
+            url, headers=headers, params=params or {}, timeout=_http_timeout()
+        )
+    except requests.RequestException as exc:
+        api_circuit_breaker.record_failure()
+        raise SpotifyUnavailableError(f"Spotify GET {path} failed: {exc}") from exc
 
-    if resp.status_code == 204:
-        return None
+    if resp.status_code >= 500:
+        api_circuit_breaker.record_failure()
+    else:
+        api_circuit_breaker.record_success()
+
+    if resp.status_code == 429:
+        # Back the whole app off, not just this request
+        api_rate_limiter.pause(_retry_after(resp) or 1)
+
+    return _parse_api_response(resp, path)
 
-    if not resp.ok:
+def spotify_get(path: str, access_token: str, params=None):
+    """
+    GET with retries classified by failure (see _retry_delay)
+    """
+    attempt = 0
+    while True:
         try:
-            detail = resp.json()
-        except:
-            detail = resp.text
-        raise SpotifyAPIError(f"Spotify GET {path} failed: {detail}")
+            return _spotify_get_once(path, access_token, params=params)
+        except SpotifyAPIError as exc:
+            delay = _retry_delay(exc, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
 
-    return resp.json()
+async def _aspotify_get_once(path: str, access_token: str, params=None):
+    open_for = await api_circuit_breaker.aopen_for()
+    if open_for:
+        raise _circuit_open_error(path, open_for)
+
+    wait = await api_rate_limiter.aacquire()
+    if wait:
+        raise _budget_spent_error(path, wait)
+
+    url = f"{BASE_URL}{path}"
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    try:
+        resp = await get_async_http_client().get(url, headers=headers, params=params or {})
+    except httpx.HTTPError as exc:
+        await api_circuit_breaker.arecord_failure()
+        raise SpotifyUnavailableError(f"Spotify GET {path} failed: {exc}") from exc
+
+    if resp.status_code >= 500:
+        await api_circuit_breaker.arecord_failure()
+    else:
+        await api_circuit_breaker.arecord_success()
+
+    if resp.status_code == 429:
+        await api_rate_limiter.apause(_retry_after(resp) or 1)
+
+    return _parse_api_response(resp, path)
+
+async def aspotify_get(path: str, access_token: str, params=None):
+    """
+    Async version of spotify_get()
+    """
+    attempt = 0
+    while True:
+        try:
+            return await _aspotify_get_once(path, access_token, params=params)
+        except SpotifyAPIError as exc:
+            delay = _retry_delay(exc, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
 
 def spotify_user_get(path: str, account: SpotifyAccount, params=None):
     """
     GET for an authenticated user:
     - refreshes token if needed
-    - retries once if expired during request
+    - on 401, force-refreshes the token and retries once
+    (429 / 5xx are retried inside spotify_get)
     """
     access_token = refresh_spotify_token(account)
 
     try:
         return spotify_get(path, access_token, params=params)
-    except SpotifyAPIError:
-        # token may have just expired mid-request → refresh + retry
-        access_token = refresh_spotify_token(account)
-        return spotify_get(path, access_token, params=params)
\ No newline at end of file
+    except SpotifyAuthError:
+        # token was revoked or expired mid-request → refresh + retry
+        access_token = _refresh_locked(account, _refresh_skew(), rejected_token=access_token)
+        return spotify_get(path, access_token, params=params)
+
+async def aspotify_user_get(path: str, account: SpotifyAccount, params=None):
+    """
+    Async version of spotify_user_get()
+    """
+    access_token = await arefresh_spotify_token(account)
+
+    try:
+        return await aspotify_get(path, access_token, params=params)
+    except SpotifyAuthError:
+        access_token = await sync_to_async(_refresh_locked)(
+            account, _refresh_skew(), rejected_token=access_token
+        )
+        return await aspotify_get(path, access_token, params=params)
+
+
+# App token (client credentials)
+#
+# Catalog endpoints (/search, ...) don't depend on the user, so they are
+# called with one app-level token shared by every worker through the
+# default cache, renewed SPOTIFY_TOKEN_REFRESH_SKEW seconds before expiry.
+
+_APP_TOKEN_KEY = "spotify:app-token"
+_app_token_lock = threading.Lock()
+
+
+def get_app_access_token(rejected_token=None):
+    """
+    Cached client-credentials token; fetches a new one when missing or
+    when it is the `rejected_token` Spotify just answered 401 to
+    """
+    token = cache.get(_APP_TOKEN_KEY)
+    if token and token != rejected_token:
+        return token
+
+    with _app_token_lock:
+        token = cache.get(_APP_TOKEN_KEY)
+        if token and token != rejected_token:
+            return token
+
+        body = _post_token({"grant_type": "client_credentials"}, action="get app token")
+        token = body["access_token"]
+        ttl = int(body.get("expires_in", 3600)) - settings.SPOTIFY_TOKEN_REFRESH_SKEW
+        cache.set(_APP_TOKEN_KEY, token, timeout=max(ttl, 60))
+        return token
+
+
+async def aget_app_access_token(rejected_token=None):
+    token = await cache.aget(_APP_TOKEN_KEY)
+    if token and token != rejected_token:
+        return token
+    return await sync_to_async(get_app_access_token)(rejected_token)
+
+
+def spotify_app_get(path: str, params=None):
+    """
+    GET with the app token (catalog data only, no /me endpoints);
+    on 401, renews the token and retries once
+    """
+    access_token = get_app_access_token()
+
+    try:
+        return spotify_get(path, access_token, params=params)
+    except SpotifyAuthError:
+        access_token = get_app_access_token(rejected_token=access_token)
+        return spotify_get(path, access_token, params=params)
+
+
+async def aspotify_app_get(path: str, params=None):
+    """
+    Async version of spotify_app_get()
+    """
+    access_token = await aget_app_access_token()
+
+    try:
+        return await aspotify_get(path, access_token, params=params)
+    except SpotifyAuthError:
+        access_token = await aget_app_access_token(rejected_token=access_token)
+        return await aspotify_get(path, access_token, params=params)
@@ -0,0 +1,254 @@
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Rating, UserSimilarity
+from .recommendations import load_rating_matrix
+
+
+def compatibility(similarity, overlap):
+    """
+    0-100 taste score: cosine similarity shrunk towards neutral (50) when
+    few items are co-rated, so two shared 5-star ratings aren't "100%"
+    """
+    confidence = overlap / (overlap + settings.TASTE_SHRINKAGE)
+    return round(50 * (1 + similarity * confidence), 1)
+
+
+# Cache versioning: a user's cached vector/match/neighbors are keyed on
+# their version, which is bumped once they've changed enough ratings.
+
+def _version_key(user_id):
+    return f"taste:version:{user_id}"
+
+
+def _versions(*user_ids):
+    found = cache.get_many([_version_key(user_id) for user_id in user_ids])
+    return [found.get(_version_key(user_id), 0) for user_id in user_ids]
+
+
+def note_rating_changes(user_id, count=1):
+    """
+    Called on rating writes. After TASTE_INVALIDATE_CHANGES changes the
+    user's cached taste data is invalidated (by version) and their
+    neighbors get recomputed on the next incremental batch run.
+    """
+    key = f"taste:changes:{user_id}"
+    cache.add(key, 0, timeout=None)
+    if cache.incr(key, count) < settings.TASTE_INVALIDATE_CHANGES:
+        return
+
+    cache.set(key, 0, timeout=None)
+    cache.add(_version_key(user_id), 0, timeout=None)
+    cache.incr(_version_key(user_id))
+
+
+def _user_vector(user_id, version):
+    """
+    (sorted item keys, mean-centered ratings) of one user, cached
+    """
+    key = f"taste:vector:{user_id}:{version}"
+    vector = cache.get(key)
+    if vector is None:
+        rows = list(
+            Rating.objects.filter(user_id=user_id).values_list("item_type", "spotify_id", "rating")
+        )
+        keys = np.array([f"{item_type}:{spotify_id}" for item_type, spotify_id, _ in rows], dtype=str)
+        values = np.array([float(rating) for _, _, rating in rows], dtype=np.float64)
+        order = np.argsort(keys, kind="stable")
+        keys, values = keys[order], values[order]
+        if len(values):
+            values -= values.mean()
+        vector = (keys, values)
+        cache.set(key, vector, timeout=settings.TASTE_CACHE_TTL)
+    return vector
+
+
+def pair_similarity(vector_a, vector_b):
+    """
+    (cosine similarity over co-rated items, overlap) of two user vectors
+    """
+    keys_a, values_a = vector_a
+    keys_b, values_b = vector_b
+    _, index_a, index_b = np.intersect1d(keys_a, keys_b, assume_unique=True, return_indices=True)
+
+    x, y = values_a[index_a], values_b[index_b]
+    denominator = np.sqrt((x @ x) * (y @ y))
+    similarity = float(x @ y / denominator) if denominator > 0 else 0.0
+    return similarity, len(index_a)
+
+
+def taste_match(user_id, other_id):
+    """
+    {"score", "similarity", "overlap"} for two users, cached per pair and
+    ratings version
+    """
+    low, high = sorted((user_id, other_id))
+    version_low, version_high = _versions(low, high)
+    key = f"taste:match:{low}:{high}:{version_low}:{version_high}"
+
+    match = cache.get(key)
+    if match is None:
+        similarity, overlap = pair_similarity(
+            _user_vector(low, version_low), _user_vector(high, version_high)
+        )
+        if overlap < settings.TASTE_MIN_OVERLAP:
+            match = {"score": None, "similarity": None, "overlap": overlap}
+        else:
+            match = {
+                "score": compatibility(similarity, overlap),
+                "similarity": round(similarity, 4),
+                "overlap": overlap,
+            }
+        cache.set(key, match, timeout=settings.TASTE_CACHE_TTL)
+    return match
+
+
+def similar_users(user_id, limit=10):
+    """
+    The user's precomputed most-similar users, best first, cached
+    """
+    version, generation = _versions(user_id, "generation")
+    key = f"taste:neighbors:{user_id}:{version}:{generation}"
+
+    neighbors = cache.get(key)
+    if neighbors is None:
+        rows = (
+            UserSimilarity.objects.filter(user_id=user_id)
+            .select_related("other", "other__spotify_account")
+            .order_by("-score")[: settings.TASTE_NEIGHBORS]
+        )
+        neighbors = []
+        for row in rows:
+            account = getattr(row.other, "spotify_account", None)
+            neighbors.append(
+                {
+                    "user_id": row.other_id,
+                    "username": row.other.username,
+                    "display_name": (account.display_name if account else "") or row.other.username,
+                    "score": row.score,
+                    "overlap": row.overlap,
+                }
+            )
+        cache.set(key, neighbors, timeout=settings.TASTE_CACHE_TTL)
+    return neighbors[:limit]
+
+
+def _aligned(row, indices):
+    """
+    Values of sparse row `row` at column `indices` (0 where absent)
+    """
+    out = np.zeros(len(indices), dtype=np.float64)
+    if row.nnz:
+        positions = np.minimum(np.searchsorted(row.indices, indices), row.nnz - 1)
+        present = row.indices[positions] == indices
+        out[present] = row.data[positions[present]]
+    return out
+
+
+def _users_to_refresh(matrix, since):
+    """
+    Users who changed at least TASTE_INVALIDATE_CHANGES ratings since `since`
+    """
+    changed = (
+        Rating.objects.filter(updated_at__gt=since)
+        .values("user_id")
+        .annotate(changes=Count("id"))
+        .filter(changes__gte=settings.TASTE_INVALIDATE_CHANGES)
+        .values_list("user_id", flat=True)
+    )
+    columns = {user_id: col for col, user_id in enumerate(matrix.users)}
+    return sorted(columns[user_id] for user_id in changed if user_id in columns)
+
+
+def refresh_user_similarities(full=False, chunk_size=None, block_size=None):
+    """
+    Recomputes UserSimilarity for every user (`full`) or only those whose
+    ratings changed enough since the last run.
+
+    For a block of users, all four per-pair sums over co-rated items come
+    from sparse products of the user x item matrices: C.Ct (dot products),
+    C2.Rt / R.C2t (each side's squared norm over co-rated items) and R.Rt
+    (overlap). Returns (users refreshed, neighbor rows written).
+    """
+    started = timezone.now()
+    last_run = None if full else UserSimilarity.objects.aggregate(at=Max("computed_at"))["at"]
+    block_size = block_size or settings.TASTE_BLOCK_SIZE
+
+    matrix = load_rating_matrix(chunk_size)
+    centered = matrix.centered.T.tocsr().astype(np.float64)
+    rated = matrix.rated.T.tocsr().astype(np.float64)
+    squared = centered.multiply(centered).tocsr()
+    centered_t, rated_t, squared_t = centered.T.tocsc(), rated.T.tocsc(), squared.T.tocsc()
+
+    rows = (
+        np.arange(len(matrix.users)) if last_run is None
+        else np.asarray(_users_to_refresh(matrix, last_run), dtype=np.int64)
+    )
+
+    users_done, written = 0, 0
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        products = [
+            product.tocsr()
+            for product in (
+                centered[block] @ centered_t,
+                squared[block] @ rated_t,
+                rated[block] @ squared_t,
+                rated[block] @ rated_t,
+            )
+        ]
+        for product in products:
+            product.sort_indices()
+        dots, own, other, overlaps = products
+
+        entries = []
+        for offset, user_row in enumerate(block):
+            candidates = overlaps[offset].indices
+            counts = overlaps[offset].data
+            keep = (counts >= settings.TASTE_MIN_OVERLAP) & (candidates != user_row)
+            candidates, counts = candidates[keep], counts[keep]
+
+            denominator = np.sqrt(
+                _aligned(own[offset], candidates) * _aligned(other[offset], candidates)
+            )
+            similarity = np.divide(
+                _aligned(dots[offset], candidates), denominator,
+                out=np.zeros_like(denominator), where=denominator > 0,
+            )
+            confidence = counts / (counts + settings.TASTE_SHRINKAGE)
+            scores = 50 * (1 + similarity * confidence)
+
+            top = np.argsort(-scores, kind="stable")[: settings.TASTE_NEIGHBORS]
+            for i in top:
+                entries.append(UserSimilarity(
+                    user_id=matrix.users[user_row],
+                    other_id=matrix.users[candidates[i]],
+                    similarity=float(similarity[i]),
+                    overlap=int(counts[i]),
+                    score=round(float(scores[i]), 1),
+                    computed_at=started,
+                ))
+
+        user_ids = [matrix.users[user_row] for user_row in block]
+        with transaction.atomic():
+            UserSimilarity.objects.filter(user_id__in=user_ids).delete()
+            UserSimilarity.objects.bulk_create(entries, batch_size=1000)
+        users_done += len(block)
+        written += len(entries)
+
+    dropped = 0
+    if last_run is None:
+        # Full run: drop users who no longer rate anything
+        dropped, _ = UserSimilarity.objects.filter(computed_at__lt=started).delete()
+
+    # Cached neighbor lists are keyed on this; a run that changed nothing
+    # keeps them
+    if users_done or dropped:
+        cache.add(_version_key("generation"), 0, timeout=None)
+        cache.incr(_version_key("generation"))
+
+    return users_done, written
@@ -1,3 +1,986 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import catalog, images, now_playing, review_search, taste_match
+from .aggregates import rating_stats, refresh_rating_aggregates
+from .autocomplete import PrefixIndex, _entry
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, tokens_for_user
+from .leaderboards import compute_leaderboard, parse_window
+from .images import cached_image, pick_image
+from .management.commands.benchmark_normalizers import _fake_search, _inline_normalize_search_results
+from .listening_history import recent_unique_plays
+from .middleware import CompressionMiddleware
+from .normalizers import SEARCH_FIELDS, _compile_normalizer, compile_normalizer, normalize_search_results
+from .models import (
+    CatalogItem,
+    ItemSimilarity,
+    PlayEvent,
+    Rating,
+    RatingAggregate,
+    Review,
+    SpotifyAccount,
+    UserSimilarity,
+)
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from .rate_limit import CircuitBreaker
+from .recommendations import refresh_item_similarities
+from .serializers import RatingSerializer
+from .spotify_client import (
+    SpotifyAPIError,
+    SpotifyAuthError,
+    SpotifyCircuitOpenError,
+    SpotifyRateLimitError,
+    SpotifyUnavailableError,
+    _retry_after,
+    _retry_delay,
+    spotify_get,
+)
+from .taste_match import refresh_user_similarities
+
+User = get_user_model()
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="spotify_a")
+        self.account = SpotifyAccount.objects.create(
+            user=self.user,
+            spotify_id="a",
+            display_name="A",
+            access_token="token",
+            refresh_token="refresh",
+            token_expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.other = User.objects.create(username="spotify_b")
+
+        access = tokens_for_user(self.user, self.account).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_claims_user_id_matches_model_pk(self):
+        access = tokens_for_user(self.user, self.account).access_token
+        validated = ClaimsJWTAuthentication().get_validated_token(str(access).encode())
+        claims_user = ClaimsUser(validated)
+
+        self.assertEqual(claims_user.id, self.user.pk)
+        self.assertEqual(claims_user, self.user)
+        self.assertNotEqual(claims_user, self.other)
+
+    def test_taste_match_mixes_token_and_model_ids(self):
+        for user in (self.user, self.other):
+            Rating.objects.create(user=user, spotify_id="t1", item_type="track", rating=4)
+
+        response = self.client.get(reverse("taste-match"), {"user_id": self.other.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user_id"], self.other.pk)
+        self.assertEqual(response.data["overlap"], 1)
+
+    def test_tokens_without_profile_claims_still_authenticate(self):
+        access = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        response = self.client.get(reverse("taste-match"), {"user_id": self.other.pk})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        response = self.client.get(reverse("taste-match"), {"user_id": self.other.pk})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_cache_holds_no_spotify_tokens(self):
+        response = self.client.get(reverse("taste-match"), {"user_id": self.other.pk})
+        self.assertEqual(response.status_code, 200)
+
+        fields = cache.get(f"auth:user:{self.user.pk}")
+        self.assertTrue(fields["is_active"])
+        self.assertEqual(fields["spotify_id"], "a")
+        self.assertNotIn("token", repr(fields))
+        self.assertNotIn("refresh", repr(fields))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        patcher = mock.patch("core.rate_limit.time.time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _tripped(self):
+        breaker = CircuitBreaker("test", threshold=2, cooldown=30)
+        breaker.record_failure()
+        breaker.record_failure()
+        return breaker
+
+    def test_opens_after_threshold(self):
+        breaker = self._tripped()
+
+        self.assertEqual(breaker.open_for(), 30)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = self._tripped()
+        self.now += 31
+
+        self.assertEqual(breaker.open_for(), 0)
+        self.assertGreater(CircuitBreaker("test", 2, 30).open_for(), 0)
+
+    def test_probe_success_closes(self):
+        breaker = self._tripped()
+        self.now += 31
+        breaker.open_for()
+        breaker.record_success()
+
+        self.assertEqual(CircuitBreaker("test", 2, 30).open_for(), 0)
+
+    def test_probe_failure_reopens(self):
+        breaker = self._tripped()
+        self.now += 31
+        breaker.open_for()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.open_for(), 30)
+
+
+@override_settings(
+    SPOTIFY_MAX_RETRIES=2, SPOTIFY_MAX_RETRY_AFTER=2, SPOTIFY_BACKOFF_BASE=0.25, SPOTIFY_BACKOFF_MAX=2
+)
+class RetryDelayTests(SimpleTestCase):
+    def test_rate_limit_honors_short_retry_after(self):
+        self.assertEqual(_retry_delay(SpotifyRateLimitError("429", retry_after=1), 0), 1)
+        self.assertIsNone(_retry_delay(SpotifyRateLimitError("429", retry_after=30), 0))
+        self.assertIsNone(_retry_delay(SpotifyRateLimitError("429"), 0))
+
+    def test_unavailable_backs_off_with_jitter(self):
+        with mock.patch("core.spotify_client.random.uniform", side_effect=lambda low, high: high):
+            delays = [_retry_delay(SpotifyUnavailableError("503"), attempt) for attempt in range(2)]
+
+        self.assertEqual(delays, [0.25, 0.5])
+
+    def test_gives_up(self):
+        self.assertIsNone(_retry_delay(SpotifyUnavailableError("503"), 2))
+        self.assertIsNone(_retry_delay(SpotifyCircuitOpenError("open", retry_after=5), 0))
+        self.assertIsNone(_retry_delay(SpotifyAuthError("401"), 0))
+        self.assertIsNone(_retry_delay(SpotifyAPIError("400", status_code=400), 0))
+
+    def test_retry_after_header(self):
+        for header, expected in (("3", 3), ("-1", 0), ("soon", None), (None, None)):
+            resp = mock.Mock(headers={} if header is None else {"Retry-After": header})
+            self.assertEqual(_retry_after(resp), expected)
+
+    @mock.patch("core.spotify_client.time.sleep")
+    def test_spotify_get_retries_then_succeeds(self, sleep):
+        failures = [SpotifyRateLimitError("429", retry_after=1), SpotifyUnavailableError("503")]
+
+        def get_once(path, access_token, params=None):
+            if failures:
+                raise failures.pop(0)
+            return {"ok": True}
+
+        with mock.patch("core.spotify_client._spotify_get_once", side_effect=get_once) as once:
+            self.assertEqual(spotify_get("/me", "token"), {"ok": True})
+
+        self.assertEqual(once.call_count, 3)
+        self.assertEqual(sleep.call_args_list[0], mock.call(1))
+
+    @mock.patch("core.spotify_client.time.sleep")
+    def test_spotify_get_raises_after_max_retries(self, sleep):
+        with mock.patch(
+            "core.spotify_client._spotify_get_once", side_effect=SpotifyUnavailableError("503")
+        ) as once:
+            with self.assertRaises(SpotifyUnavailableError):
+                spotify_get("/me", "token")
+
+        self.assertEqual(once.call_count, 3)
+
+
+class NowPlayingSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _snapshot(self, is_playing=True, progress_ms=10_000, fetched_at=1000.0):
+        return {
+            "payload": dict(
+                now_playing.INACTIVE_PAYLOAD,
+                status="playing" if is_playing else "paused",
+                is_playing=is_playing,
+                track_name="Song",
+                progress_ms=progress_ms,
+                duration_ms=200_000,
+            ),
+            "track_id": "t1",
+            "album_images": [],
+            "fetched_at": fetched_at,
+        }
+
+    def test_etag_follows_progress_while_playing(self):
+        snapshot = self._snapshot()
+
+        self.assertEqual(
+            now_playing.snapshot_etag(snapshot, now=1000.0),
+            now_playing.snapshot_etag(snapshot, now=1001.0),
+        )
+        self.assertNotEqual(
+            now_playing.snapshot_etag(snapshot, now=1000.0),
+            now_playing.snapshot_etag(snapshot, now=1030.0),
+        )
+        # A seek
+        self.assertNotEqual(
+            now_playing.snapshot_etag(snapshot, now=1000.0),
+            now_playing.snapshot_etag(self._snapshot(progress_ms=90_000), now=1000.0),
+        )
+
+    def test_etag_ignores_time_while_paused(self):
+        snapshot = self._snapshot(is_playing=False)
+
+        self.assertEqual(
+            now_playing.snapshot_etag(snapshot, now=1000.0),
+            now_playing.snapshot_etag(snapshot, now=1300.0),
+        )
+
+    def test_etag_depends_on_variant(self):
+        snapshot = self._snapshot(is_playing=False)
+
+        self.assertNotEqual(
+            now_playing.snapshot_etag(snapshot, variant="64|"),
+            now_playing.snapshot_etag(snapshot, variant="640|"),
+        )
+
+    async def test_waiter_fetches_when_lease_holder_fails(self):
+        account = mock.Mock(pk=1)
+        fresh = self._snapshot(fetched_at=2000.0)
+        await cache.aset(now_playing._lease_key(1), 1)
+
+        async def fetch(_account):
+            return fresh
+
+        async def holder_fails():
+            # The holder gives up without storing a snapshot
+            await cache.adelete(now_playing._lease_key(1))
+
+        with mock.patch.object(now_playing, "_afetch_snapshot", fetch):
+            await holder_fails()
+            snapshot = await now_playing._afetch_coalesced(account, self._snapshot())
+
+        self.assertIs(snapshot, fresh)
+
+    async def test_waiter_skips_the_stale_snapshot(self):
+        account = mock.Mock(pk=2)
+        stale = self._snapshot(fetched_at=1000.0)
+        fresh = self._snapshot(fetched_at=2000.0)
+        await cache.aset(now_playing._snapshot_key(2), stale)
+        await cache.aset(now_playing._lease_key(2), 1)
+
+        async def holder():
+            await asyncio.sleep(0.1)
+            await cache.aset(now_playing._snapshot_key(2), fresh)
+            await cache.adelete(now_playing._lease_key(2))
+
+        fetch = mock.AsyncMock()
+        with mock.patch.object(now_playing, "_afetch_snapshot", fetch):
+            task = asyncio.ensure_future(holder())
+            snapshot = await now_playing._afetch_coalesced(account, stale)
+            await task
+
+        self.assertEqual(snapshot["fetched_at"], 2000.0)
+        fetch.assert_not_called()
+
+
+class RecentUniquePlaysTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="listener")
+        self.now = timezone.now()
+
+    def _play(self, minutes_ago, spotify_id, track_name="Song"):
+        return PlayEvent.objects.create(
+            user=self.user,
+            spotify_id=spotify_id,
+            track_name=track_name,
+            played_at=self.now - timedelta(minutes=minutes_ago),
+        )
+
+    def test_latest_play_per_track_newest_first(self):
+        self._play(1, "a")
+        self._play(2, "b")
+        self._play(3, "a")
+        self._play(4, "", track_name="Local file")
+
+        plays = list(recent_unique_plays(self.user.id, limit=5))
+
+        self.assertEqual(
+            [(play.spotify_id, play.track_name) for play in plays],
+            [("a", "Song"), ("b", "Song"), ("", "Local file")],
+        )
+        self.assertEqual(plays[0].played_at, self.now - timedelta(minutes=1))
+
+    @override_settings(PLAY_HISTORY_UNIQUE_SCAN=2)
+    def test_only_scans_the_latest_plays(self):
+        for minutes_ago in range(4):
+            self._play(minutes_ago, "loop")
+        self._play(10, "older")
+
+        plays = list(recent_unique_plays(self.user.id, limit=2))
+
+        self.assertEqual([play.spotify_id for play in plays], ["loop"])
+
+
+class HydrateCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username="hydrator")
+        self.account = SpotifyAccount.objects.create(
+            user=user,
+            spotify_id="h",
+            access_token="token",
+            refresh_token="refresh",
+            token_expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def _track(self, spotify_id):
+        return {
+            "id": spotify_id,
+            "name": "Song",
+            "artists": [{"name": "Artist"}],
+            "album": {
+                "name": "Album",
+                "images": [
+                    {"url": "big", "width": 640, "height": 640},
+                    {"url": "medium", "width": 300, "height": 300},
+                    {"url": "small", "width": 64, "height": 64},
+                ],
+            },
+            "duration_ms": 1000,
+        }
+
+    def test_malformed_ids_never_reach_spotify(self):
+        valid = "4uLU6hMCjMI75M1A2tKUQC"
+        get = mock.Mock(return_value={"tracks": [self._track(valid)]})
+
+        with mock.patch.object(catalog, "spotify_user_get", get):
+            written = catalog.hydrate_catalog(
+                [(valid, "track"), ("not-an-id", "track")], self.account
+            )
+            catalog.hydrate_catalog([("not-an-id", "track")], self.account)
+
+        self.assertEqual(written, 1)
+        get.assert_called_once()
+        self.assertEqual(get.call_args.kwargs["params"], {"ids": valid})
+
+    def test_rejected_batch_is_not_retried(self):
+        ids = [("4uLU6hMCjMI75M1A2tKUQC", "track"), ("0VjIjW4GlUZAMYd2vXMi3b", "track")]
+        get = mock.Mock(side_effect=SpotifyAPIError("bad request", status_code=400))
+
+        with mock.patch.object(catalog, "spotify_user_get", get):
+            catalog.hydrate_catalog(ids, self.account)
+            catalog.hydrate_catalog(ids, self.account)
+
+        get.assert_called_once()
+
+    def test_stores_right_sized_art(self):
+        item = catalog.catalog_item_from_spotify(
+            "track", self._track("4uLU6hMCjMI75M1A2tKUQC"), timezone.now()
+        )
+
+        self.assertEqual(item.image_url, "medium")
+
+
+class BulkUpsertTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="bulk")
+        access = tokens_for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        patcher = mock.patch("core.views.schedule_catalog_hydration")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_creates_updates_and_reports_per_item(self):
+        Rating.objects.create(
+            user=self.user, spotify_id="a", item_type="track", item_name="Old", rating=1
+        )
+
+        response = self.client.post(
+            reverse("ratings-bulk"),
+            [
+                {"spotify_id": "a", "item_type": "track", "rating": 4},
+                {"spotify_id": "b", "item_type": "album", "item_name": "B", "rating": 3},
+                {"spotify_id": "c", "item_type": "nope", "rating": 3},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data["created"], response.data["updated"], response.data["failed"]),
+            (1, 1, 1),
+        )
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "created", "invalid"],
+        )
+        updated = Rating.objects.get(user=self.user, spotify_id="a")
+        # No item_name in the payload: the stored one is kept
+        self.assertEqual((updated.rating, updated.item_name), (4, "Old"))
+        self.assertEqual(Rating.objects.get(spotify_id="b").item_name, "B")
+
+    def test_last_occurrence_wins_and_keeps_earlier_name(self):
+        response = self.client.post(
+            reverse("ratings-bulk"),
+            {"items": [
+                {"spotify_id": "a", "item_type": "track", "item_name": "A", "rating": 2},
+                {"spotify_id": "a", "item_type": "track", "rating": 5},
+            ]},
+            format="json",
+        )
+
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["superseded", "created"],
+        )
+        rating = Rating.objects.get(user=self.user, spotify_id="a")
+        self.assertEqual((rating.rating, rating.item_name), (5, "A"))
+
+    def test_reviews_upsert_their_text(self):
+        Review.objects.create(user=self.user, spotify_id="a", item_type="track", text="old")
+
+        response = self.client.post(
+            reverse("reviews-bulk"),
+            [{"spotify_id": "a", "item_type": "track", "text": "new"}],
+            format="json",
+        )
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(Review.objects.get(user=self.user, spotify_id="a").text, "new")
+
+    def test_rejects_non_list_bodies(self):
+        response = self.client.post(reverse("ratings-bulk"), {"spotify_id": "a"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="pager")
+        Rating.objects.bulk_create(
+            Rating(user=self.user, spotify_id=f"id{index}", item_type="track", rating=3)
+            for index in range(7)
+        )
+        # Ties on updated_at must still page by id
+        same = timezone.now()
+        Rating.objects.filter(spotify_id__in=["id1", "id2", "id3", "id4"]).update(updated_at=same)
+
+    def test_cursor_round_trip(self):
+        rating = Rating.objects.first()
+
+        self.assertEqual(decode_cursor(encode_cursor(rating)), (rating.updated_at, rating.pk))
+
+    def test_rejects_cursors_it_did_not_issue(self):
+        for cursor in ("garbage", "W10", encode_cursor(Rating.objects.first())[:-3]):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                keyset_page(Rating.objects.all(), cursor=cursor)
+
+    def test_pages_cover_every_row_once(self):
+        expected = list(
+            Rating.objects.order_by("-updated_at", "-id").values_list("pk", flat=True)
+        )
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = keyset_page(Rating.objects.all(), cursor=cursor, limit=3)
+            seen += [row.pk for row in rows]
+            pages += 1
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_exact_last_page_has_no_cursor(self):
+        rows, cursor = keyset_page(Rating.objects.all(), limit=7)
+
+        self.assertEqual((len(rows), cursor), (7, None))
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="rater")
+        self.request = mock.Mock(user=ClaimsUser({"user_id": str(self.user.pk)}))
+
+    def _rate(self, value, spotify_id="a"):
+        serializer = RatingSerializer(
+            data={"spotify_id": spotify_id, "item_type": "track", "rating": value},
+            context={"request": self.request},
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def _aggregate(self, spotify_id="a"):
+        return RatingAggregate.objects.get(spotify_id=spotify_id, item_type="track")
+
+    def test_create_and_update_apply_deltas(self):
+        other = User.objects.create(username="other")
+        Rating.objects.create(user=other, spotify_id="a", item_type="track", rating=5)
+        refresh_rating_aggregates([("a", "track")])
+
+        self._rate("2.50")
+        self._rate("4.00")
+
+        aggregate = self._aggregate()
+        self.assertEqual((aggregate.count, aggregate.sum), (2, Decimal("9.00")))
+        self.assertEqual(aggregate.histogram, [0, 0, 0, 0, 1, 1])
+        self.assertEqual(
+            rating_stats(aggregate), {
+                "count": 2, "average": 4.5, "stddev": 0.5, "histogram": [0, 0, 0, 0, 1, 1],
+            },
+        )
+
+    def test_delta_updates_bump_updated_at(self):
+        self._rate("3.00")
+        before = self._aggregate().updated_at
+
+        self._rate("1.00")
+
+        self.assertGreater(self._aggregate().updated_at, before)
+
+    def test_concurrent_first_rating_is_counted_once(self):
+        # The other request's insert lands between our read and our write
+        Rating.objects.create(user=self.user, spotify_id="a", item_type="track", rating=2)
+        refresh_rating_aggregates([("a", "track")])
+
+        with mock.patch.object(Rating.objects, "select_for_update", Rating.objects.none):
+            self._rate("4.00")
+
+        aggregate = self._aggregate()
+        self.assertEqual((aggregate.count, aggregate.sum), (1, Decimal("4.00")))
+
+
+@override_settings(LEADERBOARD_PRIOR_WEIGHT=5, LEADERBOARD_SIZE=100)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f"fan{index}") for index in range(10)]
+
+    def _rate(self, spotify_id, values, item_name=""):
+        Rating.objects.bulk_create(
+            Rating(user=user, spotify_id=spotify_id, item_type="album",
+                   item_name=item_name, rating=value)
+            for user, value in zip(self.users, values)
+        )
+        refresh_rating_aggregates([(spotify_id, "album")])
+
+    def test_bayesian_score_ranks_volume_over_a_single_perfect_rating(self):
+        self._rate("lucky", [5])
+        self._rate("loved", [4.5] * 10)
+        self._rate("meh", [2] * 4)
+
+        entries = compute_leaderboard("album", "all")
+
+        self.assertEqual([entry.spotify_id for entry in entries], ["loved", "lucky", "meh"])
+        # Prior mean over all 15 ratings = 58 / 15; C = 5
+        prior = 58 / 15
+        self.assertAlmostEqual(entries[0].score, (5 * prior + 45) / 15)
+        self.assertAlmostEqual(entries[1].score, (5 * prior + 5) / 6)
+        self.assertEqual((entries[0].rank, entries[0].count, entries[0].average), (1, 10, 4.5))
+
+    def test_windows_only_count_recent_ratings(self):
+        self._rate("old", [5] * 3)
+        self._rate("new", [3])
+        Rating.objects.filter(spotify_id="old").update(
+            updated_at=timezone.now() - timedelta(days=40)
+        )
+
+        entries = compute_leaderboard("album", "30d")
+
+        self.assertEqual([entry.spotify_id for entry in entries], ["new"])
+
+    def test_names_prefer_the_catalog(self):
+        self._rate("cataloged", [4, 4], item_name="typed")
+        self._rate("typed-only", [4, 4], item_name="Typed Name")
+        CatalogItem.objects.create(
+            spotify_id="cataloged", item_type="album", name="Catalog Name",
+            fetched_at=timezone.now(),
+        )
+
+        names = {entry.spotify_id: entry.item_name for entry in compute_leaderboard("album", "all")}
+
+        self.assertEqual(names, {"cataloged": "Catalog Name", "typed-only": "Typed Name"})
+
+    def test_rejects_bad_windows(self):
+        for window in ("0d", "week", ""):
+            with self.subTest(window=window), self.assertRaises(ValueError):
+                parse_window(window)
+
+
+class ReviewSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="critic")
+        self.other = User.objects.create(username="other-critic")
+
+    def _review(self, user, spotify_id, text, item_name=""):
+        return Review.objects.create(
+            user=user, spotify_id=spotify_id, item_type="album", item_name=item_name, text=text
+        )
+
+    def _ids(self, query, **kwargs):
+        return [review.spotify_id for review, _, _ in review_search.search_reviews(query, **kwargs)]
+
+    def test_triggers_keep_the_index_in_sync(self):
+        review = self._review(self.user, "a", "a haunting bridge")
+        self.assertEqual(self._ids("haunting"), ["a"])
+
+        review.text = "an upbeat chorus"
+        review.save()
+        self.assertEqual(self._ids("haunting"), [])
+        self.assertEqual(self._ids("upbeat"), ["a"])
+
+        review.delete()
+        self.assertEqual(self._ids("upbeat"), [])
+
+    def test_name_hits_rank_first_and_last_word_is_a_prefix(self):
+        self._review(self.user, "body", "I keep coming back to midnights")
+        self._review(self.other, "name", "great record", item_name="Midnights")
+
+        self.assertEqual(self._ids("midnig"), ["name", "body"])
+
+    def test_scopes_and_snippets(self):
+        self._review(self.user, "a", "the bridge is perfect")
+        self._review(self.other, "b", "the bridge drags")
+
+        self.assertEqual(self._ids("bridge", user_id=self.user.id), ["a"])
+        self.assertEqual(self._ids("bridge", item=("b", "album")), ["b"])
+        _, _, snippet = review_search.search_reviews("perfect")[0]
+        self.assertIn("[perfect]", snippet)
+
+    def test_operators_in_the_query_are_plain_words(self):
+        self._review(self.user, "a", "near perfect")
+
+        self.assertEqual(self._ids('perfect" OR "*'), [])
+        self.assertEqual(self._ids("NEAR perfect"), ["a"])
+
+    def test_other_backends_fall_back_to_icontains(self):
+        self._review(self.user, "a", "the Bridge is perfect")
+        self._review(self.user, "b", "no match here")
+
+        with mock.patch.object(review_search, "connection", mock.Mock(vendor="mysql")):
+            hits = review_search.search_reviews("bridge perf")
+
+        self.assertEqual([review.spotify_id for review, _, _ in hits], ["a"])
+        self.assertEqual(hits[0][2], "the [Bridge] is perfect")
+
+
+@override_settings(RECS_MIN_OVERLAP=2, RECS_BLOCK_SIZE=1000)
+class ItemSimilarityTests(TestCase):
+    def setUp(self):
+        users = [User.objects.create(username=f"listener{index}") for index in range(3)]
+        Rating.objects.bulk_create(
+            Rating(user=user, spotify_id=spotify_id, item_type="track", rating=rating)
+            for user, ratings in zip(users, [(5, 4, 1), (4, 5, 2), (1, 2, 5)])
+            for spotify_id, rating in zip(("a", "b", "c"), ratings)
+        )
+
+    def test_similar_items_rank_co_rated_neighbors(self):
+        refresh_item_similarities(full=True)
+
+        neighbors = ItemSimilarity.objects.filter(spotify_id="a").order_by("-similarity")
+        self.assertEqual([row.neighbor_id for row in neighbors][:1], ["b"])
+
+    def test_writes_in_blocks_of_the_requested_size(self):
+        with mock.patch.object(
+            ItemSimilarity.objects, "bulk_create", wraps=ItemSimilarity.objects.bulk_create
+        ) as bulk_create:
+            items, written = refresh_item_similarities(full=True, block_size=1)
+
+        self.assertEqual(items, 3)
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(ItemSimilarity.objects.count(), written)
+
+
+@override_settings(TASTE_MIN_OVERLAP=2, TASTE_INVALIDATE_CHANGES=1)
+class UserSimilarityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f"taster{index}") for index in range(3)]
+        Rating.objects.bulk_create(
+            Rating(user=user, spotify_id=spotify_id, item_type="album", rating=rating)
+            for user, ratings in zip(self.users, [(5, 4, 1), (5, 4, 2), (1, 2, 5)])
+            for spotify_id, rating in zip(("a", "b", "c"), ratings)
+        )
+
+    def _generation(self):
+        return taste_match._versions("generation")[0]
+
+    def test_closest_taste_ranks_first(self):
+        refresh_user_similarities(full=True)
+
+        neighbors = UserSimilarity.objects.filter(user=self.users[0]).order_by("-score")
+        self.assertEqual(neighbors[0].other_id, self.users[1].pk)
+
+    def test_idle_incremental_run_keeps_cached_neighbors(self):
+        refresh_user_similarities(full=True)
+        generation = self._generation()
+
+        self.assertEqual(refresh_user_similarities(), (0, 0))
+        self.assertEqual(self._generation(), generation)
+
+    def test_incremental_run_with_changes_bumps_generation(self):
+        refresh_user_similarities(full=True)
+        generation = self._generation()
+        Rating.objects.filter(user=self.users[2], spotify_id="a").update(
+            rating=4, updated_at=timezone.now() + timedelta(seconds=1)
+        )
+
+        users, _ = refresh_user_similarities()
+
+        self.assertEqual(users, 1)
+        self.assertEqual(self._generation(), generation + 1)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"items": [' + b",".join(b'{"name": "track"}' for _ in range(200)) + b"]}"
+
+    def compress(self, response, accept="gzip, deflate, br"):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_prefers_brotli(self):
+        response = self.compress(HttpResponse(self.body, headers={"ETag": '"abc"'}))
+
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_gzip_without_brotli_or_for_cookie_responses(self):
+        plain = self.compress(HttpResponse(self.body), accept="gzip")
+        cookie = self.compress(HttpResponse(self.body, headers={"Vary": "Cookie"}))
+
+        for response in (plain, cookie):
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_responses_pass_through(self):
+        response = self.compress(HttpResponse(self.body[:512]))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+class PickImageTests(SimpleTestCase):
+    images = [
+        {"url": "640", "width": 640, "height": 640},
+        {"url": "300", "width": 300, "height": 300},
+        {"url": "64", "width": 64, "height": 64},
+    ]
+
+    def test_smallest_image_at_least_size(self):
+        self.assertEqual(pick_image(self.images, 200), "300")
+        self.assertEqual(pick_image(self.images, 300), "300")
+        self.assertEqual(pick_image(self.images, 301), "640")
+
+    def test_largest_without_size_or_fit(self):
+        self.assertEqual(pick_image(self.images), "640")
+        self.assertEqual(pick_image(self.images, 2000), "640")
+
+    def test_skips_images_without_url(self):
+        images = [{"url": "", "width": 1000, "height": 1000}, None, {"url": "x"}]
+
+        self.assertEqual(pick_image(images, 300), "x")
+        self.assertIsNone(pick_image([]))
+        self.assertIsNone(pick_image(None))
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 92
+
+
+class CachedImageTests(SimpleTestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            IMAGE_CACHE_DIR=cache_dir.name, IMAGE_CACHE_MAX_BYTES=250, IMAGE_CACHE_RESCAN_SECONDS=300
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        images._cache_bytes = None
+
+        self.session = mock.Mock()
+        self.session.get.side_effect = self.fake_get
+        patcher = mock.patch("core.images.get_http_session", return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_get(self, url, **kwargs):
+        time.sleep(0.05)
+        response = mock.MagicMock(status_code=200)
+        response.iter_content.return_value = [PNG]
+        return response
+
+    def fetch(self, url):
+        image, content_type = cached_image(url)
+        with image:
+            return image.read(), content_type
+
+    def test_miss_downloads_once_then_serves_from_disk(self):
+        url = "https://i.scdn.co/image/a"
+
+        self.assertEqual(self.fetch(url), (PNG, "image/png"))
+        self.assertEqual(self.fetch(url), (PNG, "image/png"))
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_concurrent_misses_download_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.fetch("https://i.scdn.co/image/a")))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [(PNG, "image/png")] * 4)
+        self.assertEqual(self.session.get.call_count, 1)
+
+    def test_file_evicted_after_open_is_still_served(self):
+        url = "https://i.scdn.co/image/a"
+        self.fetch(url)
+        path = images._cache_path(url)
+
+        def evicted(target, *args):
+            os.remove(target)
+            raise FileNotFoundError(target)
+
+        with mock.patch("core.images.os.utime", side_effect=evicted):
+            self.assertEqual(self.fetch(url), (PNG, "image/png"))
+        self.assertFalse(os.path.exists(path))
+
+    def test_evicts_least_recently_used_without_scanning_every_miss(self):
+        urls = [f"https://i.scdn.co/image/{name}" for name in "abc"]
+
+        with mock.patch("core.images._evict", wraps=images._evict) as evict:
+            self.fetch(urls[0])
+            os.utime(images._cache_path(urls[0]), (0, 0))
+            self.fetch(urls[1])
+            self.assertEqual(evict.call_count, 1)
+
+            self.fetch(urls[2])
+
+        self.assertEqual(evict.call_count, 2)
+        self.assertFalse(os.path.exists(images._cache_path(urls[0])))
+        self.assertTrue(os.path.exists(images._cache_path(urls[2])))
+        self.assertEqual(images._cache_bytes, 2 * len(PNG))
+
+
+class NormalizerTests(SimpleTestCase):
+    raw = _fake_search(3)
+    # Sparse objects: missing keys, nulls where Spotify sends them
+    raw["tracks"]["items"].append({"id": "t", "album": None, "artists": None})
+    raw["albums"]["items"].append({"id": "a", "images": None})
+    raw["artists"]["items"].append({"id": "r", "followers": None, "genres": None})
+
+    def test_matches_inline_normalizer(self):
+        for image_size in (None, 64, 300):
+            self.assertEqual(
+                normalize_search_results(self.raw, image_size=image_size),
+                _inline_normalize_search_results(self.raw, image_size=image_size),
+            )
+
+    def test_fields_select_keys(self):
+        fields = frozenset({"id", "image", "album_image"})
+        full = normalize_search_results(self.raw, image_size=300)
+
+        selected = normalize_search_results(self.raw, fields=fields, image_size=300)
+
+        for block, items in full.items():
+            self.assertEqual(
+                selected[block],
+                [{name: value for name, value in item.items() if name in fields} for item in items],
+            )
+
+    def test_field_subsets_are_canonicalized(self):
+        self.assertIs(
+            compile_normalizer("artist", frozenset({"id", "album_image"})),
+            compile_normalizer("artist", frozenset({"id", "duration_ms"})),
+        )
+        self.assertIs(compile_normalizer("artist", SEARCH_FIELDS), compile_normalizer("artist"))
+        self.assertIs(compile_normalizer("artist", ["name", "id"]), compile_normalizer("artist", {"id", "name"}))
+        self.assertLessEqual(_compile_normalizer.cache_info().currsize, 256)
+
+
+class SearchViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="spotify_a")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_for_user(self.user).access_token}")
+
+    def test_blank_query_is_rejected_before_spotify(self):
+        with mock.patch("core.views.asearch_pages") as search:
+            response = self.client.get(reverse("discover-search-music"), {"q": "   "})
+
+        self.assertEqual(response.status_code, 400)
+        search.assert_not_called()
+
+    def test_cache_stats_are_staff_only(self):
+        url = reverse("discover-search-stats")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        cache.clear()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PrefixIndexTests(SimpleTestCase):
+    def ids(self, entries):
+        return [entry["id"] for entry in entries]
+
+    def test_ranks_by_rating_count_then_popularity(self):
+        index = PrefixIndex([
+            _entry("a", "track", "Love Story", popularity=90),
+            _entry("b", "track", "Lover", rating_count=3),
+            _entry("c", "album", "Lover", rating_count=3, popularity=50),
+            _entry("d", "artist", "Taylor Swift"),
+        ])
+
+        self.assertEqual(self.ids(index.lookup("lov", 10)), ["c", "b", "a"])
+        self.assertEqual(self.ids(index.lookup("lo", 2)), ["c", "b"])
+        self.assertEqual(self.ids(index.lookup("swi", 10)), ["d"])
+        self.assertEqual(index.lookup("xyz", 10), [])
+
+    def test_repeated_words_match_once(self):
+        index = PrefixIndex([_entry("a", "album", "La La Land")])
+
+        self.assertEqual(self.ids(index.lookup("la l", 10)), ["a"])
+        self.assertEqual(self.ids(index.lookup("la", 10)), ["a"])
+
+    def test_type_filter_on_short_prefix_past_overall_top(self):
+        tracks = [_entry(f"t{i}", "track", f"Take {i}", rating_count=10) for i in range(60)]
+        index = PrefixIndex(tracks + [_entry("a", "album", "Taken")])
+
+        self.assertNotIn("a", self.ids(index.lookup("ta", 100)))
+        self.assertEqual(self.ids(index.lookup("ta", 5, {"album"})), ["a"])
+        self.assertEqual(len(index.lookup("ta", 5, {"album", "track"})), 5)
+        self.assertEqual(index.lookup("ta", 5, {"artist"}), [])
+
+    def test_type_filter_on_large_long_prefix_range(self):
+        tracks = [_entry(f"t{i}", "track", f"Taylor {i}", rating_count=10) for i in range(300)]
+        index = PrefixIndex(tracks + [_entry("a", "artist", "Taylor Swift")])
+
+        self.assertEqual(self.ids(index.lookup("tay", 1, {"artist"})), ["a"])
+        self.assertEqual(self.ids(index.lookup("tay", 2, {"track"})), ["t0", "t1"])
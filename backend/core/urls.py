@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import SpotifyLoginView, SpotifyCallbackView, AuthUserView, NowPlayingView, RecentlyPlayedView, SearchMusicView, RatingListCreateView, RatingItemView, ReviewListCreateView, ReviewItemView
+from .views import SpotifyLoginView, SpotifyCallbackView, AuthUserView, NowPlayingView, NowPlayingStreamView, RecentlyPlayedView, SearchMusicView, SearchCacheStatsView, AutocompleteView, ImageProxyView, ItemStateView, ItemStatsView, LeaderboardView, RecommendationsView, TasteMatchView, SimilarUsersView, RatingListCreateView, RatingBulkUpsertView, RatingItemView, ReviewListCreateView, ReviewBulkUpsertView, ReviewSearchView, ReviewItemView
 
 urlpatterns = [
     path("auth/spotify/login/", SpotifyLoginView.as_view(), name="spotify-login"),
@@ -7,15 +7,29 @@ urlpatterns = [
     path("auth/user/", AuthUserView.as_view(), name="auth-user"),
 
     path("user/now-playing/", NowPlayingView.as_view(), name="now-playing"),
+    path("user/now-playing/stream/", NowPlayingStreamView.as_view(), name="now-playing-stream"),
     path("user/recently-played/", RecentlyPlayedView.as_view(), name="user-recently-played"),
 
     path("discover/search/music/",SearchMusicView.as_view(),
     name="discover-search-music"),
+    path("discover/search/stats/", SearchCacheStatsView.as_view(), name="discover-search-stats"),
+    path("discover/autocomplete/", AutocompleteView.as_view(), name="discover-autocomplete"),
+    path("images/proxy/", ImageProxyView.as_view(), name="image-proxy"),
+
+    path("items/state/", ItemStateView.as_view(), name="items-state"),
+    path("items/stats/", ItemStatsView.as_view(), name="items-stats"),
+    path("leaderboards/", LeaderboardView.as_view(), name="leaderboards"),
+    path("recommendations/", RecommendationsView.as_view(), name="recommendations"),
+    path("taste/match/", TasteMatchView.as_view(), name="taste-match"),
+    path("taste/similar-users/", SimilarUsersView.as_view(), name="taste-similar-users"),
 
     path("ratings/", RatingListCreateView.as_view(), name="ratings-list-create"),
+    path("ratings/bulk/", RatingBulkUpsertView.as_view(), name="ratings-bulk"),
     path("ratings/item/", RatingItemView.as_view(), name="ratings-item"),
     
     path("reviews/", ReviewListCreateView.as_view(), name="reviews-list-create"),
+    path("reviews/bulk/", ReviewBulkUpsertView.as_view(), name="reviews-bulk"),
+    path("reviews/search/", ReviewSearchView.as_view(), name="reviews-search"),
     path("reviews/item/", ReviewItemView.as_view(), name="reviews-item"),
 ]
 
@@ -1,27 +1,105 @@
 from django.shortcuts import render
 from urllib.parse import urlencode
-import base64
 from datetime import timedelta
+import time
 
-import requests
 from django.conf import settings
 from django.shortcuts import redirect
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.contrib.auth import get_user_model
 
 from rest_framework.views import APIView
 from rest_framework import permissions
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
-
-from .spotify_client import refresh_spotify_token, spotify_user_get, SpotifyAPIError
-from .models import SpotifyAccount, Rating, Review
-from .serializers import UserSerializer, RatingSerializer, ReviewSerializer
+from adrf.views import APIView as AsyncAPIView
+
+from .spotify_client import (
+    exchange_code_for_tokens,
+    spotify_get,
+    SpotifyAPIError,
+    SpotifyRateLimitError,
+    SpotifyUnavailableError,
+)
+from .now_playing import (
+    NOW_PLAYING_FIELDS,
+    aget_now_playing_snapshot,
+    snapshot_etag,
+    snapshot_payload,
+)
+from .now_playing_stream import now_playing_events
+from .images import ImageProxyError, cached_image, image_size_param, pick_image
+from .normalizers import SEARCH_FIELDS, normalize_search_results, parse_fields, select_fields
+from .aggregates import rating_stats
+from .authentication import forget_cached_user, tokens_for_user
+from .leaderboards import ITEM_TYPES, leaderboard_page, leaderboard_windows
+from .catalog import attach_catalog, schedule_catalog_hydration
+from .item_state import VALID_ITEM_TYPES, item_states, parse_item_pairs
+from .pagination import InvalidCursor, keyset_page
+from .review_search import search_reviews
+from .autocomplete import (
+    alookup,
+    aupstream_suggestions,
+    entries_from_pages,
+    merge_suggestions,
+    note_search_results,
+)
+from .search import (
+    MARKET_RE,
+    TYPE_BLOCKS,
+    asearch_pages,
+    next_offset,
+    normalize_query,
+    schedule_search_prefetch,
+    search_cache_stats,
+)
+from .recommendations import recommend_for_user, similar_items
+from .taste_match import similar_users, taste_match
+from .listening_history import RECENTLY_PLAYED_FIELDS, aupdate_play_history, recent_unique_plays
+from .models import SpotifyAccount, Rating, Review, PlayEvent, RatingAggregate
+from .serializers import UserSerializer, RatingSerializer, ReviewSerializer, bulk_upsert
 
 User = get_user_model()
 
 
+def spotify_error_response(exc: SpotifyAPIError, detail: str):
+    """
+    Structured error for a failed Spotify call:
+    - 429 when rate limited, 503 when Spotify is down / circuit open,
+      502 otherwise
+    - `retry_after` (+ Retry-After header) when we know how long to wait
+    The upstream body is kept out of the response.
+    """
+    if isinstance(exc, SpotifyRateLimitError):
+        status = 429
+    elif isinstance(exc, SpotifyUnavailableError):
+        status = 503
+    else:
+        status = 502
+
+    body = {
+        "detail": detail,
+        "code": exc.code,
+        "upstream_status": exc.status_code,
+    }
+    headers = {}
+    if exc.retry_after is not None:
+        body["retry_after"] = exc.retry_after
+        headers["Retry-After"] = str(exc.retry_after)
+
+    return Response(body, status=status, headers=headers)
+
+
+async def _aget_spotify_account(user):
+    """
+    Async lookup of the user's SpotifyAccount (None if not linked).
+    Lazy relation access (user.spotify_account) isn't allowed in async code.
+    """
+    return await SpotifyAccount.objects.filter(user_id=user.id).afirst()
+
+
 class SpotifyLoginView(APIView):
     """
     GET /auth/spotify/login/
@@ -88,57 +166,22 @@ class SpotifyCallbackView(APIView):
             )
 
         # Exchange code for tokens
-        token_url = "https://accounts.spotify.com/api/token"
-
-        basic_auth = base64.b64encode(
-            f"{client_id}:{client_secret}".encode("utf-8")
-        ).decode("utf-8")
-
-        headers = {
-            "Authorization": f"Basic {basic_auth}",
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
-
-        data = {
-            "grant_type": "authorization_code",
-            "code": code,
-            "redirect_uri": redirect_uri,
-        }
-
-        token_resp = requests.post(token_url, headers=headers, data=data)
-
-        if token_resp.status_code != 200:
-            return Response(
-                {
-                    "detail": "Failed to exchange code for tokens.",
-                    "status_code": token_resp.status_code,
-                    "response": token_resp.text,
-                },
-                status=500,
-            )
+        try:
+            token_data = exchange_code_for_tokens(code)
+        except SpotifyAPIError as exc:
+            return spotify_error_response(exc, "Failed to exchange code for tokens.")
 
-        token_data = token_resp.json()
         access_token = token_data.get("access_token")
         refresh_token = token_data.get("refresh_token")
         expires_in = token_data.get("expires_in", 3600)
 
         # Use access token to get user's Spotify profile
-        me_resp = requests.get(
-            "https://api.spotify.com/v1/me",
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
-
-        if me_resp.status_code != 200:
-            return Response(
-                {
-                    "detail": "Failed to fetch Spotify profile.",
-                    "status_code": me_resp.status_code,
-                    "response": me_resp.text,
-                },
-                status=500,
-            )
+        try:
+            profile = spotify_get("/me", access_token)
+        except SpotifyAPIError as exc:
+            return spotify_error_response(exc, "Failed to fetch Spotify profile.")
 
-        profile = me_resp.json()
+        profile = profile or {}
         spotify_id = profile.get("id")
         display_name = profile.get("display_name") or spotify_id
         email = profile.get("email", "")
@@ -177,12 +220,14 @@ class SpotifyCallbackView(APIView):
         account.access_token = access_token
         account.refresh_token = refresh_token
         account.token_expires_at = timezone.now() + timedelta(seconds=expires_in)
+        account.token_refresh_failed_at = None
         account.display_name = display_name or account.display_name
         account.email = email or account.email
         account.save()
 
-        # Issue JWT tokens for this user
-        refresh = RefreshToken.for_user(user)
+        # Issue JWT tokens for this user, with profile claims
+        forget_cached_user(user.pk)
+        refresh = tokens_for_user(user, account)
         access = refresh.access_token
 
         params = urlencode(
@@ -209,7 +254,7 @@ class AuthUserView(APIView):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
 
-class NowPlayingView(APIView):
+class NowPlayingView(AsyncAPIView):
     """
     GET /user/now-playing/
 
@@ -217,284 +262,762 @@ class NowPlayingView(APIView):
       - currently playing track (status = "playing")
       - paused track (status = "paused")
       - inactive if nothing is playing
+
+    Served from a short-lived per-user snapshot (NOW_PLAYING_CACHE_TTL) so
+    polls from several tabs/devices share one upstream call. Responses carry
+    an ETag for the playback state, representation and (while playing)
+    coarse progress; If-None-Match gets a 304.
+
+    ?image_size=<px> picks the smallest album art at least that large
+    (default: the largest); ?fields=a,b limits the payload to those keys.
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        user = request.user
+    async def get(self, request):
+        fields, error = fields_from_query(request, NOW_PLAYING_FIELDS)
+        if error:
+            return error
 
         # Ensure Spotify account exists
-        try:
-            account = user.spotify_account
-        except SpotifyAccount.DoesNotExist:
+        account = await _aget_spotify_account(request.user)
+        if account is None:
             return Response({"detail": "Spotify account not found"}, status=400)
 
-        # Refresh token
-        access_token = refresh_spotify_token(account)
+        # Shared per-user snapshot (handles refresh + retry + coalescing)
+        try:
+            snapshot = await aget_now_playing_snapshot(account)
+        except SpotifyAPIError as exc:
+            return spotify_error_response(exc, "Failed to fetch currently playing")
 
-        # Call Spotify API
-        resp = requests.get(
-            "https://api.spotify.com/v1/me/player/currently-playing",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+        # Conditional GET: unchanged playback state costs no body
+        now = time.time()
+        image_size = image_size_param(request)
+        variant = f"{image_size}|{','.join(sorted(fields or ()))}"
+        etag = snapshot_etag(snapshot, now=now, variant=variant)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
 
-        # No active device or nothing playing
-        if resp.status_code == 204:
-            return Response({
-                "status": "inactive",
-                "is_playing": False,
-                "track_name": None,
-                "artists": [],
-                "album": None,
-                "album_image": None,
-                "progress_ms": None,
-                "duration_ms": None
-            })
-
-        # Error case
-        if resp.status_code != 200:
-            return Response(
-                {
-                    "detail": "Failed to fetch currently playing",
-                    "status_code": resp.status_code,
-                    "response": resp.text,
-                },
-                status=resp.status_code,
-            )
+        if_none_match = request.headers.get("If-None-Match")
+        # Compressed responses carry the weak form of the tag
+        if if_none_match and {etag, f"W/{etag}"} & set(parse_etags(if_none_match)):
+            return Response(status=304, headers=headers)
 
-        data = resp.json()
-        item = data.get("item")
-
-        # Active device but no track item
-        if not item:
-            return Response({
-                "status": "inactive",
-                "is_playing": False,
-                "track_name": None,
-                "artists": [],
-                "album": None,
-                "album_image": None,
-                "progress_ms": None,
-                "duration_ms": None
-            })
-
-        # Determine play state
-        is_playing = data.get("is_playing", False)
-        status = "playing" if is_playing else "paused"
+        payload = snapshot_payload(snapshot, now=now, image_size=image_size)
+        return Response(select_fields(payload, fields), headers=headers)
 
-        return Response(
-            {
-                "status": status,
-                "is_playing": is_playing,
-                "progress_ms": data.get("progress_ms"),
-                "duration_ms": item.get("duration_ms"),
-                "track_name": item.get("name"),
-                "artists": [a["name"] for a in item.get("artists", [])],
-                "album": item.get("album", {}).get("name"),
-                "album_image": item.get("album", {}).get("images", [{}])[0].get("url")
-            }
+
+class NowPlayingStreamView(AsyncAPIView):
+    """
+    GET /user/now-playing/stream/
+
+    Server-sent events with the same payload as /user/now-playing/
+    (event: now-playing), pushed only when the track or play state changes.
+    All of a user's open streams share one upstream poller, whose interval
+    follows the time left on the current track. Serve through config.asgi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request):
+        account = await _aget_spotify_account(request.user)
+        if account is None:
+            return Response({"detail": "Spotify account not found"}, status=400)
+
+        response = StreamingHttpResponse(
+            now_playing_events(account, image_size=image_size_param(request)),
+            content_type="text/event-stream",
         )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 
-class RecentlyPlayedView(APIView):
+class RecentlyPlayedView(AsyncAPIView):
     """
     GET /user/recently-played/
 
     Returns the user's recently played tracks with:
       - NO duplicate tracks (global dedupe, not just consecutive)
       - At most 5 unique tracks
+
+    Reads from stored PlayEvent history, which is topped up incrementally
+    from Spotify (at most once per PLAY_HISTORY_SYNC_INTERVAL).
+    ?image_size=<px> right-sizes album_image; ?fields=a,b limits each item
+    to those keys.
     """
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        user = request.user
+    async def get(self, request):
+        fields, error = fields_from_query(request, RECENTLY_PLAYED_FIELDS)
+        if error:
+            return error
 
         # Ensure Spotify account exists
-        try:
-            account = user.spotify_account
-        except SpotifyAccount.DoesNotExist:
+        account = await _aget_spotify_account(request.user)
+        if account is None:
             return Response({"detail": "Spotify account not found"}, status=400)
 
-        # Refresh access token if needed
-        access_token = refresh_spotify_token(account)
+        # Pull only plays newer than what we already stored
+        try:
+            await aupdate_play_history(account)
+        except SpotifyAPIError as exc:
+            # Serve stored history if Spotify is down; fail only if we have none
+            if not await PlayEvent.objects.filter(user_id=account.user_id).aexists():
+                return spotify_error_response(exc, "Failed to fetch recently played tracks")
 
-        # Fetch from Spotify – get 20 to dedupe
-        resp = requests.get(
-            "https://api.spotify.com/v1/me/player/recently-played",
-            params={"limit": 20},
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
+        image_size = image_size_param(request)
 
-        if resp.status_code != 200:
-            return Response(
+        # Deduplicated in the database (latest play per track)
+        cleaned = [
+            select_fields(
                 {
-                    "detail": "Failed to fetch recently played tracks",
-                    "status_code": resp.status_code,
-                    "response": resp.text,
+                    "played_at": play.played_at,
+                    "track_name": play.track_name,
+                    "artists": play.artists,
+                    "album": play.album or None,
+                    # Plays stored before album_images existed only have one size
+                    "album_image": pick_image(play.album_images, image_size) or play.album_image or None,
+                    "duration_ms": play.duration_ms,
                 },
-                status=resp.status_code,
+                fields,
             )
+            async for play in recent_unique_plays(account.user_id, limit=5)
+        ]
+
+        return Response({"items": cleaned})
+    
+class SearchMusicView(AsyncAPIView):
+    """
+    GET /discover/search/music/?q=<query>&type=track,album,artist[&image_size=<px>][&fields=a,b]
+        [&limit=10&offset=0][&<type>_limit=..&<type>_offset=..]
 
-        data = resp.json()
-        items = data.get("items", [])
+    Uses logged-in user's Spotify account to search for tracks, albums,
+    and artists via Spotify's /search endpoint, and returns JSON
+    structure grouped by type (shaped by core/normalizers.py). `fields`
+    limits each item to those keys, e.g. fields=id,name,artists,image,album_image.
 
-        cleaned = []
-        seen_tracks = set()  # track IDs already returned
+    Each type pages on its own (e.g. album_offset=10 for "load more"
+    albums); types on different pages are fetched concurrently. The page
+    after each served one is prefetched.
 
-        for item in items:
-            track = item.get("track") or {}
-            track_id = track.get("id")
-            track_name = track.get("name")
-            played_at = item.get("played_at")
+    Results don't depend on the user: pages come from a cache shared by
+    everyone (normalized query + type + ?market=, default
+    SEARCH_DEFAULT_MARKET), filled with the app's client-credentials token.
 
-            # Skip broken entries
-            if not track_name:
-                continue
+    Response:
+    {
+      "tracks": [...], "albums": [...], "artists": [...],
+      "paging": {
+        "albums": {"offset": 0, "limit": 10, "total": 812, "next_offset": 10},
+        ...
+      }
+    }
+    """
+    permission_classes = [IsAuthenticated]
 
-            # Use track_id if available, otherwise fall back to name
-            dedupe_key = track_id or track_name
+    async def get(self, request):
+        # Read query parameters
+        query = normalize_query(request.query_params.get("q", ""))
 
-            # Skip if included track 
-            if dedupe_key in seen_tracks:
-                continue
+        if not query:
+            return Response(
+                {"detail": "Missing required query parameter 'q'."},
+                status=400,
+            )
 
-            cleaned.append({
-                "played_at": played_at,
-                "track_name": track_name,
-                "artists": [a["name"] for a in track.get("artists", [])],
-                "album": track.get("album", {}).get("name"),
-                "album_image": track.get("album", {}).get("images", [{}])[0].get("url"),
-                "duration_ms": track.get("duration_ms"),
-            })
+        item_types, error = search_types_from_query(request)
+        if error:
+            return error
 
-            seen_tracks.add(dedupe_key)
+        fields, error = fields_from_query(request, SEARCH_FIELDS)
+        if error:
+            return error
 
-            # Only return at most 5 unique tracks
-            if len(cleaned) == 5:
-                break
+        market, error = market_from_query(request)
+        if error:
+            return error
 
-        return Response({"items": cleaned})
-    
-class SearchMusicView(APIView):
+        params = request.query_params
+        try:
+            limit = int(params.get("limit", settings.SEARCH_DEFAULT_LIMIT))
+            offset = int(params.get("offset", 0))
+            pages = {
+                item_type: (
+                    min(max(int(params.get(f"{item_type}_offset", offset)), 0), settings.SEARCH_MAX_OFFSET),
+                    min(max(int(params.get(f"{item_type}_limit", limit)), 1), settings.SEARCH_MAX_LIMIT),
+                )
+                for item_type in item_types
+            }
+        except ValueError:
+            return Response({"detail": "limit and offset parameters must be integers."}, status=400)
+
+        # Shared cache, else Spotify /search with the app token
+        try:
+            results = await asearch_pages(query, pages, market=market)
+        except SpotifyAPIError as exc:
+            return spotify_error_response(exc, "Spotify search failed")
+
+        paging = {}
+        next_pages = {}
+        for item_type, (page_offset, page_limit) in pages.items():
+            following = next_offset(results[item_type], page_offset, page_limit)
+            paging[TYPE_BLOCKS[item_type]] = {
+                "offset": page_offset,
+                "limit": page_limit,
+                "total": results[item_type]["total"],
+                "next_offset": following,
+            }
+            if following is not None:
+                next_pages[item_type] = (following, page_limit)
+
+        # Warm the cache for "load more", and make these typeahead-able
+        schedule_search_prefetch(query, next_pages, market=market)
+        note_search_results(results)
+
+        # Normalize response
+        normalized = normalize_search_results(
+            {TYPE_BLOCKS[item_type]: page for item_type, page in results.items()},
+            fields=fields,
+            image_size=image_size_param(request),
+        )
+        normalized["paging"] = paging
+        return Response(normalized)
+
+
+class SearchCacheStatsView(APIView):
     """
-    GET /discover/search/music/?q=<query>&type=track,album,artist
+    GET /discover/search/stats/
 
-    Uses logged-in user's Spotify account to search for tracks, albums,
-    and artists via Spotify's /search endpoint, and returns JSON
-    structure grouped by type.
+    Counters of the shared search cache since they were last reset:
+    {
+      "hits": 9120, "misses": 2210, "hit_ratio": 0.805,
+      "requested_calls": 6050,   # /search calls needed without the cache
+      "upstream_calls": 1630,    # ... actually sent for responses
+      "upstream_calls_saved": 4420,
+      "prefetch_calls": 700      # sent ahead of "load more", on top of upstream_calls
+    }
+
+    Staff only.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(search_cache_stats())
+
+
+class AutocompleteView(AsyncAPIView):
+    """
+    GET /discover/autocomplete/?q=<prefix>&type=track,album,artist&limit=8[&market=US]
+
+    Typeahead suggestions from an in-memory prefix index of the local
+    catalog, rated/reviewed items and recent search results, ranked by how
+    many ratings items have here (then Spotify popularity).
+
+    When the index has fewer than AUTOCOMPLETE_UPSTREAM_BELOW suggestions
+    for a prefix of at least AUTOCOMPLETE_UPSTREAM_MIN_CHARS characters,
+    Spotify search (through the shared search cache) fills in. That
+    fallback is debounced per user (AUTOCOMPLETE_DEBOUNCE_MS) and one
+    fetch per query is in flight at a time. Serve through config.asgi.
+
+    Response:
+    {
+      "results": [
+        {"id": "...", "type": "artist", "name": "Taylor Swift", "artists": [],
+         "image": "https://i.scdn.co/...", "rating_count": 12, "popularity": 97},
+        ...
+      ],
+      "source": "index" | "upstream"
+    }
     """
     permission_classes = [IsAuthenticated]
 
+    async def get(self, request):
+        query = request.query_params.get("q", "")
+
+        item_types, error = search_types_from_query(request)
+        if error:
+            return error
+
+        market, error = market_from_query(request)
+        if error:
+            return error
+
+        try:
+            limit = int(request.query_params.get("limit", settings.AUTOCOMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+        limit = min(max(limit, 1), settings.AUTOCOMPLETE_MAX_LIMIT)
+
+        results = await alookup(query, limit, set(item_types))
+        source = "index"
+
+        if (
+            len(results) < settings.AUTOCOMPLETE_UPSTREAM_BELOW
+            and len(normalize_query(query)) >= settings.AUTOCOMPLETE_UPSTREAM_MIN_CHARS
+        ):
+            try:
+                pages = await aupstream_suggestions(request.user.id, query, item_types, market)
+            except SpotifyAPIError:
+                # Best effort; the index answer still stands
+                pages = None
+            if pages is not None:
+                results = merge_suggestions(results, entries_from_pages(pages), limit)
+                source = "upstream"
+
+        return Response({"results": results, "source": source})
+
+
+class ImageProxyView(APIView):
+    """
+    GET /images/proxy/?url=<Spotify CDN image URL>
+
+    Serves album/artist art from a bounded on-disk LRU cache
+    (IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES), fetching it from the CDN on
+    a miss. Spotify image URLs never change content, so responses are
+    cacheable for a year. Only Spotify CDN hosts are proxied.
+    """
+    permission_classes = [permissions.AllowAny]
+    # Loaded by <Image>, which sends no Authorization header
+    authentication_classes = []
+
     def get(self, request):
-        # Read query parameters
-        query = request.query_params.get("q")
-        type_param = request.query_params.get("type", "track,album,artist")
+        if not settings.IMAGE_PROXY_ENABLED:
+            return Response({"detail": "Image proxy is disabled."}, status=404)
 
-        if not query:
+        url = request.query_params.get("url")
+        if not url:
+            return Response({"detail": "Missing required query parameter 'url'."}, status=400)
+
+        try:
+            image, content_type = cached_image(url)
+        except ImageProxyError as exc:
+            return Response({"detail": str(exc)}, status=exc.status_code)
+
+        response = FileResponse(image, content_type=content_type)
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+def bulk_upsert_response(request, serializer_class):
+    """
+    Shared body of POST /ratings/bulk/ and POST /reviews/bulk/
+    """
+    items = request.data
+    if isinstance(items, dict):
+        items = items.get("items")
+    if not isinstance(items, list):
+        return Response(
+            {"detail": "Body must be a list of items or {\"items\": [...]}."},
+            status=400,
+        )
+
+    max_items = settings.BULK_UPSERT_MAX_ITEMS
+    if len(items) > max_items:
+        return Response(
+            {"detail": f"At most {max_items} items per request."},
+            status=400,
+        )
+
+    results, objs = bulk_upsert(serializer_class, request.user, items)
+    schedule_catalog_hydration(
+        request.user.id, [(obj.spotify_id, obj.item_type) for obj in objs]
+    )
+
+    statuses = [result["status"] for result in results]
+    return Response(
+        {
+            "created": statuses.count("created"),
+            "updated": statuses.count("updated"),
+            "failed": statuses.count("invalid"),
+            "results": results,
+        },
+        status=200,
+    )
+
+def _serialize_or_none(serializer_class, obj):
+    return serializer_class(obj).data if obj is not None else None
+
+def item_from_query(request):
+    """
+    (spotify_id, item_type) from the query string, or (None, 400 response)
+    """
+    spotify_id = request.query_params.get("spotify_id")
+    item_type = request.query_params.get("item_type")
+
+    # Validation
+    if not spotify_id or not item_type:
+        return None, Response(
+            {"detail": "spotify_id and item_type are required query parameters."},
+            status=400,
+        )
+
+    # Validate item_type against model choices
+    if item_type not in VALID_ITEM_TYPES:
+        return None, Response(
+            {"detail": f"item_type must be one of {sorted(VALID_ITEM_TYPES)}"},
+            status=400,
+        )
+
+    return (spotify_id, item_type), None
+
+def search_types_from_query(request):
+    """
+    ?type=track,album,artist as a de-duplicated list, or (None, 400 response)
+    """
+    type_param = request.query_params.get("type", "track,album,artist")
+    item_types = list(dict.fromkeys(t.strip() for t in type_param.split(",") if t.strip()))
+    if not item_types or not set(item_types) <= set(TYPE_BLOCKS):
+        return None, Response(
+            {"detail": f"type must be a comma-separated subset of {sorted(TYPE_BLOCKS)}"},
+            status=400,
+        )
+    return item_types, None
+
+def market_from_query(request):
+    """
+    ?market= (default SEARCH_DEFAULT_MARKET), or (None, 400 response)
+    """
+    market = request.query_params.get("market", settings.SEARCH_DEFAULT_MARKET).upper()
+    if market and not MARKET_RE.match(market):
+        return None, Response(
+            {"detail": "market must be an ISO 3166-1 alpha-2 country code."}, status=400
+        )
+    return market, None
+
+def fields_from_query(request, allowed):
+    """
+    ?fields=a,b as a frozenset (None = every field), or (None, 400 response)
+    """
+    try:
+        return parse_fields(request.query_params.get("fields"), allowed), None
+    except ValueError as exc:
+        return None, Response({"detail": str(exc)}, status=400)
+
+def single_item_state_response(request, kind, serializer_class):
+    """
+    Shared body of GET /ratings/item/ and GET /reviews/item/: the
+    one-item case of item_states()
+    """
+    pair, error = item_from_query(request)
+    if error:
+        return error
+
+    obj = item_states(request.user, [pair], kinds=(kind,))[pair][kind]
+    return Response(
+        {
+            "exists": obj is not None,
+            kind: _serialize_or_none(serializer_class, obj),
+        },
+        status=200,
+    )
+
+class ItemStateView(APIView):
+    """
+    GET /items/state/?items=track:<id>,album:<id>,...
+    POST /items/state/  {"items": [{"spotify_id": "...", "item_type": "track"}, ...]}
+
+    The current user's rating and review for up to ITEM_STATE_MAX_ITEMS
+    items at once (one query per table), e.g. for a page of search results.
+
+    Response:
+    {
+      "items": [
+        {
+          "spotify_id": "...",
+          "item_type": "track",
+          "rating": { ...RatingSerializer... } | null,
+          "review": { ...ReviewSerializer... } | null
+        },
+        ...
+      ]
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        raw = request.query_params.get("items", "")
+        items = [part.strip() for part in raw.split(",") if part.strip()]
+        return self._respond(request, items)
+
+    def post(self, request):
+        items = request.data.get("items") if isinstance(request.data, dict) else request.data
+        return self._respond(request, items)
+
+    def _respond(self, request, items):
+        pairs, error = parse_item_pairs(items, settings.ITEM_STATE_MAX_ITEMS)
+        if error:
+            return Response({"detail": error}, status=400)
+
+        states = item_states(request.user, pairs)
+        return Response(
+            {
+                "items": [
+                    {
+                        "spotify_id": spotify_id,
+                        "item_type": item_type,
+                        "rating": _serialize_or_none(
+                            RatingSerializer, states[(spotify_id, item_type)]["rating"]
+                        ),
+                        "review": _serialize_or_none(
+                            ReviewSerializer, states[(spotify_id, item_type)]["review"]
+                        ),
+                    }
+                    for spotify_id, item_type in pairs
+                ]
+            },
+            status=200,
+        )
+
+class ItemStatsView(APIView):
+    """
+    GET /items/stats/?spotify_id=...&item_type=track|album|artist
+
+    Community rating stats for one item, read from its RatingAggregate row.
+
+    Response:
+    {
+      "spotify_id": "...",
+      "item_type": "album",
+      "count": 12,
+      "average": 4.1,
+      "stddev": 0.62,
+      "histogram": [0, 0, 1, 2, 6, 3]   // whole stars 0..5
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        pair, error = item_from_query(request)
+        if error:
+            return error
+
+        spotify_id, item_type = pair
+        aggregate = RatingAggregate.objects.filter(
+            spotify_id=spotify_id, item_type=item_type
+        ).first()
+        return Response(
+            {"spotify_id": spotify_id, "item_type": item_type, **rating_stats(aggregate)},
+            status=200,
+        )
+
+class LeaderboardView(APIView):
+    """
+    GET /leaderboards/?item_type=album&window=all|30d|7d&limit=20&offset=0
+
+    Top rated items of a type, ranked by a Bayesian average (see
+    leaderboards.py). Served from the precomputed chart, so each page is
+    a rank-range read; charts are refreshed by `manage.py
+    refresh_leaderboards` and in the background once stale.
+
+    Response:
+    {
+      "item_type": "album",
+      "window": "30d",
+      "computed_at": "...",
+      "results": [
+        {"rank": 1, "spotify_id": "...", "item_name": "...", "count": 14,
+         "average": 4.6, "score": 4.38},
+        ...
+      ],
+      "next_offset": 20 | null
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        item_type = request.query_params.get("item_type", "album")
+        window = request.query_params.get("window", "all")
+
+        if item_type not in ITEM_TYPES:
             return Response(
-                {"detail": "Missing required query parameter 'q'."},
+                {"detail": f"item_type must be one of {ITEM_TYPES}"},
                 status=400,
             )
-
-        # Ensure user has linked Spotify account
-        try:
-            account = request.user.spotify_account
-        except SpotifyAccount.DoesNotExist:
+        windows = leaderboard_windows()
+        if window not in windows:
             return Response(
-                {"detail": "Spotify account not found for this user."},
+                {"detail": f"window must be one of {windows}"},
                 status=400,
             )
 
-        # Call Spotify /search via spotify_user_get (handles refresh + retry)
         try:
-            raw = spotify_user_get(
-                "/search",
-                account=account,
-                params={
-                    "q": query,
-                    "type": type_param,  #  track, album, artist
-                    "limit": 10,
+            limit = int(request.query_params.get("limit", 20))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers."}, status=400)
+        limit = min(max(limit, 1), settings.LIST_MAX_PAGE_SIZE)
+        offset = max(offset, 0)
+
+        entries, computed_at = leaderboard_page(item_type, window, offset, limit)
+        has_more = len(entries) == limit and offset + limit < settings.LEADERBOARD_SIZE
+        return Response(
+            {
+                "item_type": item_type,
+                "window": window,
+                "computed_at": computed_at,
+                "results": [
+                    {
+                        "rank": entry.rank,
+                        "spotify_id": entry.spotify_id,
+                        "item_name": entry.item_name,
+                        "count": entry.count,
+                        "average": entry.average,
+                        "score": round(entry.score, 2),
+                    }
+                    for entry in entries
+                ],
+                "next_offset": offset + limit if has_more else None,
+            },
+            status=200,
+        )
+
+class RecommendationsView(APIView):
+    """
+    GET /recommendations/?item_type=track|album|artist&limit=20
+    Items the current user hasn't rated, scored from the item-item
+    neighbors of what they rated (see recommendations.py):
+    {"results": [{"spotify_id", "item_type", "score", "predicted_rating",
+                  "because": {"spotify_id", "item_type"}}, ...]}
+
+    GET /recommendations/?spotify_id=...&item_type=...&limit=20
+    "Because you rated X": X's most similar items:
+    {"results": [{"spotify_id", "item_type", "similarity", "overlap"}, ...]}
+
+    Neighbors are precomputed by `manage.py compute_item_similarities`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", 20))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+        limit = min(max(limit, 1), settings.LIST_MAX_PAGE_SIZE)
+
+        if request.query_params.get("spotify_id"):
+            item, error = item_from_query(request)
+            if error:
+                return error
+            neighbors = similar_items(*item, limit=limit)
+            return Response(
+                {
+                    "results": [
+                        {
+                            "spotify_id": row["neighbor_id"],
+                            "item_type": row["neighbor_type"],
+                            "similarity": round(row["similarity"], 4),
+                            "overlap": row["overlap"],
+                        }
+                        for row in neighbors
+                    ]
                 },
+                status=200,
             )
-        except SpotifyAPIError as exc:
+
+        item_type = request.query_params.get("item_type")
+        if item_type and item_type not in VALID_ITEM_TYPES:
             return Response(
-                {"detail": str(exc)},
-                status=502,
+                {"detail": f"item_type must be one of {sorted(VALID_ITEM_TYPES)}"},
+                status=400,
             )
+        results = recommend_for_user(request.user.id, limit=limit, item_type=item_type)
+        return Response({"results": results}, status=200)
 
-        # Normalize response
-        normalized = self._normalize_search_results(raw or {})
-        return Response(normalized)
+def _user_id_param(request):
+    """
+    ?user_id=<int>, defaulting to the current user; (user_id, 400 response)
+    """
+    raw = request.query_params.get("user_id")
+    if raw is None:
+        return request.user.id, None
+    try:
+        return int(raw), None
+    except ValueError:
+        return None, Response({"detail": "user_id must be an integer."}, status=400)
+
+class TasteMatchView(APIView):
+    """
+    GET /taste/match/?user_id=<other user>
 
-    def _normalize_search_results(self, raw):
-        """
-        Shape Spotify /search response into:
+    Taste compatibility between the current user and another user, over
+    the items both have rated:
+    {"user_id": 7, "score": 78.5, "similarity": 0.62, "overlap": 41}
+    score/similarity are null below TASTE_MIN_OVERLAP co-rated items.
+    """
+    permission_classes = [IsAuthenticated]
 
-        {
-          "tracks": [...],
-          "albums": [...],
-          "artists": [...]
-        }
-        """
-        def first_image(images):
-            if not images:
-                return None
-            return images[0].get("url")
-
-        results = {
-            "tracks": [],
-            "albums": [],
-            "artists": [],
-        }
+    def get(self, request):
+        if request.query_params.get("user_id") is None:
+            return Response({"detail": "Missing 'user_id' query parameter."}, status=400)
+        other_id, error = _user_id_param(request)
+        if error:
+            return error
+        if not User.objects.filter(id=other_id).exists():
+            return Response({"detail": "User not found."}, status=404)
 
-        
-        tracks_block = raw.get("tracks") or {}
-        for item in tracks_block.get("items", []):
-            results["tracks"].append(
-                {
-                    "id": item.get("id"),
-                    "type": "track",
-                    "name": item.get("name"),
-                    "artists": [a.get("name") for a in (item.get("artists") or [])],
-                    "album": (item.get("album") or {}).get("name"),
-                    "album_image": first_image((item.get("album") or {}).get("images") or []),
-                    "duration_ms": item.get("duration_ms"),
-                }
-            )
+        return Response({"user_id": other_id, **taste_match(request.user.id, other_id)})
 
-        
-        albums_block = raw.get("albums") or {}
-        for item in albums_block.get("items", []):
-            results["albums"].append(
-                {
-                    "id": item.get("id"),
-                    "type": "album",
-                    "name": item.get("name"),
-                    "artists": [a.get("name") for a in (item.get("artists") or [])],
-                    "image": first_image(item.get("images") or []),
-                    "release_date": item.get("release_date"),
-                }
-            )
+class SimilarUsersView(APIView):
+    """
+    GET /taste/similar-users/?user_id=...&limit=10
 
-        artists_block = raw.get("artists") or {}
-        for item in artists_block.get("items", []):
-            results["artists"].append(
-                {
-                    "id": item.get("id"),
-                    "type": "artist",
-                    "name": item.get("name"),
-                    "image": first_image(item.get("images") or []),
-                    "followers": (item.get("followers") or {}).get("total"),
-                    "genres": item.get("genres") or [],
-                }
+    Most similar users by taste (default: to the current user), from the
+    lists precomputed by `manage.py compute_taste_neighbors`:
+    {"results": [{"user_id", "username", "display_name", "score", "overlap"}, ...]}
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user_id, error = _user_id_param(request)
+        if error:
+            return error
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+        limit = min(max(limit, 1), settings.TASTE_NEIGHBORS)
+
+        return Response({"results": similar_users(user_id, limit=limit)})
+
+def keyset_list_response(request, model, serializer_class):
+    """
+    Shared body of GET /ratings/ and GET /reviews/: one keyset page of the
+    current user's rows, with catalog metadata attached
+    """
+    queryset = model.objects.filter(user_id=request.user.id)
+
+    item_type = request.query_params.get("item_type")
+    if item_type:
+        if item_type not in VALID_ITEM_TYPES:
+            return Response(
+                {"detail": f"item_type must be one of {sorted(VALID_ITEM_TYPES)}"},
+                status=400,
             )
+        queryset = queryset.filter(item_type=item_type)
+
+    try:
+        limit = int(request.query_params.get("limit", settings.LIST_PAGE_SIZE))
+    except ValueError:
+        return Response({"detail": "limit must be an integer."}, status=400)
+    limit = min(max(limit, 1), settings.LIST_MAX_PAGE_SIZE)
+
+    try:
+        rows, next_cursor = keyset_page(
+            queryset, cursor=request.query_params.get("cursor"), limit=limit
+        )
+    except InvalidCursor as exc:
+        return Response({"detail": str(exc)}, status=400)
 
-        return results
+    # Rich rows from the local catalog; fill gaps in the background
+    schedule_catalog_hydration(request.user.id, attach_catalog(rows))
+
+    serializer = serializer_class(rows, many=True)
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
 
 class RatingListCreateView(APIView):
     """
-    GET /ratings/
-    List the current user's ratings (most recently updated first)
+    GET /ratings/?item_type=track|album|artist&limit=50&cursor=...
+    List the current user's ratings (most recently updated first), one
+    page at a time: {"results": [...], "next_cursor": "..." | null}.
+    Pass next_cursor back as `cursor` for the following page.
 
     POST /ratings/
     Create or update (upsert) a rating for a track/album/artist.
@@ -510,9 +1033,7 @@ class RatingListCreateView(APIView):
 
     def get(self, request):
         # Only return ratings for authenticated user
-        qs = Rating.objects.filter(user=request.user).order_by("-updated_at")
-        serializer = RatingSerializer(qs, many=True)
-        return Response(serializer.data)
+        return keyset_list_response(request, Rating, RatingSerializer)
 
     def post(self, request):
         # Use serializer's upsert logic; user comes from request
@@ -522,10 +1043,45 @@ class RatingListCreateView(APIView):
         )
         serializer.is_valid(raise_exception=True)
         rating_obj = serializer.create(serializer.validated_data)
+        schedule_catalog_hydration(
+            request.user.id, [(rating_obj.spotify_id, rating_obj.item_type)]
+        )
         # Re-serialize to include read-only fields
         output = RatingSerializer(rating_obj)
         return Response(output.data, status=201)
 
+class RatingBulkUpsertView(APIView):
+    """
+    POST /ratings/bulk/
+    Create or update many ratings in one set-based write.
+
+    Example POST body (a bare list is accepted too):
+    {
+      "items": [
+        {"spotify_id": "06HL4z0CvFAxyc27GXpf02", "item_type": "artist", "rating": 4.5},
+        {"spotify_id": "1dGr1c8CrMLDpV6mPbImSI", "item_type": "album", "rating": 5}
+      ]
+    }
+
+    Response:
+    {
+      "created": 1,
+      "updated": 1,
+      "failed": 0,
+      "results": [
+        {"index": 0, "spotify_id": "...", "item_type": "artist", "status": "updated", "id": 3},
+        ...
+      ]
+    }
+
+    status is one of created / updated / invalid (with "errors") /
+    superseded (a later item in the same request has the same key).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return bulk_upsert_response(request, RatingSerializer)
+
 class RatingItemView(APIView):
     """
     GET /ratings/item/?spotify_id=...&item_type=track|album|artist
@@ -555,53 +1111,13 @@ class RatingItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        spotify_id = request.query_params.get("spotify_id")
-        item_type = request.query_params.get("item_type")
-
-        # Validation
-        if not spotify_id or not item_type:
-            return Response(
-                {"detail": "spotify_id and item_type are required query parameters."},
-                status=400,
-            )
-
-        # Validate item_type against model choices
-        valid_types = {choice[0] for choice in Rating.ITEM_TYPE_CHOICES}
-        if item_type not in valid_types:
-            return Response(
-                {"detail": f"item_type must be one of {sorted(valid_types)}"},
-                status=400,
-            )
-
-        # Look up rating for current user + item
-        rating_obj = Rating.objects.filter(
-            user=request.user,
-            spotify_id=spotify_id,
-            item_type=item_type,
-        ).first()
-
-        if rating_obj is None:
-            return Response(
-                {
-                    "exists": False,
-                    "rating": None,
-                },
-                status=200,
-            )
-
-        serializer = RatingSerializer(rating_obj)
-        return Response(
-            {
-                "exists": True,
-                "rating": serializer.data,
-            },
-            status=200,
-        )
+        return single_item_state_response(request, "rating", RatingSerializer)
 
 class ReviewListCreateView(APIView):
     """
-    GET /reviews/
-    List the current user's reviews (most recently updated first)
+    GET /reviews/?item_type=track|album|artist&limit=50&cursor=...
+    List the current user's reviews (most recently updated first), paged
+    the same way as GET /ratings/
 
     POST /reviews/
      Create or update (upsert) a review for a track/album/artist.
@@ -617,9 +1133,7 @@ class ReviewListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        qs = Review.objects.filter(user=request.user).order_by("-updated_at")
-        serializer = ReviewSerializer(qs, many=True)
-        return Response(serializer.data)
+        return keyset_list_response(request, Review, ReviewSerializer)
 
     def post(self, request):
         serializer = ReviewSerializer(
@@ -628,9 +1142,90 @@ class ReviewListCreateView(APIView):
         )
         serializer.is_valid(raise_exception=True)
         review_obj = serializer.create(serializer.validated_data)
+        schedule_catalog_hydration(
+            request.user.id, [(review_obj.spotify_id, review_obj.item_type)]
+        )
         output = ReviewSerializer(review_obj)
         return Response(output.data, status=201)
 
+class ReviewBulkUpsertView(APIView):
+    """
+    POST /reviews/bulk/
+    Create or update many reviews in one set-based write.
+    Same body and response shape as POST /ratings/bulk/, with "text"
+    instead of "rating".
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return bulk_upsert_response(request, ReviewSerializer)
+
+class ReviewSearchView(APIView):
+    """
+    GET /reviews/search/?q=...&mine=true&spotify_id=...&item_type=...&limit=20&offset=0
+
+    Ranked full-text search over review item names and text, backed by
+    the FTS5 (SQLite) / GIN tsvector (Postgres) index from migration 0011.
+    - mine=true: only the current user's reviews
+    - spotify_id + item_type: only reviews of that item
+
+    Response:
+    {
+      "results": [
+        {
+          "id": 7, "user": 3, "spotify_id": "...", "item_type": "album",
+          "item_name": "Midnights", "snippet": "...the [bridge] on...",
+          "score": 3.2, "updated_at": "..."
+        },
+        ...
+      ],
+      "next_offset": 20 | null
+    }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = (request.query_params.get("q") or "").strip()
+        if not query:
+            return Response({"detail": "Missing 'q' query parameter."}, status=400)
+
+        item = None
+        if request.query_params.get("spotify_id") or request.query_params.get("item_type"):
+            item, error = item_from_query(request)
+            if error:
+                return error
+
+        user_id = request.user.id if request.query_params.get("mine") == "true" else None
+
+        try:
+            limit = int(request.query_params.get("limit", 20))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response({"detail": "limit and offset must be integers."}, status=400)
+        limit = min(max(limit, 1), settings.LIST_MAX_PAGE_SIZE)
+        offset = max(offset, 0)
+
+        hits = search_reviews(query, user_id=user_id, item=item, offset=offset, limit=limit)
+        return Response(
+            {
+                "results": [
+                    {
+                        "id": review.id,
+                        "user": review.user_id,
+                        "spotify_id": review.spotify_id,
+                        "item_type": review.item_type,
+                        "item_name": review.item_name,
+                        "snippet": snippet,
+                        "score": round(score, 6),
+                        "updated_at": review.updated_at,
+                    }
+                    for review, score, snippet in hits
+                ],
+                "next_offset": offset + limit if len(hits) == limit else None,
+            },
+            status=200,
+        )
+
 class ReviewItemView(APIView):
     """
     GET /reviews/item/?spotify_id=...&item_type=track|album|artist
@@ -660,45 +1255,4 @@ class ReviewItemView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        spotify_id = request.query_params.get("spotify_id")
-        item_type = request.query_params.get("item_type")
-
-        # Validation
-        if not spotify_id or not item_type:
-            return Response(
-                {"detail": "spotify_id and item_type are required query parameters."},
-                status=400,
-            )
-
-        # Validate item_type against model choices
-        valid_types = {choice[0] for choice in Review.ITEM_TYPE_CHOICES}
-        if item_type not in valid_types:
-            return Response(
-                {"detail": f"item_type must be one of {sorted(valid_types)}"},
-                status=400,
-            )
-
-        # Look up review for current user + item
-        review_obj = Review.objects.filter(
-            user=request.user,
-            spotify_id=spotify_id,
-            item_type=item_type,
-        ).first()
-
-        if review_obj is None:
-            return Response(
-                {
-                    "exists": False,
-                    "review": None,
-                },
-                status=200,
-            )
-
-        serializer = ReviewSerializer(review_obj)
-        return Response(
-            {
-                "exists": True,
-                "review": serializer.data,
-            },
-            status=200,
-        )
+        return single_item_state_response(request, "review", ReviewSerializer)
@@ -10,6 +10,7 @@ import {
 } from "react-native";
 import { Ionicons } from "@expo/vector-icons";
 import { searchBarStyles as styles } from "./styles/searchBarStyles";
+import { Suggestion } from "../hooks/useAutocomplete";
 
 type SearchBarProps = {
   value: string;
@@ -17,6 +18,9 @@ type SearchBarProps = {
   onSubmit?: () => void;
   placeholder?: string;
   autoFocus?: boolean;
+  // Typeahead suggestions shown under the input (see useAutocomplete)
+  suggestions?: Suggestion[];
+  onSelectSuggestion?: (suggestion: Suggestion) => void;
 };
 
 export const SearchBar: React.FC<SearchBarProps> = ({
@@ -25,6 +29,8 @@ export const SearchBar: React.FC<SearchBarProps> = ({
   onSubmit,
   placeholder = "Search for tracks, albums, artists...",
   autoFocus = false,
+  suggestions = [],
+  onSelectSuggestion,
 }) => {
   const handleSubmit = (
     _e: NativeSyntheticEvent<TextInputSubmitEditingEventData>
@@ -75,6 +81,27 @@ export const SearchBar: React.FC<SearchBarProps> = ({
           </TouchableOpacity>
         )}
       </View>
+
+      {suggestions.length > 0 && (
+        <View style={styles.suggestions}>
+          {suggestions.map((suggestion) => (
+            <TouchableOpacity
+              key={`${suggestion.type}-${suggestion.id}`}
+              style={styles.suggestionRow}
+              onPress={() => onSelectSuggestion?.(suggestion)}
+            >
+              <Text numberOfLines={1} style={styles.suggestionName}>
+                {suggestion.name}
+              </Text>
+              <Text numberOfLines={1} style={styles.suggestionMeta}>
+                {suggestion.artists.length > 0
+                  ? `${suggestion.type} · ${suggestion.artists.join(", ")}`
+                  : suggestion.type}
+              </Text>
+            </TouchableOpacity>
+          ))}
+        </View>
+      )}
     </View>
   );
 };
@@ -32,4 +32,25 @@ export const searchBarStyles = StyleSheet.create({
     color: "#9ca3af",
     fontSize: 14,
   },
+
+  // Typeahead suggestions
+  suggestions: {
+    marginTop: 6,
+    backgroundColor: "#111827",
+    borderRadius: 12,
+    paddingVertical: 4,
+  },
+  suggestionRow: {
+    paddingHorizontal: 14,
+    paddingVertical: 8,
+  },
+  suggestionName: {
+    color: "#ffffff",
+    fontSize: 14,
+  },
+  suggestionMeta: {
+    color: "#9ca3af",
+    fontSize: 12,
+    marginTop: 2,
+  },
 });
@@ -0,0 +1,70 @@
+import { useEffect, useState } from "react";
+import { API_BASE_URL } from "../config";
+
+export type Suggestion = {
+  id: string;
+  type: "track" | "album" | "artist";
+  name: string;
+  artists: string[];
+  image: string | null;
+  rating_count: number;
+};
+
+type AutocompleteResponse = {
+  results: Suggestion[];
+  source: "index" | "upstream";
+};
+
+// Wait for a pause in typing before asking the backend
+const DEBOUNCE_MS = 200;
+const MIN_CHARS = 2;
+
+export const useAutocomplete = (
+  query: string,
+  accessToken: string | null,
+  enabled: boolean = true
+): Suggestion[] => {
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
+
+  useEffect(() => {
+    const trimmed = query.trim();
+    if (!enabled || !accessToken || trimmed.length < MIN_CHARS) {
+      setSuggestions([]);
+      return;
+    }
+
+    // Drop the in-flight request when the query changes again
+    const controller = new AbortController();
+    const timeoutId = setTimeout(async () => {
+      try {
+        const resp = await fetch(
+          `${API_BASE_URL}/discover/autocomplete/?q=${encodeURIComponent(trimmed)}&limit=6`,
+          {
+            headers: {
+              Authorization: `Bearer ${accessToken}`,
+            },
+            signal: controller.signal,
+          }
+        );
+
+        if (!resp.ok) {
+          throw new Error(`Failed to fetch suggestions: ${resp.status}`);
+        }
+
+        const json = (await resp.json()) as AutocompleteResponse;
+        setSuggestions(json.results ?? []);
+      } catch (err: any) {
+        if (err?.name !== "AbortError") {
+          console.warn("useAutocomplete error:", err);
+        }
+      }
+    }, DEBOUNCE_MS);
+
+    return () => {
+      clearTimeout(timeoutId);
+      controller.abort();
+    };
+  }, [query, accessToken, enabled]);
+
+  return suggestions;
+};
@@ -57,48 +57,35 @@ export const useRatingReview = (
       setLoading(true);
       setError(null);
 
-      const ratingUrl =
-        `${API_BASE_URL}/ratings/item/` +
-        `?spotify_id=${encodeURIComponent(item.id)}&item_type=${item.itemType}`;
-
-      const reviewUrl =
-        `${API_BASE_URL}/reviews/item/` +
-        `?spotify_id=${encodeURIComponent(item.id)}&item_type=${item.itemType}`;
-
-      const [ratingRes, reviewRes] = await Promise.all([
-        fetch(ratingUrl, {
-          headers: {
-            Authorization: `Bearer ${accessToken}`,
-          },
-        }),
-        fetch(reviewUrl, {
-          headers: {
-            Authorization: `Bearer ${accessToken}`,
-          },
-        }),
-      ]);
-
-      const ratingFromApi = await (async () => {
-        if (!ratingRes.ok) {
-          console.warn("rating item request failed:", ratingRes.status);
+      // One batched lookup for both rating and review
+      const stateUrl =
+        `${API_BASE_URL}/items/state/` +
+        `?items=${item.itemType}:${encodeURIComponent(item.id)}`;
+
+      const stateRes = await fetch(stateUrl, {
+        headers: {
+          Authorization: `Bearer ${accessToken}`,
+        },
+      });
+
+      const state: any = await (async () => {
+        if (!stateRes.ok) {
+          console.warn("item state request failed:", stateRes.status);
           return null;
         }
-        const ratingJson: any = await ratingRes.json();
-        if (!ratingJson.exists || !ratingJson.rating) return null;
+        const stateJson: any = await stateRes.json();
+        return stateJson.items?.[0] ?? null;
+      })();
+
+      const ratingFromApi = (() => {
+        if (!state?.rating) return null;
 
-        const parsed = parseFloat(String(ratingJson.rating.rating));
+        const parsed = parseFloat(String(state.rating.rating));
         return Number.isNaN(parsed) ? null : parsed;
       })();
 
-      const reviewFromApi = await (async () => {
-        if (!reviewRes.ok) {
-          console.warn("review item request failed:", reviewRes.status);
-          return null;
-        }
-        const reviewJson: any = await reviewRes.json();
-        if (!reviewJson.exists || !reviewJson.review) return null;
-
-        const text: string | undefined = reviewJson.review.text;
+      const reviewFromApi = (() => {
+        const text: string | undefined = state?.review?.text;
         return typeof text === "string" ? text : null;
       })();
 
@@ -5,9 +5,10 @@ export type RecentlyPlayedItem = {
   played_at: string;
   track_name: string;
   artists: string[];
-  album: string;
+  // Not requested (see `fields=` below)
+  album?: string;
   album_image: string | null;
-  duration_ms: number;
+  duration_ms?: number;
 };
 
 type RecentlyPlayedResponse = {
@@ -41,7 +42,7 @@ export const useRecentlyPlayed = (
         setError(null);
       }
 
-      const resp = await fetch(`${API_BASE_URL}/user/recently-played/`, {
+      const resp = await fetch(`${API_BASE_URL}/user/recently-played/?image_size=300&fields=played_at,track_name,artists,album_image`, {
         headers: {
           Authorization: `Bearer ${accessToken}`,
         },
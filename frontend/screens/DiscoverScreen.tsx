@@ -4,6 +4,7 @@ import {
   Text,
   ActivityIndicator,
   ScrollView,
+  Pressable,
 } from "react-native";
 import { discoverStyles } from "./styles/discoverStyles";
 import { SearchBar } from "../components/SearchBar";
@@ -11,44 +12,92 @@ import { API_BASE_URL } from "../config";
 import { useAuth } from "../auth/AuthContext";
 import { ItemCard } from "../components/ItemCard";
 import { useSelectedItemCard } from "../hooks/selectItemCard";
+import { useAutocomplete, Suggestion } from "../hooks/useAutocomplete";
 import { RatingReviewOverlay } from "../components/RatingReviewOverlay";
 
 // --- Types ---
+// Optional fields aren't requested (see `fields=` in the search URL)
 type TrackResult = {
   id: string;
-  type: "track";
+  type?: "track";
   name: string;
   artists: string[];
-  album: string | null;
+  album?: string | null;
   album_image: string | null;
-  duration_ms: number | null;
+  duration_ms?: number | null;
 };
 
 type AlbumResult = {
   id: string;
-  type: "album";
+  type?: "album";
   name: string;
   artists: string[];
   image: string | null;
-  release_date: string | null;
+  release_date?: string | null;
 };
 
 type ArtistResult = {
   id: string;
-  type: "artist";
+  type?: "artist";
   name: string;
   image: string | null;
-  followers: number | null;
+  followers?: number | null;
   genres: string[];
 };
 
+type SectionKey = "artists" | "albums" | "tracks";
+
+type PageInfo = {
+  offset: number;
+  limit: number;
+  total: number;
+  next_offset: number | null;
+};
+
 type DiscoverSearchResults = {
   tracks: TrackResult[];
   albums: AlbumResult[];
   artists: ArtistResult[];
+  paging: Partial<Record<SectionKey, PageInfo>>;
 };
 
-type SectionKey = "artists" | "albums" | "tracks";
+// Section -> Spotify item type (for per-type paging params)
+const SECTION_TYPES: Record<SectionKey, "track" | "album" | "artist"> = {
+  tracks: "track",
+  albums: "album",
+  artists: "artist",
+};
+
+const buildSearchUrl = (query: string, extraParams = "") =>
+  `${API_BASE_URL}/discover/search/music/` +
+  `?q=${encodeURIComponent(query)}&image_size=300` +
+  `&fields=id,name,artists,image,album_image,genres` +
+  extraParams;
+
+const fetchSearch = async (
+  url: string,
+  accessToken: string
+): Promise<DiscoverSearchResults> => {
+  const res = await fetch(url, {
+    method: "GET",
+    headers: {
+      Authorization: `Bearer ${accessToken}`,
+    },
+  });
+
+  if (!res.ok) {
+    let message = `Request failed with status ${res.status}`;
+    try {
+      const body = await res.json();
+      if (body.detail) message = body.detail;
+    } catch {
+      // ignore parse error
+    }
+    throw new Error(message);
+  }
+
+  return res.json();
+};
 
 // Decide which section should come first based on query
 const getOrderedSections = (
@@ -83,12 +132,28 @@ export const DiscoverScreen: React.FC = () => {
   const [results, setResults] = useState<DiscoverSearchResults | null>(null);
   const [loading, setLoading] = useState(false); // search loading
   const [error, setError] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<SectionKey | null>(null);
 
   const { selectedItem, selectItem, clearSelection } = useSelectedItemCard();
 
-  const handleSearchSubmit = async () => {
-    const trimmed = query.trim();
+  // Hidden once a search runs, until the query is edited again
+  const [showSuggestions, setShowSuggestions] = useState(false);
+  const suggestions = useAutocomplete(query, accessToken, showSuggestions);
+
+  const handleChangeQuery = (text: string) => {
+    setQuery(text);
+    setShowSuggestions(true);
+  };
+
+  const handleSelectSuggestion = (suggestion: Suggestion) => {
+    setQuery(suggestion.name);
+    handleSearchSubmit(suggestion.name);
+  };
+
+  const handleSearchSubmit = async (text: string = query) => {
+    const trimmed = text.trim();
     if (!trimmed) return;
+    setShowSuggestions(false);
 
     if (!accessToken || !isAuthenticated) {
       setError("You need to be logged in and connected to Spotify to search.");
@@ -99,29 +164,10 @@ export const DiscoverScreen: React.FC = () => {
     setError(null);
 
     try {
-      const url =
-        `${API_BASE_URL}/discover/search/music/` +
-        `?q=${encodeURIComponent(trimmed)}&type=track,album,artist`;
-
-      const res = await fetch(url, {
-        method: "GET",
-        headers: {
-          Authorization: `Bearer ${accessToken}`,
-        },
-      });
-
-      if (!res.ok) {
-        let message = `Request failed with status ${res.status}`;
-        try {
-          const body = await res.json();
-          if (body.detail) message = body.detail;
-        } catch {
-          // ignore parse error
-        }
-        throw new Error(message);
-      }
-
-      const data: DiscoverSearchResults = await res.json();
+      const data = await fetchSearch(
+        buildSearchUrl(trimmed, "&type=track,album,artist"),
+        accessToken
+      );
       setResults(data);
       setLastSearchQuery(trimmed); // only update when search succeeds
     } catch (err: any) {
@@ -134,6 +180,59 @@ export const DiscoverScreen: React.FC = () => {
     }
   };
 
+  // Next page of one section; the backend prefetches it, so this is
+  // usually served from cache
+  const handleLoadMore = async (section: SectionKey) => {
+    const nextOffset = results?.paging[section]?.next_offset;
+    if (!results || !lastSearchQuery || !accessToken || nextOffset == null) {
+      return;
+    }
+
+    const itemType = SECTION_TYPES[section];
+    setLoadingMore(section);
+
+    try {
+      const data = await fetchSearch(
+        buildSearchUrl(
+          lastSearchQuery,
+          `&type=${itemType}&${itemType}_offset=${nextOffset}`
+        ),
+        accessToken
+      );
+      setResults((prev) =>
+        prev
+          ? {
+              ...prev,
+              [section]: [...prev[section], ...data[section]],
+              paging: { ...prev.paging, [section]: data.paging[section] },
+            }
+          : prev
+      );
+    } catch (err: any) {
+      console.error("Discover load more error:", err);
+    } finally {
+      setLoadingMore(null);
+    }
+  };
+
+  const renderLoadMore = (section: SectionKey) => {
+    if (results?.paging[section]?.next_offset == null) return null;
+
+    return (
+      <Pressable
+        style={discoverStyles.loadMoreButton}
+        onPress={() => handleLoadMore(section)}
+        disabled={loadingMore !== null}
+      >
+        {loadingMore === section ? (
+          <ActivityIndicator size="small" color="#ffffff" />
+        ) : (
+          <Text style={discoverStyles.loadMoreText}>Load more</Text>
+        )}
+      </Pressable>
+    );
+  };
+
   const handleSelectItem = (params: {
     id: string;
     itemType: "track" | "album" | "artist";
@@ -153,8 +252,10 @@ export const DiscoverScreen: React.FC = () => {
 
       <SearchBar
         value={query}
-        onChangeText={setQuery}
-        onSubmit={handleSearchSubmit}
+        onChangeText={handleChangeQuery}
+        onSubmit={() => handleSearchSubmit()}
+        suggestions={suggestions}
+        onSelectSuggestion={handleSelectSuggestion}
       />
 
       <ScrollView style={discoverStyles.resultsScroll}>
@@ -216,6 +317,7 @@ export const DiscoverScreen: React.FC = () => {
                         />
                       ))}
                     </View>
+                    {renderLoadMore("artists")}
                   </View>
                 );
               }
@@ -251,6 +353,7 @@ export const DiscoverScreen: React.FC = () => {
                         />
                       ))}
                     </View>
+                    {renderLoadMore("albums")}
                   </View>
                 );
               }
@@ -286,6 +389,7 @@ export const DiscoverScreen: React.FC = () => {
                         />
                       ))}
                     </View>
+                    {renderLoadMore("tracks")}
                   </View>
                 );
               }
@@ -63,6 +63,22 @@ export const discoverStyles = StyleSheet.create({
     flexWrap: "wrap",
   },
 
+  // "Load more" under each section
+  loadMoreButton: {
+    alignSelf: "center",
+    marginTop: 4,
+    paddingVertical: 8,
+    paddingHorizontal: 16,
+    borderRadius: 16,
+    borderWidth: 1,
+    borderColor: "#374151",
+  },
+  loadMoreText: {
+    color: "#e5e7eb",
+    fontSize: 13,
+    fontWeight: "500",
+  },
+
   //  Selected item overlay 
   selectedOverlay: {
     position: "absolute",